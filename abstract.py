@@ -6,8 +6,12 @@
 """
 
 
+import os
 import xml.dom
+import xml.dom.minidom
+import xml.etree.cElementTree as ElementTree
 import xmlutil
+import sentence
 import nctreport
 import htmlutil
 import publicationinfo
@@ -15,6 +19,14 @@ import publicationinfo
 
 
 
+def xmlFileStamp(filename):
+    """ return (path, size, modification time) for an xml file
+        or None if the file does not exist """
+    if not os.path.exists(filename):
+        return None
+    info = os.stat(filename)
+    return (os.path.abspath(filename), info.st_size, info.st_mtime)
+
 
 ##############################################################
 # store an abstract
@@ -37,14 +49,23 @@ class Abstract:
     report = None
     acronyms = None
     publicationInformation = None
-
-    def __init__(self, filename=None, sentenceFilter=None, loadRegistries=True):
+    dirty = False          # True if the abstract changed since it was read or written
+    xmlFileStamp = None    # xmlFileStamp() of the file it was last read from or written to
+    # version of the objects built by the xml loaders. increase this whenever a
+    # change to the loaders or to the classes they build makes old snapshots
+    # (see AbstractCache) invalid.
+    loaderVersion = 5
+
+    def __init__(self, filename=None, sentenceFilter=None, loadRegistries=True, parser='iterparse'):
         """ create a new abstract object
           filename = name of xml file containing abstract (optional)
           sentenceFilter = function that takes a Sentence object as a parameter
                    and returns True if the sentence should be included
                    and False if it should be ignored.
                    (optional. default is to include every sentence.)
+          parser = xml parser used to read the file.
+                   'iterparse' (default) reads it in a single streaming pass,
+                   'minidom' builds the complete DOM tree first.
           """
         self.id = ''
         self.sentences = []           # filtered sentence list
@@ -63,8 +84,16 @@ class Abstract:
         self.acronyms = {}
         if sentenceFilter == None:
             sentenceFilter = lambda sentence: True
+        self.xmlFileStamp = None
         if filename != None:
-            self.loadXML(filename, sentenceFilter, loadRegistries)
+            stamp = xmlFileStamp(filename)
+            if parser == 'minidom':
+                self.loadXML(filename, sentenceFilter, loadRegistries)
+            else:
+                self.loadXMLStream(filename, sentenceFilter, loadRegistries)
+            self.xmlFileStamp = stamp
+        # tokens mark their abstract as dirty when they change (see Token.changed)
+        self.dirty = False
         self.__tokenSet = set([])
         self.__lemmaSet = set([])
 
@@ -104,6 +133,58 @@ class Abstract:
         xmldoc.unlink()
         self.__buildAcronymTable()
 
+    def loadXMLStream(self, filename, sentenceFilter, loadRegistries):
+        """ read an xml file containing an abstract in a single streaming pass.
+
+            Sentence and Token objects are built directly from ElementTree
+            events and each sentence element is discarded as soon as it has
+            been read, so the whole document tree never exists at once.
+            The resulting abstract is the same as the one built by loadXML(). """
+        sectionTags = set(['title', 'affiliation', 'body'])
+        sentenceLists = {}
+        sectionElement = None     # title, affiliation or body element being read
+        sentenceList = None
+        nSentences = 0
+        foundAbstract = False
+        for event, element in ElementTree.iterparse(filename, events=('start', 'end')):
+            tag = element.tag
+            if event == 'start':
+                if tag == 'abstract' and foundAbstract == False:
+                    foundAbstract = True
+                    self.id = element.get('id', '')
+                elif tag in sectionTags and tag not in sentenceLists and sectionElement == None:
+                    # first element with this name, read its sentences
+                    sectionElement = element
+                    sentenceList = []
+                    sentenceLists[tag] = sentenceList
+                    nSentences = 0
+            elif tag == 'sentence':
+                if sectionElement != None:
+                    s = sentence.Sentence()
+                    s.parseElement(element, nSentences, self)
+                    if len(s.tokens) > 3:
+                        sentenceList.append(s)
+                    nSentences += 1
+                element.clear()
+            elif element is sectionElement:
+                sectionElement = None
+                element.clear()
+            elif tag == 'PublicationInformation' and self.publicationInformation == None:
+                # journal, author, publication info is kept as a minidom tree
+                node = xml.dom.minidom.parseString(ElementTree.tostring(element)).documentElement
+                xmlutil.normalizeXMLTree(node)
+                self.publicationInformation = publicationinfo.PublicationInfo(node)
+                element.clear()
+
+        self.titleSentences = sentenceLists.get('title', [])
+        self.affiliationSentences = sentenceLists.get('affiliation', [])
+        self.__allSentences = sentenceLists.get('body', [])
+        for s in self.__allSentences:
+            if sentenceFilter(s) == True:
+                self.sentences.append(s)
+
+        self.__buildAcronymTable()
+
 
     def __buildAcronymTable(self):
         """ look for acronym definitions in each abstract and build a table of acronyms
@@ -232,16 +313,51 @@ class Abstract:
             node.appendChild(self.meshHeadingList.getXML(doc))
         return node
 
+    def writeElement(self, writer):
+        """ write the same abstract element as getXML() to an xmlutil.XMLWriter.
+            sentences are written as they are visited. the publication
+            information, report and MeSH headings are small, so they are still
+            built as xml elements first. """
+        doc = xml.dom.minidom.Document()
+        writer.startElement('abstract', {'id': self.id})
+
+        if self.publicationInformation is not None:
+            writer.writeNode(self.publicationInformation.getXML(doc))
+
+        for (name, sentenceList) in [('title', self.titleSentences),
+                                     ('affiliation', self.affiliationSentences),
+                                     ('body', self.__allSentences)]:
+            if len(sentenceList) > 0:
+                writer.startElement(name)
+                for sentence in sentenceList:
+                    sentence.writeElement(writer)
+                writer.endElement()
+
+        if self.report != None:
+            writer.writeNode(self.report.getXML(doc))
+
+        if self.meshHeadingList != None:
+            writer.writeNode(self.meshHeadingList.getXML(doc))
+        writer.endElement()
+
     def writeXML(self, filename):
         """ write abstract out to xml file with given filename """
         print 'Writing:', filename
-        doc = xml.dom.minidom.Document()
-        node = self.getXML(doc)
         out = open(filename, 'w')
         out.write('<?xml version="1.0" encoding="utf-8"?>\n')
         out.write('<?xml-stylesheet href="http://www.andrews.edu/~summersc/abstract.xsl" type="text/xsl"?>\n')
-        xmlutil.writexml(node, out)
+        self.writeElement(xmlutil.XMLWriter(out))
         out.close()
+        self.xmlFileStamp = xmlFileStamp(filename)
+        self.dirty = False
+
+    def needsWriting(self, filename):
+        """ return True unless a given xml file already holds this abstract:
+            the abstract was read from or written to the file, it has not
+            changed since then and neither has the file. """
+        if self.dirty or self.xmlFileStamp == None:
+            return True
+        return self.xmlFileStamp != xmlFileStamp(filename)
 
     def writeHTML(self, out, labelList=[], showError=True):
         """ write sentences in html to output stream.
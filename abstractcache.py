@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+
+"""
+ Keep binary snapshots of loaded abstracts so that unchanged xml files do not
+ need to be parsed again.
+"""
+
+__author__ = 'Rodney L. Summerscales'
+
+import os
+import sys
+import gc
+import hashlib
+import tempfile
+import cPickle
+
+import abstract
+
+
+# pickling follows the links between tokens (dependencies, parse tree),
+# which needs more stack frames than the default limit for long sentences
+pickleRecursionLimit = 10000
+
+
+def pickleAbstract(abs):
+    """ return a binary string containing the pickled Abstract object """
+    recursionLimit = sys.getrecursionlimit()
+    sys.setrecursionlimit(max(recursionLimit, pickleRecursionLimit))
+    try:
+        return cPickle.dumps(abs, cPickle.HIGHEST_PROTOCOL)
+    finally:
+        sys.setrecursionlimit(recursionLimit)
+
+
+class AbstractCache:
+    """ Maintain a directory of snapshot files, one for each abstract xml file.
+
+        Each snapshot file contains a small header that identifies the xml file
+        it was made from (path, size, modification time, sha1 of contents and
+        Abstract.loaderVersion), followed by the pickled Abstract object.
+        A snapshot is only used if its header still matches the xml file, so
+        editing one abstract only invalidates the snapshot for that file.
+        """
+    path = None        # directory containing snapshot files
+    nHits = 0          # number of abstracts read from snapshots
+    nMisses = 0        # number of abstracts with no valid snapshot
+
+    def __init__(self, path):
+        """ path = directory used to store snapshot files. it is created if needed """
+        if len(path) > 0 and path[-1] != '/':
+            path = path + '/'
+        self.path = path
+        self.nHits = 0
+        self.nMisses = 0
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+    def snapshotFilename(self, filename):
+        """ return name of snapshot file for a given xml file """
+        filename = os.path.abspath(filename)
+        return self.path + os.path.basename(filename) + '.' \
+            + hashlib.sha1(filename).hexdigest()[:12] + '.snapshot'
+
+    def fileStamp(self, filename):
+        """ return dictionary identifying the current version of a given xml file """
+        info = os.stat(filename)
+        return {'path': os.path.abspath(filename), 'size': info.st_size,
+                'mtime': info.st_mtime, 'sha1': self.contentHash(filename),
+                'version': abstract.Abstract.loaderVersion}
+
+    def contentHash(self, filename):
+        """ return sha1 hash of the contents of a given file """
+        file = open(filename, 'rb')
+        contentHash = hashlib.sha1(file.read()).hexdigest()
+        file.close()
+        return contentHash
+
+    def isCurrent(self, stamp, filename):
+        """ return True if the snapshot with the given header stamp was made from
+            the current contents of the xml file. """
+        if stamp.get('version') != abstract.Abstract.loaderVersion \
+                or stamp.get('path') != os.path.abspath(filename):
+            return False
+        info = os.stat(filename)
+        if stamp.get('size') != info.st_size:
+            return False
+        # file may have been touched without being changed
+        return stamp.get('mtime') == info.st_mtime \
+            or stamp.get('sha1') == self.contentHash(filename)
+
+    def load(self, filename):
+        """ return the Abstract for a given xml file from its snapshot.
+            return None if there is no snapshot or it is out of date or incomplete. """
+        snapshotFilename = self.snapshotFilename(filename)
+        if not os.path.exists(snapshotFilename):
+            self.nMisses += 1
+            return None
+
+        gcEnabled = gc.isenabled()
+        # collection passes triggered by the many new objects only slow loading down
+        gc.disable()
+        abs = None
+        try:
+            file = open(snapshotFilename, 'rb')
+            try:
+                stamp = cPickle.load(file)
+                if isinstance(stamp, dict) and self.isCurrent(stamp, filename):
+                    abs = cPickle.load(file)
+            finally:
+                file.close()
+        except Exception, e:
+            print 'Ignoring unreadable snapshot', snapshotFilename, ':', e
+            abs = None
+        finally:
+            if gcEnabled:
+                gc.enable()
+
+        if isinstance(abs, abstract.Abstract):
+            self.nHits += 1
+            return abs
+        self.nMisses += 1
+        return None
+
+    def save(self, filename, abs, stamp):
+        """ write snapshot of an abstract read from a given xml file.
+            stamp = file stamp for the xml file taken before it was read. """
+        try:
+            pickledAbstract = pickleAbstract(abs)
+        except Exception, e:
+            print 'Unable to write snapshot for', filename, ':', e
+            return
+        self.savePickled(filename, pickledAbstract, stamp)
+
+    def savePickled(self, filename, pickledAbstract, stamp):
+        """ write snapshot for a given xml file.
+            pickledAbstract = string returned by pickleAbstract() for its abstract
+            stamp = file stamp for the xml file taken before it was read.
+
+            The snapshot is written to a temporary file first and then renamed,
+            so an interrupted run never leaves a partial snapshot behind. """
+        snapshotFilename = self.snapshotFilename(filename)
+        (fd, tmpFilename) = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+        try:
+            file = os.fdopen(fd, 'wb')
+            try:
+                cPickle.dump(stamp, file, cPickle.HIGHEST_PROTOCOL)
+                file.write(pickledAbstract)
+            finally:
+                file.close()
+            os.rename(tmpFilename, snapshotFilename)
+        except Exception, e:
+            print 'Unable to write snapshot', snapshotFilename, ':', e
+            if os.path.exists(tmpFilename):
+                os.remove(tmpFilename)
@@ -7,8 +7,12 @@ maintain lists of abstracts
 
 import glob
 import gc
+import itertools
+import multiprocessing
+import cPickle
 
 import abstract
+import abstractcache
 from operator import attrgetter
 from crossvalidate import CrossValidationSets
 from templates import Templates
@@ -17,6 +21,16 @@ from templates import Templates
 __author__ = 'Rodney L. Summerscales'
 
 
+def readPickledAbstract(args):
+    """ read an abstract from an xml file in a worker process.
+        args = (filename, loadRegistries, parser)
+        return the pickled Abstract. the sentence filter is applied by the
+        parent process, so every sentence is included here. """
+    (filename, loadRegistries, parser) = args
+    abs = abstract.Abstract(filename, None, loadRegistries, parser)
+    return abstractcache.pickleAbstract(abs)
+
+
 class AbstractList:
     """ maintain a list of Abstract objects """
     __list = []       # list of abstracts
@@ -24,9 +38,13 @@ class AbstractList:
     cvSets = []       # list of testing/training sets for k-fold crossvalidation
     nFolds = 0      # number of folds used for crossvalidation
     sentenceFilter = None
+    parser = 'iterparse'   # xml parser used to read abstract files
+    snapshotPath = None    # directory for snapshots of loaded abstracts (None = do not use them)
+    nWorkers = 1           # number of processes used to parse xml files
+    workerChunkSize = 4    # number of files sent to a worker process at a time
 
     def __init__(self, path=None, nFolds=0, sentenceFilter=None, label='', \
-                 loadRegistries=True):
+                 loadRegistries=True, parser='iterparse', snapshotPath=None, nWorkers=1):
         """ create new list of abstracts
             allow list to be populated from an xml file
 
@@ -36,11 +54,23 @@ class AbstractList:
                      and returns True if the sentence should be included
                      and False if it should be ignored.
                      (optional. default is to include every sentence.)
+            parser = xml parser used to read each file ('iterparse' or 'minidom').
+                     (optional. default is the streaming 'iterparse' reader.)
+            snapshotPath = directory used to keep binary snapshots of loaded
+                     abstracts. unchanged xml files are read from their snapshots
+                     instead of being parsed again.
+                     (optional. default is to always parse the xml files.)
+            nWorkers = number of worker processes used to parse xml files.
+                     abstracts are in the same order for any number of workers.
+                     (optional. default is to parse them in this process.)
                              """
         self.__list = []
         self.__index = 0
         self.cvSets = []
         self.nFolds = nFolds
+        self.parser = parser
+        self.snapshotPath = snapshotPath
+        self.nWorkers = nWorkers
         if sentenceFilter == None:
             self.sentenceFilter = lambda sentence: True
         else:
@@ -86,13 +116,13 @@ class AbstractList:
 
             Filter is applied to entire collection of sentences, not the results
             from a previous filter operation."""
-        for abs in self.__list:
+        for abs in self:
             abs.filterSentences(sentenceFilter)
 
     def labelsToAnnotations(self, labelList):
         """ For each token in the list of abstracts, if it has been assigned a label in
             a given list of labels, change the label into an annotation for the token"""
-        for abs in self.__list:
+        for abs in self:
             for sentence in abs.allSentences():
                 for token in sentence:
                     for label in labelList:
@@ -105,7 +135,7 @@ class AbstractList:
     def labelsToSemanticTag(self, labelList):
         """ For each token in the list of abstracts, if it has been assigned a label in
             a given list of labels, change the label into a semantic tag for the token"""
-        for abs in self.__list:
+        for abs in self:
             for sentence in abs.sentences:
                 for token in sentence:
                     for label in labelList:
@@ -115,26 +145,30 @@ class AbstractList:
 
     def cleanupAnnotations(self):
         """ Cleanup minor annotation inconsistencies in the current list of abstracts. """
-        determinerSet = set(['a', 'the', 'an'])
-        for abstract in self.__list:
-            for sentence in abstract.allSentences():
-                for token in sentence:
-                    nextToken = token.nextToken()
-                    if nextToken != None:
-                        # add determiner at beginning of mention if not already there
-                        if token.text in determinerSet:
-                            typeList = ['group', 'outcome']
-                            for type in typeList:
-                                token.copyAnnotation(nextToken, type)
+        for abstract in self:
+            self.cleanupAbstractAnnotations(abstract)
 
-                        if token.text == 'with':
-                            token.copyAnnotation(nextToken, 'condition')
+    def cleanupAbstractAnnotations(self, abstract):
+        """ Cleanup minor annotation inconsistencies in a given abstract. """
+        determinerSet = set(['a', 'the', 'an'])
+        for sentence in abstract.allSentences():
+            for token in sentence:
+                nextToken = token.nextToken()
+                if nextToken != None:
+                    # add determiner at beginning of mention if not already there
+                    if token.text in determinerSet:
+                        typeList = ['group', 'outcome']
+                        for type in typeList:
+                            token.copyAnnotation(nextToken, type)
+
+                    if token.text == 'with':
+                        token.copyAnnotation(nextToken, 'condition')
 
     def removeLabels(self, labelList=[]):
         """ For each token in the list of abstracts, if it has been assigned a label in
             a given list of labels, remove it.
             if no list of labels is given, remove all labels. """
-        for abstract in self.__list:
+        for abstract in self:
             for sentence in abstract.allSentences():
                 sentence.templates = None
                 sentence.annotatedTemplates = None
@@ -147,7 +181,7 @@ class AbstractList:
             otherwise use annotated information.
 
             this also creates annotated templates regardless. """
-        for abstract in self.__list:
+        for abstract in self:
             for sentence in abstract.sentences:
                 sentence.templates = Templates(sentence, useLabels=useLabels)
                 sentence.annotatedTemplates = Templates(sentence, useLabels=False)
@@ -165,21 +199,97 @@ class AbstractList:
         else:
             fileList = glob.glob(path+'*.xml')
 
+        cache = None
+        gcEnabled = gc.isenabled()
+        if self.snapshotPath != None:
+            cache = abstractcache.AbstractCache(self.snapshotPath)
+        if cache != None or self.nWorkers > 1:
+            # snapshots and abstracts built by worker processes do not leave any
+            # garbage behind. automatic collections over the growing list of
+            # loaded abstracts would only slow down reading them, files parsed
+            # here are still collected below.
+            gc.disable()
+
         print 'Reading files from', path
+        try:
+            if self.nWorkers > 1:
+                self.__readFilesInParallel(fileList, loadRegistries, cache)
+            else:
+                self.__readFiles(fileList, loadRegistries, cache)
+        finally:
+            if gcEnabled:
+                gc.enable()
+
+        if cache != None:
+            print '%d abstracts read from snapshots, %d parsed' % (cache.nHits, cache.nMisses)
+        print 'Done!'
+        gc.collect()
+        self.cleanupAnnotations()
+
+
+    def __readFiles(self, fileList, loadRegistries, cache):
+        """ read the abstracts in a list of xml files one at a time """
         fileCount = 0
         for file in fileList:
+            abs = None
+            if cache != None:
+                abs = cache.load(file)
+            if abs != None:
+                print 'Reading snapshot:', file
+                abs.filterSentences(self.sentenceFilter)
+                self.__list.append(abs)
+                continue
+
             print 'Reading:',file
-            self.__list.append(abstract.Abstract(file, self.sentenceFilter, loadRegistries))
+            if cache != None:
+                stamp = cache.fileStamp(file)
+            abs = abstract.Abstract(file, self.sentenceFilter, loadRegistries, self.parser)
+            if cache != None:
+                cache.save(file, abs, stamp)
+            self.__list.append(abs)
             fileCount += 1
             if fileCount >= 200:
                 print "Calling GC..."
                 gc.collect()
                 fileCount = 0
 
-        print 'Done!'
-        gc.collect()
-        self.cleanupAnnotations()
-
+    def __readFilesInParallel(self, fileList, loadRegistries, cache):
+        """ read the abstracts in a list of xml files using a pool of worker
+            processes. abstracts are added to the list in the same order as the
+            files, so the result is the same as reading them one at a time. """
+        absList = [None] * len(fileList)
+        stamps = {}
+        parseList = []      # indices of files that need to be parsed
+        for i, file in enumerate(fileList):
+            if cache != None:
+                absList[i] = cache.load(file)
+                if absList[i] != None:
+                    print 'Reading snapshot:', file
+                    continue
+                stamps[i] = cache.fileStamp(file)
+            parseList.append(i)
+
+        if len(parseList) > 0:
+            print 'Parsing %d files with %d processes' % (len(parseList), self.nWorkers)
+            jobs = [(fileList[i], loadRegistries, self.parser) for i in parseList]
+            pool = multiprocessing.Pool(self.nWorkers)
+            try:
+                results = pool.imap(readPickledAbstract, jobs, self.workerChunkSize)
+                for i, pickledAbstract in itertools.izip(parseList, results):
+                    print 'Reading:', fileList[i]
+                    absList[i] = cPickle.loads(pickledAbstract)
+                    if cache != None:
+                        cache.savePickled(fileList[i], pickledAbstract, stamps[i])
+                pool.close()
+            except:
+                pool.terminate()
+                raise
+            finally:
+                pool.join()
+
+        for abs in absList:
+            abs.filterSentences(self.sentenceFilter)
+            self.__list.append(abs)
 
     def writeHTML(self, filename, labelList=[]):
         """ write sentences to html file. highlight correct and incorrect tokens
@@ -196,25 +306,32 @@ class AbstractList:
 
         out = open(filename, mode='w')
         out.write("<html><head><title>" + filename + "</title><body>\n<p>")
-        for abs in self.__list:
+        for abs in self:
             out.write('<p><b><u>' + abs.id + ':</u></b></p>\n')
             abs.writeHTML(out, labelList)
 
         out.write('</body></html>\n')
         out.close()
 
-    def writeXML(self, path='', label=''):
+    def writeXML(self, path='', label='', force=False):
         """ write all abstracts to xml files in the given path
-            abstract names are "<ABS_ID>.<LABEL>.xml" """
+            abstract names are "<ABS_ID>.<LABEL>.xml"
+
+            abstracts that have not changed since they were read from (or last
+            written to) the same file are skipped, unless force is True. """
         if len(path) > 0 and path[-1] != '/':
             path = path + '/'
-        for abs in self.__list:
+        nSkipped = 0
+        for abs in self:
             filename = path+abs.id
             if len(label) > 0:
                 filename = filename+'.'+label
             filename = filename+'.xml'
-            abs.writeXML(filename)
-        gc.collect()
+            if force or abs.needsWriting(filename):
+                abs.writeXML(filename)
+            else:
+                nSkipped += 1
+        print '%d abstracts written, %d unchanged' % (len(self) - nSkipped, nSkipped)
 
     def __len__(self):
         """ implement len() method """
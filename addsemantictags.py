@@ -21,7 +21,7 @@ class SemanticTagAnnotator(dictionaryfinder.DictionaryFinder):
     def applyRules(self, token):
         """ Label given token if it appears in a list of words """
         if token.text in self.wordSet or token.lemma in self.wordSet:
-            token.semanticTags.add(self.entityTypes[0])
+            token.addSemanticTag(self.entityTypes[0])
 
 if len(sys.argv) < 2:
     print "Usage: addsemantictags.py <PATH>"
@@ -11,18 +11,28 @@ from xml.dom.minidom import Document
 ##############################################################
 # stores an annotation  
 ##############################################################
-class Annotation:
+class Annotation(object):
   """ maintain information related to a token annotation or label assigned
       by a classifier """
-  type = ''         # e.g. group, outcome number, etc
-  attributes = {}   # e.g. id, role, etc
+  __slots__ = ('type',         # e.g. group, outcome number, etc
+               'attributes')   # e.g. id, role, etc
+  noAttributes = {}   # shared by annotations without attributes. never modify it.
   
   def __init__(self, type=''):
     """ initialize a new annotation with default values 
         """
-    self.attributes = {}
+    self.attributes = self.noAttributes
     self.type = type
     
+  def __getstate__(self):
+    return (self.type, self.attributes)
+
+  def __setstate__(self, state):
+    """ restore pickled annotation, sharing the empty attribute dictionary """
+    (self.type, self.attributes) = state
+    if len(self.attributes) == 0:
+      self.attributes = self.noAttributes
+
   def parseXML(self, node=None):
     """ load information from an xml node """
     # parse xml element if given one
@@ -32,13 +42,19 @@ class Annotation:
          if childNode.nodeType == xml.dom.Node.ELEMENT_NODE:
            attribName = childNode.tagName
            value = xmlutil.getText(childNode)
-           self.attributes[attribName] = value
+           self.setAttributeValue(attribName, value)
+
+  def parseElement(self, element):
+    """ load information from an ElementTree element """
+    self.type = element.get('type', '').lower()
+    for childElement in element:
+      self.setAttributeValue(childElement.tag, xmlutil.getElementText(childElement))
 
   def copy(self, annotation):
     """ copy annotation information from a given annotation to this one """
     self.type = annotation.type
     for key, value in annotation.attributes.items():
-      self.attributes[key] = value
+      self.setAttributeValue(key, value)
       
   def getXML(self, doc, elementName):
     """ return an xml node that contains label information """
@@ -48,6 +64,13 @@ class Annotation:
       node.appendChild(xmlutil.createNodeWithTextChild(doc, attrib, value))
     return node
 
+  def writeElement(self, writer, elementName):
+    """ write the same element as getXML() to an xmlutil.XMLWriter """
+    writer.startElement(elementName, {'type':self.type})
+    for attrib, value in self.attributes.items():
+      writer.textElement(attrib, {}, value)
+    writer.endElement()
+
   def getAttributeValue(self, attrib):
     """ return the value of the given attribute 
         or empty string if the annotation does not have such an attribute """
@@ -58,29 +81,45 @@ class Annotation:
         attrib = name of attribute
         value = value for the attribute
         """
+    if self.attributes is self.noAttributes:
+      self.attributes = {}
     self.attributes[attrib] = value
         
 ##############################################################
 # manage a list of annotations 
 ##############################################################
-class AnnotationList:
+class AnnotationList(object):
   """ maintain a list of Annotation objects """
-  __annotations = {}   # actually a hash of annotations, keyed by name
-  __index = 0          # current index in list (used for iterator)
-  __annotationList = []  # used in iterator
+  __slots__ = ('__annotations',)   # actually a hash of annotations, keyed by name
+  noAnnotations = {}   # shared by empty lists. never modify it.
          
   def __init__(self, nodeList=[]):
     """ create new annoation list given a list of xml element nodes
         of type "annotation" """
-    self.__annotations = {}
-    self.__index = 0
-    self.__annotationList = []
+    self.__annotations = self.noAnnotations
     # parse xml node if given one
     for aNode in nodeList:
       annotation = Annotation()
       annotation.parseXML(aNode)
-      self.__annotations[annotation.type] = annotation 
-     
+      self.add(annotation)
+
+  def __getstate__(self):
+    return self.__annotations
+
+  def __setstate__(self, state):
+    """ restore pickled list, sharing the empty annotation dictionary """
+    if len(state) == 0:
+      state = self.noAnnotations
+    self.__annotations = state
+
+  def parseElements(self, elementList):
+    """ add annotations for each ElementTree element in a given list
+        of "annotation" (or "label") elements """
+    for element in elementList:
+      annotation = Annotation()
+      annotation.parseElement(element)
+      self.add(annotation)
+
   def contains(self, name):
     """ return true if an annotation with given name is in list """
     return name in self.__annotations
@@ -97,6 +136,8 @@ class AnnotationList:
     
         annotation = Annotation object to add
         """
+    if self.__annotations is self.noAnnotations:
+      self.__annotations = {}
     self.__annotations[annotation.type] = annotation
       
   def remove(self, name):
@@ -118,14 +159,5 @@ class AnnotationList:
     """ implement len() method """
     return len(self.__annotations)
   
-  # routines needed for implementing the iterator      
   def __iter__(self):
-    self.__index = 0
-    self.__annotationList = self.__annotations.values()
-    return self
-    
-  def next(self):
-    if self.__index == len(self.__annotationList):
-      raise StopIteration
-    self.__index += 1
-    return self.__annotationList[self.__index-1]
+    return iter(self.__annotations.values())
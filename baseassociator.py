@@ -2,6 +2,7 @@
 # author: Rodney Summerscales
 # base template for associating mentions with quantities
 
+import rundirectory
 from finder import Finder
 from finder import EntityStats
 from statlist import StatList
@@ -530,7 +531,7 @@ class BaseOutcomeMeasurementAssociator(BaseMentionQuantityAssociator):
         # how many of the associations are correct/incorrect?
         statDescription = '(G,O) - OM'
         stats = EntityStats([statDescription])
-        taFile = open('trueassociations.%s.txt'%self.finderType, 'w')
+        taFile = open(rundirectory.outputFilename('trueassociations.%s.txt'%self.finderType), 'w')
         for abstract in absList:
             errorOut.write('---%s ---\n'%(abstract.id))
             trueAssociations = self.buildTrueAssociations(abstract)
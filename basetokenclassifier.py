@@ -1,11 +1,14 @@
 #!/usr/bin/python
 # author: Rodney Summerscales
 
-class TokenLabel:
+import os
+import featureindex
+import featurestore
+import rundirectory
+
+class TokenLabel(object):
   """ label and it's probilities assigned to a token by a classifier """
-  label=None
-  prob=0.0
-  sequenceProb=0.0
+  __slots__ = ('label', 'prob', 'sequenceProb')
   
   def __init__(self, label):
     """ create new label with given name and probabilities of 1.0 """
@@ -20,10 +23,20 @@ class BaseTokenClassifier:
       """  
   classifierType = None
   topK = 1
+  featureIndex = None   # FeatureIndex mapping feature strings to ids for the current model
+  featureProfile = None # FeatureProfile counting the bytes written for each feature family (optional)
+  minFeatureCount = 1   # features that occur fewer times in the training data are not used
+  maxFeaturesPerFamily = None  # if given, only use the most frequent features of each family
+  featureFilter = None  # FeatureFilter for the model being trained or applied (None = all features)
+  workPath = None       # directory for the classifier's intermediate files (None = current directory)
+  streamFeatures = True # if True, pipe features to the classifier instead of writing feature files
   
-  def __init__(self, classifierType, topK=1):
+  def __init__(self, classifierType, topK=1, minFeatureCount=1, maxFeaturesPerFamily=None):
     self.classifierType = classifierType
     self.topK = topK
+    self.featureIndex = featureindex.FeatureIndex()
+    self.minFeatureCount = minFeatureCount
+    self.maxFeaturesPerFamily = maxFeaturesPerFamily
           
   def train(self, absList, modelfilename, entityTypes):
     """ Train a token classifier model given a list of abstracts """
@@ -41,6 +54,82 @@ class BaseTokenClassifier:
         """
     raise NotImplementedError("Need to implement writeFeatureFile()")
 
+  def featureMatrices(self, absList, tokenFilter=None, addFeatures=True):
+    """ generate (abstract, sentence number, sentence, FeatureMatrix) for
+        every sentence in a list of abstracts. the matrix has a row for each
+        token that passes the token filter (sentences without such tokens get
+        an empty matrix). only the features kept by the feature filter are
+        included. the matrices are counted in the feature profile, if any.
+        """
+    if self.featureFilter != None:
+      # the features that are kept are in the index, leave the others out of it
+      self.featureFilter.keys(self.featureIndex)
+      addFeatures = False
+    for abstract in absList:
+      for s, sentence in enumerate(abstract.sentences):
+        matrix = featurestore.featureMatrix(self.featureIndex, sentence, tokenFilter, addFeatures)
+        if self.featureFilter != None:
+          matrix = self.featureFilter.apply(matrix, self.featureIndex)
+        if self.featureProfile != None:
+          self.featureProfile.countWritten(matrix, self.featureIndex)
+        yield (abstract, s, sentence, matrix)
+
+  def featureFilterFilename(self, modelFilename):
+    """ return the name of the file holding the features selected for a model """
+    return modelFilename + '.features'
+
+  def selectFeatures(self, absList, modelFilename, tokenFilter=None):
+    """ choose the features used to train a model from their counts in a list
+        of abstracts and save them next to the model file. if no thresholds are
+        set, all features are used. the features are counted with a separate
+        index, so the new feature index of the model only gets ids for the
+        features that are kept (see featureMatrices). """
+    filename = self.featureFilterFilename(modelFilename)
+    self.featureIndex = featureindex.FeatureIndex()
+    self.featureFilter = None
+    if self.minFeatureCount <= 1 and self.maxFeaturesPerFamily == None:
+      if os.path.exists(filename):
+        os.remove(filename)
+      return
+    featureFilter = featureindex.FeatureFilter(self.minFeatureCount, self.maxFeaturesPerFamily)
+    countIndex = featureindex.FeatureIndex()
+    matrices = []
+    for abstract in absList:
+      for sentence in abstract.sentences:
+        matrices.append(featurestore.featureMatrix(countIndex, sentence, tokenFilter))
+    featureFilter.fit(matrices, countIndex)
+    featureFilter.printCounts()
+    featureFilter.save(filename)
+    self.featureFilter = featureFilter
+
+  def useSelectedFeatures(self, modelFilename):
+    """ use the features that were selected when a model was trained
+        (all features if none were selected) with a new feature index """
+    self.featureIndex = featureindex.FeatureIndex()
+    self.featureFilter = featureindex.loadFeatureFilter(self.featureFilterFilename(modelFilename))
+
+  def writeFeatures(self, featureFile, features, abstract, sentenceIndex, token):
+    """ write a list of feature strings for a token to a feature file,
+        each followed by a space """
+    try:
+      featureFile.write(' '.join(features) + ' ')
+    except (UnicodeEncodeError, UnicodeDecodeError):
+      for feature in features:
+        try:
+          featureFile.write(feature+' ')
+        except UnicodeEncodeError: 
+          print 'UnicodeEncodeError:',
+          print 'abs=',abstract.id, 'sentence=', sentenceIndex, 'token=',token.index
+          print 'feature=', feature
+          featureFile.write(feature.encode('ascii', 'xmlcharrefreplace'))
+
+  def workFilename(self, filename):
+    """ return the path of an intermediate file in the work directory
+        (the work directory of the active run if no directory is given) """
+    if self.workPath == None:
+      return rundirectory.workFilename(filename)
+    return os.path.join(self.workPath, filename)
+
   def entityTypesString(self, entityTypes):
     """ return string containing list of entity types """
     return '-'.join(entityTypes)
@@ -50,6 +139,66 @@ class BaseTokenClassifier:
         """
     raise NotImplementedError("Need to implement readLabelFile()")
         
+  def readNBestLabels(self, labelFilename):
+    """ read a label file in the format written by the Mallet simple tagger
+        (n-best labels and sequence probabilities) and return the list of labels """
+    labelFile = open(labelFilename, 'r')
+    labels = self.readNBestLines(labelFile, labelFilename)
+    labelFile.close()
+    return labels
+
+  def readNBestLines(self, labelLines, name):
+    """ parse lines in the format written by the Mallet simple tagger one at a
+        time and return the list of labels.
+        labelLines = iterator over the lines (e.g. a file or the output of the tagger)
+        name = name of the file or tool the lines come from (for error messages) """
+    labels = []
+    lineNo = 1
+    sequenceProb = []
+    for i in range(self.topK):
+      sequenceProb.append(0.0)
+    
+    currentTopK = self.topK  
+    for line in labelLines:
+      try:
+        topKLabels = line.strip().split()
+        if len(topKLabels) > 0:
+          if topKLabels[0] == 'k' :
+            newTopK = int(topKLabels[1])
+            if newTopK != currentTopK:
+              currentTopK = newTopK
+              sequenceProb = []
+              for i in range(currentTopK):
+                sequenceProb.append(0.0)
+            # this is the list of sequence probabilities
+            for i in range(currentTopK):
+              sequenceProb[i] = float(topKLabels[i+2])
+#            print lineNo, topKLabels[1], currentTopK, sequenceProb
+          elif len(topKLabels) == 2*currentTopK:
+            tokenLabelList = []
+            for i in range(0,currentTopK*2,2):
+              label = topKLabels[i]
+              prob = float(topKLabels[i+1])
+              tLabel = TokenLabel(label)
+              tLabel.prob = prob
+              tLabel.sequenceProb = sequenceProb[i/2]
+              tokenLabelList.append(tLabel)
+#              print 'Read:', tLabel.label, tLabel.sequenceProb, tLabel.prob  
+    
+            labels.append(tokenLabelList)  
+#        if len(topKLabels) == self.topK:
+#    #        for i in range(len(topKLabels)):
+#    #          if topKLabels[i] == 'O':
+#    #            topKLabels[i] = 'other'
+#          if self.topK == 1:
+#            labels.append(topKLabels[0])
+#          else:
+#            labels.append(topKLabels) 
+      except:
+        print '%s: Error at line number %d' % (name, lineNo)  
+      lineNo += 1     
+    return labels
+
   def returnsAlternateLabels(self):
     """ return True if classifier returns alternate labels for tokens """
     return self.topK > 1 
@@ -0,0 +1,863 @@
+#!/usr/bin/python
+# author: Rodney Summerscales
+# performance benchmarks for the summarization pipeline
+
+import sys
+import os
+import gc
+import time
+import random
+import resource
+import shutil
+import tempfile
+import xml.dom.minidom
+import multiprocessing
+import distutils.spawn
+import nltk.corpus
+
+import abstractlist
+import lazyabstractlist
+import xmlutil
+import sentencetoken
+import mentionfinder
+import numberfinder
+import featurestore
+import featureengine
+import mallet
+import crf
+import findertask
+
+
+def runInChildProcess(function, args):
+    """ call function(*args) in a separate process so that its peak memory
+        use can be measured on its own. return the value returned by the function
+        and the peak resident set size (in KB) of the child process. """
+    resultQueue = multiprocessing.Queue()
+
+    def child():
+        # do not let progress messages from the pipeline swamp the results
+        sys.stdout = open(os.devnull, 'w')
+        value = function(*args)
+        peakMemory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        resultQueue.put((value, peakMemory))
+
+    process = multiprocessing.Process(target=child)
+    process.start()
+    result = resultQueue.get()
+    process.join()
+    return result
+
+
+def loadAbstracts(path, parser, snapshotPath=None, nWorkers=1):
+    """ load all abstracts in a directory with a given xml parser.
+        return the number of abstracts and the time taken in seconds. """
+    startTime = time.time()
+    absList = abstractlist.AbstractList(path, parser=parser, snapshotPath=snapshotPath,
+                                        nWorkers=nWorkers)
+    return (len(absList), time.time() - startTime)
+
+
+def benchmarkLoader(path):
+    """ compare load time and peak memory of the minidom and streaming
+        abstract loaders on the same directory. """
+    print 'Loading abstracts in', path
+    print '%-10s %10s %10s %14s' % ('parser', 'abstracts', 'seconds', 'peak RSS (MB)')
+    for parser in ['minidom', 'iterparse']:
+        ((nAbstracts, seconds), peakMemory) = runInChildProcess(loadAbstracts, (path, parser))
+        print '%-10s %10d %10.2f %14.1f' % (parser, nAbstracts, seconds, peakMemory / 1024.0)
+
+
+def benchmarkSnapshot(path):
+    """ compare load time of parsing the xml files, writing snapshots of them
+        and reading the abstracts back from the snapshots. """
+    snapshotPath = tempfile.mkdtemp(prefix='snapshots')
+    try:
+        print 'Loading abstracts in', path
+        print '%-16s %10s %10s %14s' % ('load', 'abstracts', 'seconds', 'peak RSS (MB)')
+        for (name, snapshotDir) in [('parse xml', None), ('write snapshots', snapshotPath),
+                                    ('read snapshots', snapshotPath)]:
+            ((nAbstracts, seconds), peakMemory) = runInChildProcess(loadAbstracts,
+                                                                    (path, 'iterparse', snapshotDir))
+            print '%-16s %10d %10.2f %14.1f' % (name, nAbstracts, seconds, peakMemory / 1024.0)
+    finally:
+        shutil.rmtree(snapshotPath)
+
+
+def benchmarkWorkers(path, maxWorkers=None):
+    """ measure how load time scales with the number of worker processes
+        used to parse the xml files, from 1 up to maxWorkers (default is the
+        number of cpus). """
+    if maxWorkers == None:
+        maxWorkers = multiprocessing.cpu_count()
+    maxWorkers = int(maxWorkers)
+    print 'Loading abstracts in', path, 'with', multiprocessing.cpu_count(), 'cpus'
+    print '%-10s %10s %10s %10s %14s' % ('workers', 'abstracts', 'seconds', 'speedup', 'peak RSS (MB)')
+    serialSeconds = None
+    for nWorkers in range(1, maxWorkers + 1):
+        ((nAbstracts, seconds), peakMemory) = runInChildProcess(loadAbstracts,
+                                                                (path, 'iterparse', None, nWorkers))
+        if serialSeconds == None:
+            serialSeconds = seconds
+        print '%-10d %10d %10.2f %10.2f %14.1f' % (nWorkers, nAbstracts, seconds, serialSeconds / seconds,
+                                                   peakMemory / 1024.0)
+
+
+def labelNumbers(path, maxTokens):
+    """ load abstracts, then label and count the numbers in every abstract in
+        two passes, the way finders use a list of abstracts.
+        maxTokens = memory budget for LazyAbstractList (None = AbstractList).
+        return the number of labeled tokens and the time taken in seconds. """
+    startTime = time.time()
+    if maxTokens == None:
+        absList = abstractlist.AbstractList(path)
+    else:
+        absList = lazyabstractlist.LazyAbstractList(path, maxTokens=maxTokens)
+    for abstract in absList:
+        for sentence in abstract.sentences:
+            for token in sentence:
+                if token.isNumber():
+                    token.addLabel('on')
+    nLabeled = 0
+    for abstract in absList:
+        for sentence in abstract.sentences:
+            for token in sentence:
+                if token.hasLabel('on'):
+                    nLabeled += 1
+    if maxTokens != None:
+        absList.close()
+    return (nLabeled, time.time() - startTime)
+
+
+def benchmarkLazy(path, maxTokens=20000):
+    """ compare time and peak memory of AbstractList and LazyAbstractList
+        for a two pass labeling task. """
+    maxTokens = int(maxTokens)
+    print 'Labeling abstracts in', path
+    print '%-24s %10s %10s %14s' % ('list', 'labels', 'seconds', 'peak RSS (MB)')
+    for (name, budget) in [('AbstractList', None), ('LazyAbstractList(%d)' % maxTokens, maxTokens)]:
+        ((nLabeled, seconds), peakMemory) = runInChildProcess(labelNumbers, (path, budget))
+        print '%-24s %10d %10.2f %14.1f' % (name, nLabeled, seconds, peakMemory / 1024.0)
+
+
+def residentMemory():
+    """ return the current resident set size of this process in KB """
+    statusFile = open('/proc/self/status')
+    for line in statusFile:
+        if line.startswith('VmRSS:'):
+            statusFile.close()
+            return int(line.split()[1])
+    statusFile.close()
+    return 0
+
+
+def measureCorpusMemory(path):
+    """ load all abstracts in a directory and return the number of abstracts,
+        tokens and objects tracked by the garbage collector, and the
+        increase in resident memory (in KB) needed to keep them. """
+    gc.collect()
+    startMemory = residentMemory()
+    startObjects = len(gc.get_objects())
+    absList = abstractlist.AbstractList(path)
+    gc.collect()
+    nTokens = 0
+    for abstract in absList:
+        for sentence in abstract.titleSentences + abstract.affiliationSentences \
+                + abstract.allSentences():
+            nTokens += len(sentence.tokens)
+    return (len(absList), nTokens, len(gc.get_objects()) - startObjects,
+            residentMemory() - startMemory)
+
+
+def benchmarkMemory(path):
+    """ measure the memory used to keep a loaded corpus in memory """
+    print 'Loading abstracts in', path
+    ((nAbstracts, nTokens, nObjects, memory), peakMemory) = runInChildProcess(measureCorpusMemory, (path,))
+    print '%-24s %12d' % ('abstracts', nAbstracts)
+    print '%-24s %12d' % ('tokens', nTokens)
+    print '%-24s %12d' % ('gc tracked objects', nObjects)
+    print '%-24s %12.1f' % ('objects per token', float(nObjects) / max(nTokens, 1))
+    print '%-24s %12.1f' % ('corpus memory (MB)', memory / 1024.0)
+    print '%-24s %12.1f' % ('bytes per token', memory * 1024.0 / max(nTokens, 1))
+    print '%-24s %12.1f' % ('peak RSS (MB)', peakMemory / 1024.0)
+
+
+def countNumbers(absList, useColumns):
+    """ count the tokens in every sentence that are numbers, either by asking
+        each token or with the vectorized sentence columns """
+    nNumbers = 0
+    for abstract in absList:
+        for sentence in abstract.sentences:
+            if useColumns:
+                nNumbers += int(sentence.getColumns().textTable(isNumberText).sum())
+            else:
+                for token in sentence:
+                    if token.isNumber():
+                        nNumbers += 1
+    return nNumbers
+
+
+def isNumberText(text):
+    """ return True if a token with the given text is a number (see Token.isNumber) """
+    return sentencetoken.Token(text).isNumber()
+
+
+stopWordList = nltk.corpus.stopwords.words('english')
+
+
+def predicatesWithoutFlags(token):
+    """ return (isNumber, isInteger, isStopWord, isAcronym) for a token,
+        computed the way they were before tokens had predicate flags """
+    text = token.text
+    isNullNumber = text.lower() in sentencetoken.Token.nullNumberWords
+    try:
+        float(text)
+        isNumber = True
+    except:
+        isNumber = isNullNumber
+    return (isNumber, text.isdigit() or isNullNumber,
+            text in stopWordList or text == 'versus',
+            len(text) > 1 and sentencetoken.Token.acronymPattern.match(text) != None)
+
+
+def predicatesWithFlags(token):
+    """ return (isNumber, isInteger, isStopWord, isAcronym) for a token """
+    return (token.isNumber(), token.isInteger(), token.isStopWord(), token.isAcronym())
+
+
+def benchmarkFlags(path, nPasses=10):
+    """ compare evaluating common token predicates with and without the
+        predicate flags, and time feature extraction when the flags are
+        computed during extraction and when they are already known """
+    nPasses = int(nPasses)
+    print 'Loading abstracts in', path
+    absList = abstractlist.AbstractList(path)
+    tokens = []
+    for abstract in absList:
+        for sentence in abstract.sentences:
+            tokens += sentence.tokens
+
+    print '%-24s %10s %10s' % ('predicates', 'calls', 'seconds')
+    for (name, predicates) in [('without flags', predicatesWithoutFlags),
+                               ('with flags', predicatesWithFlags)]:
+        startTime = time.time()
+        for i in range(nPasses):
+            for token in tokens:
+                predicates(token)
+        print '%-24s %10d %10.2f' % (name, 4 * nPasses * len(tokens), time.time() - startTime)
+
+    for token in tokens:
+        token.changed()
+    finder = mentionfinder.MentionFinder(['group'], None)
+    print '%-24s %10s %10s %12s' % ('feature extraction', 'tokens', 'seconds', 'tokens/sec')
+    for name in ['flags computed', 'flags known']:
+        startTime = time.time()
+        finder.computeFeatures(absList, 'train')
+        seconds = time.time() - startTime
+        print '%-24s %10d %10.2f %12.0f' % (name, len(tokens), seconds, len(tokens) / seconds)
+
+
+def benchmarkColumns(path, nPasses=10):
+    """ compare the time needed to evaluate a token predicate over a corpus
+        token by token and with sentence columns. the first column pass also
+        builds the columns. """
+    nPasses = int(nPasses)
+    print 'Loading abstracts in', path
+    absList = abstractlist.AbstractList(path)
+    print '%-10s %10s %10s' % ('method', 'numbers', 'seconds')
+    for (name, useColumns) in [('tokens', False), ('columns', True)]:
+        startTime = time.time()
+        for i in range(nPasses):
+            nNumbers = countNumbers(absList, useColumns)
+        print '%-10s %10d %10.2f' % (name, nNumbers, time.time() - startTime)
+
+
+def writeAbstractsWithDOM(absList, path):
+    """ write every abstract to an xml file the way Abstract.writeXML() used to:
+        build a minidom tree for the abstract and then serialize it """
+    for abstract in absList:
+        out = open(os.path.join(path, abstract.id + '.xml'), 'w')
+        xmlutil.writexml(abstract.getXML(xml.dom.minidom.Document()), out)
+        out.close()
+
+
+def writeAbstractsWithStream(absList, path):
+    """ write every abstract to an xml file with the streaming xml writer """
+    for abstract in absList:
+        out = open(os.path.join(path, abstract.id + '.xml'), 'w')
+        abstract.writeElement(xmlutil.XMLWriter(out))
+        out.close()
+
+
+def timeWriter(path, writeFunction):
+    """ load the abstracts in a directory and write them with a given function.
+        return the number of bytes written, the time taken to write them
+        and the increase in resident memory (in KB) while writing. """
+    absList = abstractlist.AbstractList(path)
+    outPath = tempfile.mkdtemp(prefix='written')
+    try:
+        gc.collect()
+        startMemory = residentMemory()
+        startTime = time.time()
+        writeFunction(absList, outPath)
+        seconds = time.time() - startTime
+        peakMemory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        nBytes = sum(os.path.getsize(os.path.join(outPath, f)) for f in os.listdir(outPath))
+    finally:
+        shutil.rmtree(outPath)
+    return (nBytes, seconds, max(peakMemory - startMemory, 0))
+
+
+def benchmarkWriter(path):
+    """ compare the throughput of writing abstracts by building minidom trees
+        and with the streaming xml writer """
+    print 'Writing abstracts in', path
+    print '%-10s %10s %10s %10s %16s' % ('writer', 'MB', 'seconds', 'MB/s', 'extra peak (MB)')
+    for (name, writeFunction) in [('minidom', writeAbstractsWithDOM), ('stream', writeAbstractsWithStream)]:
+        ((nBytes, seconds, memory), peakMemory) = runInChildProcess(timeWriter, (path, writeFunction))
+        megabytes = nBytes / (1024.0 * 1024.0)
+        print '%-10s %10.1f %10.2f %10.2f %16.1f' % (name, megabytes, seconds, megabytes / max(seconds, 1e-6),
+                                                     memory / 1024.0)
+
+
+def timeRewrite(path, force):
+    """ copy the abstracts in a directory, change one of them and write the
+        list back to the copies. return the number of abstracts and the time
+        taken to write them in seconds. """
+    copyPath = tempfile.mkdtemp(prefix='rewrite')
+    try:
+        for filename in os.listdir(path):
+            if filename.endswith('.xml'):
+                shutil.copy(os.path.join(path, filename), copyPath)
+        absList = abstractlist.AbstractList(copyPath)
+        # write the cleaned up annotations once, so only the change below is new
+        absList.writeXML(copyPath)
+        absList[0].sentences[0].tokens[0].addLabel('outcome')
+        startTime = time.time()
+        absList.writeXML(copyPath, force=force)
+        seconds = time.time() - startTime
+    finally:
+        shutil.rmtree(copyPath)
+    return (len(absList), seconds)
+
+
+def benchmarkRewrite(path):
+    """ compare rewriting every abstract with writing only the changed ones """
+    print 'Rewriting abstracts in', path
+    print '%-10s %10s %10s' % ('write', 'abstracts', 'seconds')
+    for (name, force) in [('all', True), ('changed', False)]:
+        ((nAbstracts, seconds), peakMemory) = runInChildProcess(timeRewrite, (path, force))
+        print '%-10s %10d %10.2f' % (name, nAbstracts, seconds)
+
+
+def timeParseTrees(path):
+    """ load the abstracts in a directory, then build the parse trees of the
+        body sentences (used by the mention finders) and of the title and
+        affiliation sentences (never used by train/test runs).
+        return the number of sentences and time in seconds for each step. """
+    startTime = time.time()
+    absList = abstractlist.AbstractList(path)
+    loadSeconds = time.time() - startTime
+
+    bodySentences = []
+    otherSentences = []
+    for abstract in absList:
+        bodySentences += abstract.allSentences()
+        otherSentences += abstract.titleSentences + abstract.affiliationSentences
+    times = []
+    for sentenceList in [bodySentences, otherSentences]:
+        startTime = time.time()
+        for sentence in sentenceList:
+            sentence.parseTree
+            sentence.dependencyGraphRoot
+        times.append(time.time() - startTime)
+    return (loadSeconds, len(bodySentences), times[0], len(otherSentences), times[1])
+
+
+def benchmarkParseTrees(path):
+    """ show how much of the load time is saved by building parse trees and
+        dependency graph roots when they are first used """
+    print 'Loading abstracts in', path
+    ((loadSeconds, nBody, bodySeconds, nOther, otherSeconds), peakMemory) = \
+        runInChildProcess(timeParseTrees, (path,))
+    print '%-36s %10s %10s' % ('step', 'sentences', 'seconds')
+    print '%-36s %10d %10.2f' % ('load (parse trees deferred)', nBody + nOther, loadSeconds)
+    print '%-36s %10d %10.2f' % ('body parse trees (on first use)', nBody, bodySeconds)
+    print '%-36s %10d %10.2f' % ('title/affiliation trees (skipped)', nOther, otherSeconds)
+    print '%-36s %10d %10.2f' % ('eager load (all of the above)', nBody + nOther,
+                                 loadSeconds + bodySeconds + otherSeconds)
+
+
+def timeFeatures(path, memoize, nPasses):
+    """ compute mention finder features for the abstracts in a directory.
+        return the number of tokens and the time in seconds """
+    absList = abstractlist.AbstractList(path)
+    finder = mentionfinder.MentionFinder(['group'], None)
+    finder.memoizeFeatures = memoize
+    nTokens = 0
+    for abstract in absList:
+        for sentence in abstract.sentences:
+            nTokens += len(sentence)
+    startTime = time.time()
+    for i in range(nPasses):
+        finder.computeFeatures(absList, 'train')
+    return (nTokens * nPasses, time.time() - startTime)
+
+
+def benchmarkFeatures(path, nPasses=3):
+    """ compare computing mention finder features with and without reusing
+        the features of each token for its context window and dependencies """
+    print 'Computing mention features for abstracts in', path
+    print '%-10s %10s %10s %12s' % ('memo', 'tokens', 'seconds', 'tokens/sec')
+    for (name, memoize) in [('off', False), ('on', True)]:
+        ((nTokens, seconds), peakMemory) = runInChildProcess(timeFeatures,
+                                                             (path, memoize, nPasses))
+        print '%-10s %10d %10.2f %12.0f' % (name, nTokens, seconds, nTokens / seconds)
+
+
+def timeFeatureStore(path, useStore, featurePath=None):
+    """ compute features for the number, event rate, group, outcome and
+        condition finders, with or without a shared feature store.
+        featurePath = directory of feature files used by the store (optional)
+        return the number of sentences reused from the store, the number read
+        from feature files and the time in seconds """
+    absList = abstractlist.AbstractList(path)
+    if useStore:
+        store = featurestore.FeatureStore(featurePath)
+    else:
+        store = None
+    ruleTypes = ['time', 'age', 'primary_outcome']
+    finders = [numberfinder.NumberFinder(['eventrate'], None, featureStore=store),
+               numberfinder.NumberFinder(['on', 'gs'], None, featureStore=store)]
+    for mentionType in ['group', 'outcome', 'condition']:
+        finders.append(mentionfinder.MentionFinder([mentionType], None, labelFeatures=ruleTypes,
+                                                   featureStore=store))
+    startTime = time.time()
+    for finder in finders:
+        finder.computeFeatures(absList, 'train')
+    seconds = time.time() - startTime
+    if store is None:
+        return (0, 0, seconds)
+    return (store.hits, store.diskHits, seconds)
+
+
+def benchmarkFeatureStore(path):
+    """ compare computing features for all of the finders with and without
+        sharing the features of each sentence between finders, and with
+        feature files written by a first run and read by a second run """
+    print 'Computing features for five finders on abstracts in', path
+    print '%-16s %16s %12s %10s' % ('store', 'sentences reused', 'from disk', 'seconds')
+    featurePath = tempfile.mkdtemp()
+    for (name, useStore, directory) in [('off', False, None), ('memory', True, None),
+                                        ('disk (write)', True, featurePath),
+                                        ('disk (read)', True, featurePath)]:
+        ((nReused, nRead, seconds), peakMemory) = runInChildProcess(timeFeatureStore,
+                                                                    (path, useStore, directory))
+        print '%-16s %16d %12d %10.2f' % (name, nReused, nRead, seconds)
+    shutil.rmtree(featurePath)
+
+
+def timeLabelChanges(path, useStore, fraction):
+    """ compute features for the group, outcome and condition finders, change
+        the rule based labels of a fraction of the tokens (as when the rule
+        based finders are run again) and compute the features again.
+        return the number of sentences whose label features were updated and
+        the time in seconds taken to compute the features the second time """
+    absList = abstractlist.AbstractList(path)
+    if useStore:
+        store = featurestore.FeatureStore()
+    else:
+        store = None
+    ruleTypes = ['time', 'age', 'primary_outcome']
+    finders = []
+    for mentionType in ['group', 'outcome', 'condition']:
+        finders.append(mentionfinder.MentionFinder([mentionType], None, labelFeatures=ruleTypes,
+                                                   featureStore=store))
+    for finder in finders:
+        finder.computeFeatures(absList, 'test')
+
+    random.seed(42)
+    for abstract in absList:
+        for sentence in abstract.sentences:
+            for token in sentence:
+                if random.random() < fraction:
+                    if len(token.labels) > 0:
+                        token.removeAllLabels(ruleTypes)
+                    else:
+                        token.addLabel(random.choice(ruleTypes))
+    startTime = time.time()
+    for finder in finders:
+        finder.computeFeatures(absList, 'test')
+    seconds = time.time() - startTime
+    if store is None:
+        return (0, seconds)
+    return (store.labelUpdates, seconds)
+
+
+def benchmarkLabelChanges(path, fraction=0.02):
+    """ compare computing all features again after rule based labels change
+        with updating only the features that depend on token labels """
+    fraction = float(fraction)
+    print 'Changing the labels of %.1f%% of the tokens in abstracts in %s' % (100 * fraction, path)
+    print '%-10s %18s %10s' % ('store', 'sentences updated', 'seconds')
+    for (name, useStore) in [('off', False), ('memory', True)]:
+        ((nUpdated, seconds), peakMemory) = runInChildProcess(timeLabelChanges,
+                                                              (path, useStore, fraction))
+        print '%-10s %18d %10.2f' % (name, nUpdated, seconds)
+
+
+def featureSetBytes(absList):
+    """ return the number of bytes used by the feature dictionaries and sets
+        of the tokens in a list of abstracts, counting each string once """
+    nBytes = 0
+    strings = {}
+    for abstract in absList:
+        for sentence in abstract.sentences:
+            for token in sentence:
+                nBytes += sys.getsizeof(token.features)
+                for featureSet in token.features.values():
+                    nBytes += sys.getsizeof(featureSet)
+                    for feature in featureSet:
+                        strings[id(feature)] = feature
+    return nBytes + sum([sys.getsizeof(string) for string in strings.values()])
+
+
+def featureMatrixBytes(matrices, index):
+    """ return the number of bytes used by a list of feature matrices and the
+        feature index they use """
+    nBytes = sum([sys.getsizeof(matrix) + matrix.nbytes() for matrix in matrices])
+    nBytes += sys.getsizeof(index.features.ids) + sys.getsizeof(index.features.strings)
+    return nBytes + sum([sys.getsizeof(string) for string in index.features.strings])
+
+
+def measureFeatureMemory(path):
+    """ compute group finder features for the abstracts in a directory.
+        return the number of tokens, the bytes needed to keep the features as
+        sets of strings and as feature matrices, and the seconds needed to
+        build the matrices. """
+    absList = abstractlist.AbstractList(path)
+    finder = mentionfinder.MentionFinder(['group'], None)
+    finder.computeFeatures(absList, 'train')
+    classifier = mallet.MalletTokenClassifier()
+    startTime = time.time()
+    matrices = [matrix for (abstract, s, sentence, matrix) in classifier.featureMatrices(absList)]
+    seconds = time.time() - startTime
+    nTokens = sum([len(matrix) for matrix in matrices])
+    return (nTokens, featureSetBytes(absList), featureMatrixBytes(matrices, classifier.featureIndex),
+            seconds)
+
+
+def benchmarkFeatureMatrix(path):
+    """ compare the memory used by the feature sets of the tokens with the
+        memory the sparse matrices built from them would need if they were kept
+        (the classifiers build them when needed and do not keep them) """
+    print 'Computing group finder features for abstracts in', path
+    ((nTokens, setBytes, matrixBytes, seconds), peakMemory) = runInChildProcess(measureFeatureMemory,
+                                                                                (path,))
+    print '%-28s %12d' % ('tokens', nTokens)
+    print '%-28s %12.1f' % ('feature sets (MB)', setBytes / 1048576.0)
+    print '%-28s %12.1f' % ('feature matrices (MB)', matrixBytes / 1048576.0)
+    print '%-28s %12.2f' % ('build matrices (seconds)', seconds)
+
+
+def timeFeatureEngine(path, useEngine, nPasses):
+    """ compute number and group finder features for the abstracts in a
+        directory, token by token or with a FeatureEngine. return a list of
+        (finder name, number of rows, seconds, number of differences from the
+        string features) """
+    absList = abstractlist.AbstractList(path)
+    ruleTypes = ['time', 'age', 'primary_outcome']
+    finders = [('number', numberfinder.NumberFinder(['on', 'gs'], None, useFeatureEngine=useEngine)),
+               ('group', mentionfinder.MentionFinder(['group'], None, labelFeatures=ruleTypes,
+                                                     useFeatureEngine=useEngine))]
+    results = []
+    for (name, finder) in finders:
+        startTime = time.time()
+        for i in range(nPasses):
+            finder.computeFeatures(absList, 'train')
+        seconds = time.time() - startTime
+        nRows = 0
+        for abstract in absList:
+            for sentence in abstract.sentences:
+                for token in sentence:
+                    if finder.tokenFilter == None or finder.tokenFilter(token):
+                        nRows += 1
+        if useEngine:
+            nDifferences = len(featureengine.compareFeatures(finder, absList, 'train'))
+        else:
+            nDifferences = 0
+        results.append((name, nRows * nPasses, seconds, nDifferences))
+    return results
+
+
+def benchmarkFeatureEngine(path, nPasses=3):
+    """ compare computing number and mention finder features token by token
+        and for whole sentences with numpy arrays, and check that both give
+        the same features """
+    print 'Computing features for abstracts in', path
+    print '%-8s %-8s %10s %10s %12s %12s' % ('finder', 'engine', 'tokens', 'seconds', 'tokens/sec',
+                                              'differences')
+    for (engineName, useEngine) in [('strings', False), ('numpy', True)]:
+        (results, peakMemory) = runInChildProcess(timeFeatureEngine, (path, useEngine, int(nPasses)))
+        for (name, nTokens, seconds, nDifferences) in results:
+            print '%-8s %-8s %10d %10.2f %12.0f %12d' % (name, engineName, nTokens, seconds,
+                                                         nTokens / seconds, nDifferences)
+
+
+def timePruning(path, thresholds, nIterations):
+    """ compute group finder features for the abstracts in a directory and
+        train a mallet model with each (min count, max features per family) pair
+        in a list of thresholds. return a list of (number of features kept,
+        feature file bytes, seconds to select and write features, seconds to
+        train, model bytes). training is skipped (None) if java is not available. """
+    absList = abstractlist.AbstractList(path)
+    finder = mentionfinder.MentionFinder(['group'], None, labelFeatures=['time', 'age', 'primary_outcome'])
+    finder.computeFeatures(absList, 'train')
+    useMallet = distutils.spawn.find_executable('java') != None
+    modelPath = tempfile.mkdtemp()
+    results = []
+    for (minCount, maxFeatures) in thresholds:
+        classifier = mallet.MalletTokenClassifier(nIterations=nIterations, minFeatureCount=minCount,
+                                                  maxFeaturesPerFamily=maxFeatures)
+        modelFilename = os.path.join(modelPath, 'group.%d.%s.model' % (minCount, maxFeatures))
+        featureFilename = os.path.join(modelPath, 'features.txt')
+        startTime = time.time()
+        classifier.selectFeatures(absList, modelFilename)
+        classifier.writeFeatureFile(absList, featureFilename, ['group'], True)
+        writeSeconds = time.time() - startTime
+        if classifier.featureFilter != None:
+            nFeatures = sum([nKept for (nKept, nSeen) in classifier.featureFilter.counts.values()])
+        else:
+            nFeatures = len(set([(family, feature) for abstract in absList for sentence in abstract.sentences
+                                 for token in sentence for (family, features) in token.features.items()
+                                 for feature in features]))
+        fileBytes = os.path.getsize(featureFilename)
+        trainSeconds = None
+        modelBytes = None
+        if useMallet:
+            startTime = time.time()
+            classifier.train(absList, modelFilename, ['group'])
+            trainSeconds = time.time() - startTime
+            if os.path.exists(modelFilename):
+                modelBytes = os.path.getsize(modelFilename)
+        results.append((nFeatures, fileBytes, writeSeconds, trainSeconds, modelBytes))
+    shutil.rmtree(modelPath)
+    if useMallet and os.path.exists('features.group.train.txt'):
+        os.remove('features.group.train.txt')
+    return results
+
+
+def benchmarkPruning(path, nIterations=10):
+    """ compare training group finder models on all features and on the
+        features selected with different frequency thresholds """
+    thresholds = [(1, None), (2, None), (3, None), (5, None), (2, 1000), (2, 200)]
+    print 'Training group finder models on abstracts in', path
+    (results, peakMemory) = runInChildProcess(timePruning, (path, thresholds, int(nIterations)))
+    print '%-9s %-9s %10s %14s %10s %10s %14s' % ('min count', 'max/fam', 'features', 'file bytes',
+                                                   'write sec', 'train sec', 'model bytes')
+    for ((minCount, maxFeatures), (nFeatures, fileBytes, writeSeconds, trainSeconds,
+                                   modelBytes)) in zip(thresholds, results):
+        if trainSeconds == None:
+            trainString = 'n/a'
+        else:
+            trainString = '%.2f' % trainSeconds
+        if modelBytes == None:
+            modelString = 'n/a'
+        else:
+            modelString = str(modelBytes)
+        print '%-9d %-9s %10d %14d %10.2f %10s %14s' % (minCount, maxFeatures, nFeatures, fileBytes,
+                                                          writeSeconds, trainString, modelString)
+
+
+def timeTagging(path, useTagServer, nCalls, nIterations):
+    """ train a group finder model on the abstracts in a directory and label
+        them nCalls times with the Mallet simple tagger or a MalletTagServer.
+        return the number of tokens labeled each time and the time in seconds """
+    absList = abstractlist.AbstractList(path)
+    finder = mentionfinder.MentionFinder(['group'], None, labelFeatures=['time', 'age', 'primary_outcome'])
+    finder.computeFeatures(absList, 'train')
+    modelPath = tempfile.mkdtemp()
+    modelFilename = os.path.join(modelPath, 'group.model')
+    labeledFilename = os.path.join(modelPath, 'group.labels')
+    trainer = mallet.MalletTokenClassifier(nIterations=nIterations)
+    trainer.train(absList, modelFilename, ['group'])
+    classifier = mallet.MalletTokenClassifier(topK=15, useTagServer=useTagServer)
+    startTime = time.time()
+    for i in range(nCalls):
+        classifier.test(absList, modelFilename, labeledFilename, ['group'])
+    seconds = time.time() - startTime
+    nTokens = len(classifier.readLabelFile(labeledFilename, ['group']))
+    mallet.closeTagServers()
+    shutil.rmtree(modelPath)
+    for filename in ['features.group.train.txt', 'features.group.test.txt']:
+        if os.path.exists(filename):
+            os.remove(filename)
+    return (nTokens, seconds)
+
+
+def benchmarkTagServer(path, nCalls=5, nIterations=10):
+    """ compare labeling tokens by starting the Mallet simple tagger for each
+        test with labeling them with a long lived MalletTagServer """
+    if distutils.spawn.find_executable('java') == None:
+        print 'java is not available, skipping the tag server benchmark'
+        return
+    nCalls = int(nCalls)
+    print 'Labeling group mentions in abstracts in %s %d times' % (path, nCalls)
+    print '%-14s %10s %10s %12s' % ('tagger', 'tokens', 'seconds', 'seconds/call')
+    for (name, useTagServer) in [('simple tagger', False), ('tag server', True)]:
+        ((nTokens, seconds), peakMemory) = runInChildProcess(timeTagging, (path, useTagServer, nCalls,
+                                                                           int(nIterations)))
+        print '%-14s %10d %10.2f %12.2f' % (name, nTokens, seconds, seconds / nCalls)
+
+
+def timeClassifier(path, classifierType, nIterations):
+    """ train a group finder model on the abstracts in a directory and label
+        them with the Mallet CRF or the in-process CRF.
+        return (number of tokens labeled, training seconds, labeling seconds) """
+    absList = abstractlist.AbstractList(path)
+    finder = mentionfinder.MentionFinder(['group'], None, labelFeatures=['time', 'age', 'primary_outcome'])
+    finder.computeFeatures(absList, 'train')
+    modelPath = tempfile.mkdtemp()
+    modelFilename = os.path.join(modelPath, 'group.model')
+    labeledFilename = os.path.join(modelPath, 'group.labels')
+    if classifierType == 'crf':
+        classifier = crf.CRFTokenClassifier(fullyConnected=True, nIterations=nIterations, topK=15)
+    else:
+        classifier = mallet.MalletTokenClassifier(fullyConnected=True, nIterations=nIterations, topK=15)
+    startTime = time.time()
+    classifier.train(absList, modelFilename, ['group'])
+    trainSeconds = time.time() - startTime
+    startTime = time.time()
+    classifier.test(absList, modelFilename, labeledFilename, ['group'])
+    nTokens = len(classifier.readLabelFile(labeledFilename, ['group']))
+    testSeconds = time.time() - startTime
+    shutil.rmtree(modelPath)
+    for filename in ['features.group.train.txt', 'features.group.test.txt']:
+        if os.path.exists(filename):
+            os.remove(filename)
+    return (nTokens, trainSeconds, testSeconds)
+
+
+def benchmarkClassifier(path, nIterations=100):
+    """ compare training and applying a group finder model with the Mallet CRF
+        and with the in-process CRF """
+    print 'Training and labeling group mentions in abstracts in %s' % path
+    print '%-10s %10s %10s %10s %12s' % ('classifier', 'tokens', 'train', 'label', 'peak MB')
+    classifierTypes = ['crf']
+    if distutils.spawn.find_executable('java') != None:
+        classifierTypes.insert(0, 'mallet')
+    else:
+        print 'java is not available, only timing the in-process CRF'
+    for classifierType in classifierTypes:
+        ((nTokens, trainSeconds, testSeconds), peakMemory) = \
+            runInChildProcess(timeClassifier, (path, classifierType, int(nIterations)))
+        print '%-10s %10d %10.2f %10.2f %12.1f' % (classifierType, nTokens, trainSeconds, testSeconds,
+                                                  peakMemory / 1024.0)
+
+
+def timeStreaming(path, streamFeatures, nIterations):
+    """ train a group finder model on the abstracts in a directory and label
+        them with Mallet, piping features to it or writing feature files.
+        return (number of tokens labeled, training seconds, labeling seconds) """
+    absList = abstractlist.AbstractList(path)
+    finder = mentionfinder.MentionFinder(['group'], None, labelFeatures=['time', 'age', 'primary_outcome'])
+    finder.computeFeatures(absList, 'train')
+    modelPath = tempfile.mkdtemp()
+    modelFilename = os.path.join(modelPath, 'group.model')
+    labeledFilename = os.path.join(modelPath, 'group.labels')
+    classifier = mallet.MalletTokenClassifier(nIterations=nIterations, topK=15, streamFeatures=streamFeatures)
+    classifier.workPath = modelPath
+    startTime = time.time()
+    classifier.train(absList, modelFilename, ['group'])
+    trainSeconds = time.time() - startTime
+    startTime = time.time()
+    classifier.test(absList, modelFilename, labeledFilename, ['group'])
+    nTokens = len(classifier.readLabelFile(labeledFilename, ['group']))
+    testSeconds = time.time() - startTime
+    shutil.rmtree(modelPath)
+    return (nTokens, trainSeconds, testSeconds)
+
+
+def benchmarkStreaming(path, nIterations=10):
+    """ compare writing feature and label files for Mallet with piping the
+        features to it and parsing its output as it is written """
+    if distutils.spawn.find_executable('java') == None:
+        print 'java is not available, skipping the streaming benchmark'
+        return
+    print 'Training and labeling group mentions in abstracts in %s' % path
+    print '%-10s %10s %10s %10s %12s' % ('features', 'tokens', 'train', 'label', 'peak MB')
+    for (name, streamFeatures) in [('files', False), ('pipes', True)]:
+        ((nTokens, trainSeconds, testSeconds), peakMemory) = \
+            runInChildProcess(timeStreaming, (path, streamFeatures, int(nIterations)))
+        print '%-10s %10d %10.2f %10.2f %12.1f' % (name, nTokens, trainSeconds, testSeconds,
+                                                  peakMemory / 1024.0)
+
+
+def timeTraining(path, classifierType, nWorkers, nIterations):
+    """ train group, outcome and condition finder models on the abstracts in a
+        directory, fitting up to nWorkers models at the same time.
+        return the time in seconds """
+    absList = abstractlist.AbstractList(path)
+    modelPath = tempfile.mkdtemp()
+    if classifierType == 'crf':
+        classifier = crf.CRFTokenClassifier(fullyConnected=True, nIterations=nIterations, topK=15)
+    else:
+        classifier = mallet.MalletTokenClassifier(fullyConnected=True, nIterations=nIterations, topK=15)
+    trainer = None
+    if nWorkers > 1:
+        trainer = findertask.ConcurrentTrainer(nWorkers, os.path.join(modelPath, 'work'))
+    startTime = time.time()
+    for mType in ['group', 'outcome', 'condition']:
+        finder = mentionfinder.MentionFinder([mType], classifier, labelFeatures=['time', 'age', 'primary_outcome'])
+        findertask.FinderTask(finder, modelPath=modelPath).train(absList, trainer)
+    if trainer != None:
+        trainer.wait()
+    seconds = time.time() - startTime
+    shutil.rmtree(modelPath)
+    return seconds
+
+
+def benchmarkTraining(path, nWorkers=3, nIterations=100):
+    """ compare training the mention finder models one after another with
+        fitting them in concurrent worker processes """
+    nWorkers = int(nWorkers)
+    if distutils.spawn.find_executable('java') != None:
+        classifierType = 'mallet'
+    else:
+        print 'java is not available, training with the in-process CRF'
+        classifierType = 'crf'
+    print 'Training group, outcome and condition finders on abstracts in %s' % path
+    print '%-10s %10s' % ('workers', 'seconds')
+    for n in sorted(set([1, nWorkers])):
+        (seconds, peakMemory) = runInChildProcess(timeTraining, (path, classifierType, n, int(nIterations)))
+        print '%-10d %10.2f' % (n, seconds)
+
+
+benchmarks = {'loader': benchmarkLoader,
+              'snapshot': benchmarkSnapshot,
+              'workers': benchmarkWorkers,
+              'lazy': benchmarkLazy,
+              'memory': benchmarkMemory,
+              'columns': benchmarkColumns,
+              'writer': benchmarkWriter,
+              'rewrite': benchmarkRewrite,
+              'parsetrees': benchmarkParseTrees,
+              'features': benchmarkFeatures,
+              'featurestore': benchmarkFeatureStore,
+              'labels': benchmarkLabelChanges,
+              'featurematrix': benchmarkFeatureMatrix,
+              'flags': benchmarkFlags,
+              'engine': benchmarkFeatureEngine,
+              'pruning': benchmarkPruning,
+              'tagserver': benchmarkTagServer,
+              'classifier': benchmarkClassifier,
+              'training': benchmarkTraining,
+              'streaming': benchmarkStreaming}
+
+if __name__ == '__main__':
+    if len(sys.argv) < 3 or sys.argv[1] not in benchmarks:
+        print "Usage: benchmark.py <BENCHMARK> <PATH> [ARGS]"
+        print "Run a performance benchmark on the directory of abstracts in <PATH>."
+        print "BENCHMARK is one of:", ', '.join(sorted(benchmarks.keys()))
+        sys.exit()
+
+    benchmarks[sys.argv[1]](*sys.argv[2:])
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+
+"""
+ Run external classifiers with features piped to their standard input.
+
+ Writing a feature file, running a tool on it and reading back its result file
+ sends every feature and result through the disk twice. run() starts the tool
+ with stdinFilename as its input file, writes the features to its standard
+ input from a separate thread and parses its standard output one line at a
+ time as it is written.
+
+ Only tools that read their input once from start to end can be run this way
+ (the Mallet simple tagger and megam, but not svm_light, which reads its input
+ file twice).
+"""
+
+__author__ = 'Rodney L. Summerscales'
+
+import errno
+import subprocess
+import threading
+
+# name of the input file given to a tool that reads its standard input
+stdinFilename = '/dev/stdin'
+
+
+def writeInput(stream, write, errors):
+    """ call write(stream) and close the stream. exceptions are added to a list
+        of errors so they can be raised in the thread that started the tool.
+        a broken pipe is not an error: the tool stopped reading and its exit
+        status says why. """
+    try:
+        write(stream)
+        stream.flush()
+    except IOError, e:
+        if e.errno != errno.EPIPE:
+            errors.append(e)
+    except Exception, e:
+        errors.append(e)
+    try:
+        stream.close()
+    except IOError:
+        pass
+
+
+def run(cmd, write, readOutput=None):
+    """ run a shell command that reads its input from standard input.
+        write(stream) = function that writes the input of the command to a stream
+        readOutput(lines) = if given, called with an iterator over the lines the
+                            command writes to standard output. otherwise the
+                            output of the command is not captured (the command
+                            may redirect it to a file).
+        return (value returned by readOutput (or None), exit status of the command)
+        exceptions raised while writing the input are raised again here. """
+    if readOutput == None:
+        process = subprocess.Popen(cmd, shell=True, stdin=subprocess.PIPE)
+        errors = []
+        writeInput(process.stdin, write, errors)
+        status = process.wait()
+        value = None
+    else:
+        process = subprocess.Popen(cmd, shell=True, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        errors = []
+        writer = threading.Thread(target=writeInput, args=(process.stdin, write, errors))
+        writer.start()
+        try:
+            value = readOutput(iter(process.stdout.readline, ''))
+        finally:
+            # read anything left so the writer cannot block on a full pipe
+            for line in iter(process.stdout.readline, ''):
+                pass
+            writer.join()
+        status = process.wait()
+    if len(errors) > 0:
+        raise errors[0]
+    return (value, status)
@@ -0,0 +1,454 @@
+#!/usr/bin/python
+# Linear-chain conditional random field for labeling tokens, trained and applied in process
+# author: Rodney Summerscales
+
+import os
+import cPickle
+
+import numpy
+
+from basetokenclassifier import BaseTokenClassifier
+from basetokenclassifier import TokenLabel
+
+
+def logSumExp(a, axis):
+  """ return log(sum(exp(a))) along an axis of an array without overflow """
+  m = a.max(axis=axis)
+  m = numpy.where(numpy.isfinite(m), m, 0)
+  return m + numpy.log(numpy.exp(a - numpy.expand_dims(m, axis)).sum(axis=axis))
+
+
+def lbfgs(function, x, nIterations, nCorrections=10, tolerance=1e-5):
+  """ minimize a function with the limited memory BFGS method.
+      function(x) returns (value, gradient)
+      x = starting point
+      nIterations = maximum number of iterations
+      nCorrections = number of previous steps used to approximate the Hessian
+      tolerance = stop when the relative change in value is smaller than this
+      return the point with the smallest value found """
+  (value, gradient) = function(x)
+  steps = []      # (s, y, 1 / y.s) for the most recent steps
+  for iteration in range(nIterations):
+    # two loop recursion for the search direction
+    direction = -gradient
+    alphas = []
+    for (s, y, rho) in reversed(steps):
+      alpha = rho * s.dot(direction)
+      direction -= alpha * y
+      alphas.append(alpha)
+    if len(steps) > 0:
+      (s, y, rho) = steps[-1]
+      direction *= s.dot(y) / y.dot(y)
+    for ((s, y, rho), alpha) in zip(steps, reversed(alphas)):
+      beta = rho * y.dot(direction)
+      direction += (alpha - beta) * s
+
+    slope = gradient.dot(direction)
+    if slope >= 0:
+      # not a descent direction, restart from steepest descent
+      steps = []
+      direction = -gradient
+      slope = gradient.dot(direction)
+    if slope == 0:
+      break
+    if len(steps) == 0:
+      step = min(1.0, 1.0 / numpy.sqrt(-slope))
+    else:
+      step = 1.0
+
+    # backtracking line search
+    while True:
+      newX = x + step * direction
+      (newValue, newGradient) = function(newX)
+      if newValue <= value + 1e-4 * step * slope or step < 1e-10:
+        break
+      step *= 0.5
+    if newValue > value:
+      break
+
+    s = newX - x
+    y = newGradient - gradient
+    if s.dot(y) > 1e-10:
+      steps.append((s, y, 1.0 / s.dot(y)))
+      if len(steps) > nCorrections:
+        steps.pop(0)
+    converged = abs(value - newValue) <= tolerance * max(abs(value), abs(newValue), 1.0)
+    (x, value, gradient) = (newX, newValue, newGradient)
+    if converged:
+      break
+  return x
+
+
+class SequenceBatch:
+  """ The rows of a list of feature matrices arranged as sequences, one for each
+      matrix with rows. Sequences of similar length are grouped into chunks that
+      are processed together as padded (sequence, position, label) arrays. """
+  nRows = 0
+  entryRows = None    # row of each feature entry
+  entryColumns = None # model feature column of each feature entry
+  starts = None       # first row of each sequence
+  lengths = None      # number of rows in each sequence
+  chunks = None       # list of (sequence ids, row of each (sequence, position), active mask)
+
+  def __init__(self, matrices, columns, maxChunkRows=20000):
+    """ matrices = list of FeatureMatrix
+        columns = array mapping feature ids to model feature columns (-1 = not used)
+        maxChunkRows = maximum number of padded rows in a chunk """
+    entryRows = []
+    entryColumns = []
+    starts = []
+    lengths = []
+    nRows = 0
+    for matrix in matrices:
+      if len(matrix) == 0:
+        continue
+      starts.append(nRows)
+      lengths.append(len(matrix))
+      rows = numpy.repeat(numpy.arange(nRows, nRows + len(matrix)), numpy.diff(matrix.indptr))
+      cols = numpy.full(len(matrix.indices), -1, dtype=numpy.int64)
+      known = matrix.indices < len(columns)
+      cols[known] = columns[matrix.indices[known]]
+      entryRows.append(rows[cols >= 0])
+      entryColumns.append(cols[cols >= 0])
+      nRows += len(matrix)
+    self.nRows = nRows
+    self.starts = numpy.array(starts, dtype=numpy.int64)
+    self.lengths = numpy.array(lengths, dtype=numpy.int64)
+    if len(entryRows) > 0:
+      self.entryRows = numpy.concatenate(entryRows)
+      self.entryColumns = numpy.concatenate(entryColumns)
+    else:
+      self.entryRows = numpy.zeros(0, dtype=numpy.int64)
+      self.entryColumns = numpy.zeros(0, dtype=numpy.int64)
+
+    # group sequences of similar length to limit padding
+    self.chunks = []
+    order = numpy.argsort(self.lengths, kind='mergesort')
+    first = 0
+    while first < len(order):
+      last = first + 1
+      while last < len(order) and (last - first + 1) * self.lengths[order[last]] <= maxChunkRows:
+        last += 1
+      ids = order[first:last]
+      maxLength = self.lengths[ids].max()
+      positions = numpy.arange(maxLength)
+      active = positions[None, :] < self.lengths[ids][:, None]
+      rows = numpy.where(active, self.starts[ids][:, None] + positions[None, :], 0)
+      self.chunks.append((ids, rows, active))
+      first = last
+
+  def __len__(self):
+    """ return the number of sequences """
+    return len(self.lengths)
+
+  def emissions(self, weights):
+    """ return (rows x labels) array of the score of each label for each row """
+    nLabels = weights.shape[1]
+    scores = numpy.zeros((self.nRows, nLabels))
+    for k in range(nLabels):
+      scores[:, k] = numpy.bincount(self.entryRows, weights=weights[self.entryColumns, k],
+                                    minlength=self.nRows)
+    return scores
+
+  def featureSums(self, rowValues, nFeatures):
+    """ return (features x labels) array with the sum of a value for each
+        row and label over the rows that have each feature """
+    sums = numpy.zeros((nFeatures, rowValues.shape[1]))
+    for k in range(rowValues.shape[1]):
+      sums[:, k] = numpy.bincount(self.entryColumns, weights=rowValues[self.entryRows, k],
+                                  minlength=nFeatures)
+    return sums
+
+
+class LinearChainCRF:
+  """ First order linear-chain CRF over the rows of a SequenceBatch.
+      The score of a labeling is the sum of the weights of the features of each
+      row for its label and the weights of the transitions between the labels
+      of consecutive rows. The first row is scored as a transition from the
+      default label (label 0), as in the Mallet simple tagger. """
+  labels = None       # list of label names (labels[0] is the default label)
+  features = None     # list of the feature strings of the model columns
+  weights = None      # (features x labels) weights
+  transitions = None  # (labels x labels) transition weights
+  allowed = None      # (labels x labels) True for transitions that may be used
+
+  def __init__(self, labels, features, allowed):
+    self.labels = labels
+    self.features = features
+    self.allowed = allowed
+    self.weights = numpy.zeros((len(features), len(labels)))
+    self.transitions = numpy.zeros((len(labels), len(labels)))
+
+  def transitionScores(self, transitions=None):
+    """ return transition weights with forbidden transitions set to -inf """
+    if transitions is None:
+      transitions = self.transitions
+    return numpy.where(self.allowed, transitions, -numpy.inf)
+
+  def forwardBackward(self, scores, transitions, rows, active):
+    """ return (alpha, beta, log Z) for a chunk of sequences.
+        scores = emission scores of the rows
+        rows, active = row of each (sequence, position) and whether it is in the sequence """
+    emissions = scores[rows]
+    (nSequences, maxLength, nLabels) = emissions.shape
+    alpha = numpy.empty(emissions.shape)
+    beta = numpy.zeros(emissions.shape)
+    alpha[:, 0] = transitions[0][None, :] + emissions[:, 0]
+    for t in range(1, maxLength):
+      a = logSumExp(alpha[:, t-1, :, None] + transitions[None], 1) + emissions[:, t]
+      alpha[:, t] = numpy.where(active[:, t, None], a, alpha[:, t-1])
+    logZ = logSumExp(alpha[:, maxLength-1], 1)
+    for t in range(maxLength - 2, -1, -1):
+      b = logSumExp(transitions[None] + (emissions[:, t+1] + beta[:, t+1])[:, None, :], 2)
+      beta[:, t] = numpy.where(active[:, t+1, None], b, 0)
+    return (alpha, beta, logZ)
+
+  def negativeLogLikelihood(self, batch, labels, variance):
+    """ return a function of the model parameters that returns the negative
+        log likelihood of the labels of the rows of a batch with a gaussian prior
+        and its gradient """
+    nFeatures = len(self.features)
+    nLabels = len(self.labels)
+    rowLabels = numpy.zeros((batch.nRows, nLabels))
+    rowLabels[numpy.arange(batch.nRows), labels] = 1
+    empiricalWeights = batch.featureSums(rowLabels, nFeatures)
+    previous = numpy.zeros(batch.nRows, dtype=numpy.int64)
+    following = numpy.ones(batch.nRows, dtype=bool)
+    following[batch.starts] = False
+    previous[following] = labels[numpy.arange(batch.nRows)[following] - 1]
+    empiricalTransitions = numpy.bincount(previous * nLabels + labels,
+                                          minlength=nLabels * nLabels).reshape((nLabels, nLabels))
+
+    def function(parameters):
+      weights = parameters[:nFeatures * nLabels].reshape((nFeatures, nLabels))
+      transitionWeights = parameters[nFeatures * nLabels:].reshape((nLabels, nLabels))
+      transitions = self.transitionScores(transitionWeights)
+      scores = batch.emissions(weights)
+      marginals = numpy.zeros((batch.nRows, nLabels))
+      expectedTransitions = numpy.zeros((nLabels, nLabels))
+      logLikelihood = scores[numpy.arange(batch.nRows), labels].sum() \
+                      + (transitionWeights * empiricalTransitions).sum()
+      for (ids, rows, active) in batch.chunks:
+        (alpha, beta, logZ) = self.forwardBackward(scores, transitions, rows, active)
+        logLikelihood -= logZ.sum()
+        gamma = numpy.exp(alpha + beta - logZ[:, None, None])
+        marginals[rows[active]] = gamma[active]
+        expectedTransitions[0] += gamma[:, 0].sum(axis=0)
+        emissions = scores[rows]
+        for t in range(1, rows.shape[1]):
+          xi = numpy.exp(alpha[:, t-1, :, None] + transitions[None]
+                         + (emissions[:, t] + beta[:, t])[:, None, :] - logZ[:, None, None])
+          expectedTransitions += xi[active[:, t]].sum(axis=0)
+      gradWeights = batch.featureSums(marginals, nFeatures) - empiricalWeights
+      gradTransitions = numpy.where(self.allowed, expectedTransitions - empiricalTransitions, 0)
+      gradient = numpy.concatenate([gradWeights.ravel(), gradTransitions.ravel()])
+      value = -logLikelihood + parameters.dot(parameters) / (2 * variance)
+      return (value, gradient + parameters / variance)
+    return function
+
+  def train(self, batch, labels, nIterations, variance):
+    """ set the weights that maximize the likelihood of the labels of the
+        rows of a batch (label ids) with a gaussian prior on the weights """
+    function = self.negativeLogLikelihood(batch, labels, variance)
+    parameters = numpy.concatenate([self.weights.ravel(), self.transitions.ravel()])
+    parameters = lbfgs(function, parameters, nIterations)
+    nWeights = self.weights.size
+    self.weights = parameters[:nWeights].reshape(self.weights.shape)
+    self.transitions = numpy.where(self.allowed, parameters[nWeights:].reshape(self.transitions.shape), 0)
+
+  def nBest(self, emissions, transitions, k):
+    """ return list of (score, label ids) for the k best labelings of a sequence
+        with given emission scores, best first """
+    (length, nLabels) = emissions.shape
+    scores = numpy.full((nLabels, k), -numpy.inf)
+    scores[:, 0] = transitions[0] + emissions[0]
+    back = numpy.zeros((length, k, nLabels), dtype=numpy.int64)
+    for t in range(1, length):
+      candidates = (scores[:, :, None] + transitions[:, None, :]).reshape((nLabels * k, nLabels))
+      best = numpy.argsort(-candidates, axis=0, kind='mergesort')[:k]
+      back[t] = best
+      scores = (candidates[best, numpy.arange(nLabels)[None, :]] + emissions[t][None, :]).T
+    final = scores.ravel()
+    order = numpy.argsort(-final, kind='mergesort')[:k]
+    labelings = []
+    for entry in order:
+      if final[entry] == -numpy.inf:
+        break
+      (label, rank) = divmod(entry, k)
+      path = [label]
+      for t in range(length - 1, 0, -1):
+        (label, rank) = divmod(back[t, rank, label], k)
+        path.append(label)
+      path.reverse()
+      labelings.append((final[entry], path))
+    return labelings
+
+  def label(self, batch, k):
+    """ return a list with the k best labelings of each row in a batch.
+        each entry is a list of (label id, label probability, sequence probability)
+        with the label of the row in each labeling. """
+    transitions = self.transitionScores()
+    scores = batch.emissions(self.weights)
+    marginals = numpy.zeros(scores.shape)
+    logZ = numpy.zeros(len(batch))
+    for (ids, rows, active) in batch.chunks:
+      (alpha, beta, chunkLogZ) = self.forwardBackward(scores, transitions, rows, active)
+      marginals[rows[active]] = numpy.exp(alpha + beta - chunkLogZ[:, None, None])[active]
+      logZ[ids] = chunkLogZ
+    rowLabels = [None] * batch.nRows
+    for s in range(len(batch)):
+      start = batch.starts[s]
+      length = batch.lengths[s]
+      labelings = self.nBest(scores[start:start + length], transitions, k)
+      for t in range(length):
+        row = start + t
+        rowLabels[row] = [(path[t], marginals[row, path[t]], numpy.exp(score - logZ[s]))
+                          for (score, path) in labelings]
+    return rowLabels
+
+
+class CRFTokenClassifier(BaseTokenClassifier):
+  """ Label tokens with a linear-chain CRF that is trained and applied in
+      process on the feature matrices of the tokens. No feature or label files
+      are written and no JVM is started.
+
+      The model file holds the labels, feature strings and weights of the CRF.
+      """
+  fullyConnected = False  # if False, only transitions seen in training are allowed
+  nIterations = 100       # maximum number of L-BFGS iterations
+  gaussianVariance = 1.0  # variance of the gaussian prior on the weights
+  writeLabels = False     # if True, test() also writes a label file in Mallet format
+  model = None            # LinearChainCRF read from modelFilename
+  modelFilename = None
+  modelTime = None        # modification time of the model file when it was read
+  labelings = None        # label filename -> token labels found by test()
+
+  def __init__(self, fullyConnected=False, nIterations=100, topK=1, gaussianVariance=1.0,
+               minFeatureCount=1, maxFeaturesPerFamily=None, writeLabels=False):
+    """ Create a new CRF token classifier.
+        fullyConnected = if True, allow transitions between all labels
+        nIterations = maximum number of training iterations
+        topK = number of labelings found for each sentence
+        gaussianVariance = variance of the gaussian prior on the weights
+        minFeatureCount, maxFeaturesPerFamily = thresholds used to select the
+          features used for training (see FeatureFilter)
+        writeLabels = if True, also write the labels found by test() to the
+          label file (for debugging)
+    """
+    BaseTokenClassifier.__init__(self, 'crf', topK, minFeatureCount, maxFeaturesPerFamily)
+    self.fullyConnected = fullyConnected
+    self.nIterations = nIterations
+    self.gaussianVariance = gaussianVariance
+    self.writeLabels = writeLabels
+    self.labelings = {}
+
+  def train(self, absList, modelFilename, entityTypes, tokenFilter=None):
+    """ Train a CRF model given a list of abstracts and save it to a file """
+    self.selectFeatures(absList, modelFilename, tokenFilter)
+    matrices = []
+    labelNames = []
+    for abs, s, sentence, matrix in self.featureMatrices(absList, tokenFilter):
+      matrices.append(matrix)
+      for tokenIndex in matrix.tokenIndices:
+        token = sentence.tokens[tokenIndex]
+        label = 'other'
+        for mType in entityTypes:
+          if token.hasAnnotation(mType):
+            label = mType
+            break
+        labelNames.append(label)
+
+    labels = ['other'] + [mType for mType in entityTypes if mType in set(labelNames)]
+    labelIds = dict([(label, i) for i, label in enumerate(labels)])
+    rowLabels = numpy.array([labelIds[label] for label in labelNames], dtype=numpy.int64)
+
+    if len(matrices) > 0:
+      ids = numpy.unique(numpy.concatenate([matrix.indices for matrix in matrices]))
+    else:
+      ids = numpy.zeros(0, dtype=numpy.int64)
+    columns = numpy.full(len(self.featureIndex), -1, dtype=numpy.int64)
+    columns[ids] = numpy.arange(len(ids))
+    batch = SequenceBatch(matrices, columns)
+
+    if self.fullyConnected:
+      allowed = numpy.ones((len(labels), len(labels)), dtype=bool)
+    else:
+      allowed = numpy.zeros((len(labels), len(labels)), dtype=bool)
+      previous = numpy.zeros(len(rowLabels), dtype=numpy.int64)
+      following = numpy.ones(len(rowLabels), dtype=bool)
+      following[batch.starts] = False
+      previous[following] = rowLabels[numpy.arange(len(rowLabels))[following] - 1]
+      allowed[previous, rowLabels] = True
+
+    model = LinearChainCRF(labels, self.featureIndex.featureStrings(ids), allowed)
+    print 'Training CRF with %d labels and %d features on %d sequences' % (len(labels), len(ids),
+                                                                          len(batch))
+    model.train(batch, rowLabels, self.nIterations, self.gaussianVariance)
+
+    modelFile = open(modelFilename, 'wb')
+    cPickle.dump(model, modelFile, cPickle.HIGHEST_PROTOCOL)
+    modelFile.close()
+    self.model = None
+
+  def loadModel(self, modelFilename):
+    """ read a model file unless it was already read and has not changed """
+    modelTime = os.path.getmtime(modelFilename)
+    if self.model == None or self.modelFilename != modelFilename or self.modelTime != modelTime:
+      modelFile = open(modelFilename, 'rb')
+      self.model = cPickle.load(modelFile)
+      modelFile.close()
+      self.modelFilename = modelFilename
+      self.modelTime = modelTime
+    return self.model
+
+  def modelColumns(self, model):
+    """ give every feature of a model an id in the feature index and return
+        the array mapping feature ids to model columns (-1 = not in the model) """
+    getId = self.featureIndex.features.id
+    ids = numpy.array([getId(feature) for feature in model.features], dtype=numpy.int64)
+    columns = numpy.full(len(self.featureIndex), -1, dtype=numpy.int64)
+    columns[ids] = numpy.arange(len(ids))
+    return columns
+
+  def test(self, absList, modelFilename, labeledFilename, entityTypes, tokenFilter=None):
+    """ Apply the CRF in a given model file to a given list of abstracts.
+        The labels are kept for readLabelFile(labeledFilename).
+    """
+    model = self.loadModel(modelFilename)
+    self.useSelectedFeatures(modelFilename)
+    columns = self.modelColumns(model)
+    matrices = [matrix for abs, s, sentence, matrix
+                in self.featureMatrices(absList, tokenFilter, addFeatures=False)]
+    batch = SequenceBatch(matrices, columns)
+    labels = []
+    for rowLabels in model.label(batch, self.topK):
+      tokenLabels = []
+      for (labelId, prob, sequenceProb) in rowLabels:
+        tLabel = TokenLabel(model.labels[labelId])
+        tLabel.prob = prob
+        tLabel.sequenceProb = sequenceProb
+        tokenLabels.append(tLabel)
+      labels.append(tokenLabels)
+    self.labelings[labeledFilename] = labels
+    if self.writeLabels:
+      self.writeLabelFile(labels, batch, labeledFilename)
+
+  def writeLabelFile(self, labels, batch, labelFilename):
+    """ write token labels to a file in the format written by the Mallet simple tagger """
+    labelFile = open(labelFilename, 'w')
+    for (start, length) in zip(batch.starts, batch.lengths):
+      tokenLabels = labels[start:start + length]
+      labelFile.write('k %d %s\n' % (len(tokenLabels[0]),
+                                     ' '.join([repr(tLabel.sequenceProb) for tLabel in tokenLabels[0]])))
+      for tokenLabelList in tokenLabels:
+        labelFile.write(''.join(['%s %r ' % (tLabel.label, tLabel.prob) for tLabel in tokenLabelList]))
+        labelFile.write('\n')
+      labelFile.write('\n')
+    labelFile.close()
+
+  def readLabelFile(self, labelFilename, entityTypes):
+    """ return the list of token labels found by the last call to test() for a
+        label file, or read them from a label file in Mallet format """
+    if labelFilename in self.labelings:
+      return self.labelings.pop(labelFilename)
+    return self.readNBestLabels(labelFilename)
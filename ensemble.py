@@ -4,6 +4,7 @@
 import sys
 import os.path
 import random
+import rundirectory
 from finder import Finder
 from basetokenclassifier import TokenLabel
 
@@ -296,7 +297,7 @@ class EnsembleFinder(Finder):
         self.useBaggedFeatures(self.baggedFeatures[i], absList, self.modelFilenames[i], self.finder.test)
       self.renameLabels(absList, i)
       
-    resultFilename = '%s%s.r%d.ensemble.txt'%(self.entityTypesString, foldString, self.randomSeed)
+    resultFilename = rundirectory.workFilename('%s%s.r%d.ensemble.txt'%(self.entityTypesString, foldString, self.randomSeed))
     resultsOut = open(resultFilename,'w')
     
     nTokens = 0
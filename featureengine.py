@@ -0,0 +1,492 @@
+#!/usr/bin/env python
+
+"""
+ Vectorized computation of the token features of MentionFinder and NumberFinder.
+
+ MentionFinder.computeFeatures builds the features of each token in Python: for
+ every neighbor in the context window and every dependent and governor it adds a
+ prefix to each of the neighbor's lexical and semantic features. A FeatureEngine
+ computes the same features for all of the sentences given to a finder at once,
+ working on integer arrays:
+
+   - the lexical features of ordinary words are looked up from the text, lemma
+     and part of speech ids of the sentence columns (see sentencecolumns), and
+     label and word set features from the label bit masks and lemma ids. Only
+     numbers, special tokens and tokens with UMLS concepts or semantic tags are
+     handled one token at a time.
+   - the lexical and semantic (base) features of all tokens form a sparse
+     matrix of feature ids. The context window features of the tokens are the
+     rows of this matrix shifted by each offset, the dependency features are
+     the rows given by arrays of dependent and governor indices. The id of a
+     prefixed feature is found in a table for the prefix, so a prefixed string
+     is only built the first time it is needed.
+
+ The features of each sentence are returned as a FeatureMatrix and are assigned
+ to token.features with strings shared with the feature index, so the rest of
+ the system sees the same feature sets as before. compareFeatures() checks that
+ a FeatureEngine and the string code of a finder give the same features.
+"""
+
+__author__ = 'Rodney L. Summerscales'
+
+import numpy
+
+import sentencetoken
+import sentencecolumns
+import featureindex
+import featureprofile
+
+
+def sparseRows(nRows, rows, ids):
+    """ return (indptr, indices) of a sparse matrix in CSR form with the given
+        (row, feature id) entries. duplicate entries are dropped and the ids of
+        each row are sorted. """
+    keys = numpy.unique((rows.astype(numpy.int64) << 32) | ids.astype(numpy.int64))
+    indptr = numpy.zeros(nRows + 1, dtype=numpy.int32)
+    numpy.cumsum(numpy.bincount((keys >> 32).astype(numpy.intp), minlength=nRows),
+                 out=indptr[1:])
+    return (indptr, (keys & 0xffffffff).astype(numpy.int32))
+
+
+def gatherRows(indptr, indices, rows):
+    """ return (owners, ids) with the entries of the given rows of a sparse matrix.
+        owners[j] is the position in rows of the row that ids[j] came from. """
+    starts = indptr[rows]
+    counts = indptr[rows + 1] - starts
+    owners = numpy.repeat(numpy.arange(len(rows)), counts)
+    firsts = numpy.cumsum(counts) - counts
+    positions = numpy.arange(len(owners)) - firsts[owners] + starts[owners]
+    return (owners, indices[positions])
+
+
+class PrefixTable:
+    """ Ids of the features made by adding a prefix to other features. """
+    index = None    # FeatureIndex
+    prefix = None
+    table = None    # id of prefixed feature for each feature id (-1 = not seen yet)
+
+    def __init__(self, index, prefix):
+        self.index = index
+        self.prefix = prefix
+        self.table = numpy.zeros(0, dtype=numpy.int32)
+
+    def lookup(self, ids):
+        """ return array with the ids of the prefixed versions of an array of feature ids """
+        table = self.table
+        if len(table) < len(self.index):
+            table = numpy.concatenate([table, numpy.empty(len(self.index) - len(table),
+                                                          dtype=numpy.int32)])
+            table[len(self.table):] = -1
+            self.table = table
+        prefixedIds = table[ids]
+        missing = prefixedIds < 0
+        if missing.any():
+            strings = self.index.features.strings
+            getId = self.index.features.id
+            for id in numpy.unique(ids[missing]).tolist():
+                table[id] = getId(self.prefix + strings[id])
+            prefixedIds = table[ids]
+        return prefixedIds
+
+
+class FeatureList:
+    """ (row, feature id) entries of a sparse matrix that is being built """
+    rows = None       # arrays of rows
+    ids = None        # arrays of feature ids
+    rowList = None    # rows of entries added one row at a time
+    idList = None     # feature ids of entries added one row at a time
+
+    def __init__(self):
+        self.rows = []
+        self.ids = []
+        self.rowList = []
+        self.idList = []
+
+    def add(self, rows, ids):
+        """ add arrays of rows and feature ids """
+        self.rows.append(numpy.asarray(rows, dtype=numpy.int64))
+        self.ids.append(numpy.asarray(ids, dtype=numpy.int64))
+
+    def addConstant(self, rows, id):
+        """ add the same feature id to each of an array of rows """
+        self.add(rows, numpy.zeros(len(rows), dtype=numpy.int64) + id)
+
+    def addStrings(self, row, features, getId):
+        """ add a set of feature strings to a row """
+        for feature in features:
+            self.rowList.append(row)
+            self.idList.append(getId(feature))
+
+    def extend(self, other):
+        """ add the entries of another FeatureList """
+        self.rows.extend(other.rows)
+        self.ids.extend(other.ids)
+        self.rowList.extend(other.rowList)
+        self.idList.extend(other.idList)
+
+    def matrix(self, nRows):
+        """ return (indptr, indices) of the matrix """
+        rows = self.rows + [numpy.array(self.rowList, dtype=numpy.int64)]
+        ids = self.ids + [numpy.array(self.idList, dtype=numpy.int64)]
+        return sparseRows(nRows, numpy.concatenate(rows), numpy.concatenate(ids))
+
+
+class FeatureEngine:
+    """ Compute the features of a MentionFinder or NumberFinder with numpy arrays. """
+    finder = None         # finder whose features are computed
+    index = None          # FeatureIndex used for feature ids
+    prefixTables = None   # prefix -> PrefixTable
+
+    def __init__(self, finder, index=None):
+        """ finder = MentionFinder (or NumberFinder) whose features are computed
+            index = FeatureIndex used for feature ids (default: a new index
+                    used only by this engine) """
+        self.finder = finder
+        if index is None:
+            index = featureindex.FeatureIndex()
+        self.index = index
+        self.prefixTables = {}
+
+    def prefixTable(self, prefix):
+        """ return the PrefixTable for a given prefix """
+        table = self.prefixTables.get(prefix)
+        if table is None:
+            table = PrefixTable(self.index, prefix)
+            self.prefixTables[prefix] = table
+        return table
+
+    def textFeatureId(self, text):
+        return self.index.features.id('t_' + text)
+
+    def lemmaFeatureId(self, lemma):
+        return self.index.features.id('lemma_' + lemma)
+
+    def posFeatureId(self, pos):
+        return self.index.features.id('pos_' + pos)
+
+    def computeFeatures(self, sentences, mode, window, lexicalFamily='lexical',
+                        patternFamily=None, profile=None):
+        """ compute features for some of the tokens of each sentence in a list,
+            assign them to token.features and return a list with the FeatureMatrix
+            for each sentence.
+
+            sentences = list of (sentence, wordSets, tokens) where wordSets are the
+                        registry word sets of the sentence's abstract and tokens are
+                        the tokens of the sentence that need features
+            mode = 'train' or 'test' (used for label features)
+            window = number of tokens on each side used for context features
+            lexicalFamily = name of the family of the token's own lexical features
+            patternFamily = if given, name of a family holding the number pattern
+                            features of the token (see NumberFinder)
+            profile = FeatureProfile used to record the time spent on each
+                      feature family (optional) """
+        finder = self.finder
+        getId = self.index.features.id
+        if profile is None:
+            profile = featureprofile.noProfile
+
+        # concatenate the sentences into one list of tokens
+        tokens = []
+        sentenceIds = []
+        starts = []
+        rowList = []
+        for (s, (sentence, wordSets, rowTokens)) in enumerate(sentences):
+            start = len(tokens)
+            starts.append(start)
+            tokens.extend(sentence.tokens)
+            sentenceIds.append(numpy.zeros(len(sentence), dtype=numpy.intp) + s)
+            rowList.extend([start + token.index for token in rowTokens])
+        nTokens = len(tokens)
+        if nTokens == 0:
+            return []
+        sentenceIds = numpy.concatenate(sentenceIds)
+        starts = numpy.array(starts, dtype=numpy.intp)
+        rows = numpy.array(rowList, dtype=numpy.intp)
+        nRows = len(rows)
+        columns = [sentence.getColumns() for (sentence, wordSets, rowTokens) in sentences]
+        text = numpy.concatenate([c.text for c in columns])
+        lemma = numpy.concatenate([c.lemma for c in columns])
+        pos = numpy.concatenate([c.pos for c in columns])
+        labels = numpy.concatenate([c.labels for c in columns])
+        annotations = numpy.concatenate([c.annotations for c in columns])
+        flags = numpy.fromiter((token.getFlags() for token in tokens), numpy.int64, nTokens)
+        isNumber = (flags & sentencetoken.numberFlag) != 0
+
+        # dependency index arrays and other syntactic features that are
+        # computed for each row
+        profile.start('syntactic')
+        syntactic = FeatureList()
+        dependents = [[], []]     # row, token index of dependent
+        governors = [[], []]      # row, token index of governor
+        numbers = isNumber.tolist()
+        for (row, t) in enumerate(rowList):
+            token = tokens[t]
+            start = t - token.index
+            features = set([])
+            if not numbers[t]:
+                for dep in token.dependents:
+                    dependents[0].append(row)
+                    dependents[1].append(start + dep.index)
+                    features.add('dep_type_' + dep.type)
+            for gov in token.governors:
+                if gov.isRoot() == False:
+                    governors[0].append(row)
+                    governors[1].append(start + gov.index)
+                    features.add('gov_type_' + gov.type)
+            verbToken = finder.closestVerb(token)
+            if verbToken != None:
+                features.add('closest_verb_' + verbToken.lemma)
+            syntactic.addStrings(row, features, getId)
+        dependents = [numpy.array(a, dtype=numpy.intp) for a in dependents]
+        governors = [numpy.array(a, dtype=numpy.intp) for a in governors]
+        profile.stop()
+
+        # context window: the token at offset k of each row, if it is in the
+        # same sentence
+        profile.start('tContext')
+        offsets = []
+        for k in range(-window, window + 1):
+            if k == 0:
+                continue
+            neighbors = rows + k
+            valid = (neighbors >= 0) & (neighbors < nTokens)
+            valid[valid] = sentenceIds[neighbors[valid]] == sentenceIds[rows[valid]]
+            offsets.append((k, valid.nonzero()[0], neighbors[valid]))
+
+        # tokens whose base features are needed
+        needed = numpy.zeros(nTokens, dtype=numpy.bool_)
+        needed[rows] = True
+        needed[dependents[1]] = True
+        needed[governors[1]] = True
+        for (k, owners, neighbors) in offsets:
+            needed[neighbors] = True
+        profile.stop()
+
+        profile.start(lexicalFamily)
+        lexical = self.lexicalFeatures(tokens, needed, flags, text, lemma, pos)
+        profile.stop()
+        profile.start('semantic')
+        semantic = self.semanticFeatures(sentences, tokens, needed, flags, mode, lemma,
+                                         labels, annotations, sentenceIds)
+        profile.stop()
+        profile.start('tContext')
+        base = FeatureList()
+        base.extend(lexical)
+        base.extend(semantic)
+        (baseIndptr, baseIds) = base.matrix(nTokens)
+        profile.stop()
+
+        # inside_parens: parenthesis depth before each token in its sentence
+        profile.start('syntactic')
+        lrb = sentencecolumns.textVocabulary.ids.get('-LRB-', -1)
+        rrb = sentencecolumns.textVocabulary.ids.get('-RRB-', -1)
+        depth = numpy.cumsum((text == lrb).astype(numpy.int32) - (text == rrb))
+        depth = numpy.concatenate([[0], depth])
+        depth = depth[:-1] - depth[starts[sentenceIds]]
+        inside = (depth[rows] > 0).nonzero()[0]
+        syntactic.addConstant(inside, getId('inside_parens'))
+
+        for (prefix, (owners, targets)) in [('dep_', dependents), ('gov_', governors)]:
+            (entries, ids) = gatherRows(baseIndptr, baseIds, targets)
+            syntactic.add(owners[entries], self.prefixTable(prefix).lookup(ids))
+        syntacticMatrix = syntactic.matrix(nRows)
+        profile.stop()
+
+        profile.start('tContext')
+        context = FeatureList()
+        for (k, owners, neighbors) in offsets:
+            (entries, ids) = gatherRows(baseIndptr, baseIds, neighbors)
+            context.add(owners[entries], self.prefixTable('tcontext_%d_' % k).lookup(ids))
+        contextMatrix = context.matrix(nRows)
+        profile.stop()
+
+        profile.start('sentence')
+        sentenceFamily = FeatureList()
+        sentenceFeatures = [finder.sentenceFeatures(sentence) for (sentence, wordSets, rowTokens) in sentences]
+        rowSentences = sentenceIds[rows].tolist()
+        for row in range(nRows):
+            sentenceFamily.addStrings(row, sentenceFeatures[rowSentences[row]], getId)
+        sentenceMatrix = sentenceFamily.matrix(nRows)
+        profile.stop()
+
+        families = []
+        profile.start(lexicalFamily)
+        (lexicalIndptr, lexicalIds) = lexical.matrix(nTokens)
+        (entries, ids) = gatherRows(lexicalIndptr, lexicalIds, rows)
+        families.append((lexicalFamily, sparseRows(nRows, entries, ids)))
+        profile.stop()
+        profile.start('semantic')
+        (semanticIndptr, semanticIds) = semantic.matrix(nTokens)
+        (entries, ids) = gatherRows(semanticIndptr, semanticIds, rows)
+        families.append(('semantic', sparseRows(nRows, entries, ids)))
+        profile.stop()
+        families.append(('syntactic', syntacticMatrix))
+        families.append(('tContext', contextMatrix))
+        families.append(('sentence', sentenceMatrix))
+        if patternFamily != None:
+            profile.start(patternFamily)
+            pattern = FeatureList()
+            for (row, t) in enumerate(rowList):
+                pattern.addStrings(row, finder.numberPatternFeatures(tokens[t]), getId)
+            families.append((patternFamily, pattern.matrix(nRows)))
+            profile.stop()
+
+        self.assignFeatures(tokens, rowList, families, profile)
+        return self.sentenceMatrices(sentences, families)
+
+    def lexicalFeatures(self, tokens, needed, flags, text, lemma, pos):
+        """ return FeatureList with the lexical features of the needed tokens """
+        finder = self.finder
+        getId = self.index.features.id
+        lexical = FeatureList()
+        plain = needed & ((flags & (sentencetoken.numberFlag | sentencetoken.specialTokenFlag)) == 0)
+        plainTokens = plain.nonzero()[0]
+        lexical.add(plainTokens, sentencecolumns.textVocabulary.table(self.textFeatureId,
+                                                                      numpy.int32)[text[plainTokens]])
+        lexical.add(plainTokens, sentencecolumns.lemmaVocabulary.table(self.lemmaFeatureId,
+                                                                       numpy.int32)[lemma[plainTokens]])
+        lexical.add(plainTokens, sentencecolumns.posVocabulary.table(self.posFeatureId,
+                                                                     numpy.int32)[pos[plainTokens]])
+        acronyms = (plain & ((flags & sentencetoken.acronymFlag) != 0)).nonzero()[0]
+        lexical.addConstant(acronyms, getId('IS_ACRONYM'))
+        for t in (needed & ~plain).nonzero()[0].tolist():
+            lexical.addStrings(t, finder.tokenFeatures(tokens[t]), getId)
+        return lexical
+
+    def semanticFeatures(self, sentences, tokens, needed, flags, mode, lemma, labels,
+                         annotations, sentenceIds):
+        """ return FeatureList with the semantic features of the needed tokens """
+        finder = self.finder
+        getId = self.index.features.id
+        semantic = FeatureList()
+        isNumber = (flags & sentencetoken.numberFlag) != 0
+        if mode == 'train':
+            labelMasks = annotations
+        else:
+            labelMasks = labels
+        for label in finder.labelSet:
+            bit = sentencecolumns.annotationTypes.lookupMask([label])
+            hasLabel = (needed & ((labelMasks & bit) != 0)).nonzero()[0]
+            semantic.addConstant(hasLabel, getId('label_' + label))
+
+        words = needed & ~isNumber
+        bit = sentencecolumns.annotationTypes.lookupMask(['primary_outcome'])
+        primaryOutcome = (words & ((labels & bit) != 0)).nonzero()[0]
+        semantic.addConstant(primaryOutcome, getId('primary_outcome'))
+
+        # word set features. sentences from the same abstract share word sets
+        groups = {}
+        for (s, (sentence, wordSets, rowTokens)) in enumerate(sentences):
+            if len(wordSets) > 0:
+                groups.setdefault(id(wordSets), (wordSets, []))[1].append(s)
+        for (wordSets, sentenceList) in groups.values():
+            inGroup = words & numpy.in1d(sentenceIds, sentenceList)
+            for (label, wordSet) in wordSets.items():
+                hasWord = (inGroup & numpy.in1d(lemma, sentencecolumns.lemmaVocabulary.lookup(wordSet)))
+                hasWord = hasWord.nonzero()[0]
+                semantic.addConstant(hasWord, getId('wordset_' + label))
+
+        numbers = isNumber.tolist()
+        for t in needed.nonzero()[0].tolist():
+            token = tokens[t]
+            if numbers[t]:
+                features = finder.numberPatternFeatures(token)
+                if token.specialValueType != None:
+                    features.add('vtype_' + token.specialValueType)
+                    features.add('is_special_value')
+                semantic.addStrings(t, features, getId)
+            elif len(token.umlsConcepts) > 0 or len(token.semanticTags) > 0:
+                semantic.addStrings(t, finder.umlsFeatures(token), getId)
+                semantic.addStrings(t, finder.semanticTagFeatures(token), getId)
+        return semantic
+
+    def assignFeatures(self, tokens, rowList, families, profile=featureprofile.noProfile):
+        """ set token.features for the token of each row from the matrices of
+            each feature family """
+        strings = self.index.features.strings
+        rowFeatures = [{} for row in rowList]
+        for (name, (indptr, ids)) in families:
+            profile.start(name)
+            indptr = indptr.tolist()
+            ids = ids.tolist()
+            for (row, features) in enumerate(rowFeatures):
+                features[name] = set([strings[id] for id in ids[indptr[row]:indptr[row + 1]]])
+            profile.stop()
+        for (t, features) in zip(rowList, rowFeatures):
+            tokens[t].features = features
+
+    def sentenceMatrices(self, sentences, families):
+        """ return list with the FeatureMatrix of each sentence given the
+            matrices of each feature family """
+        nRows = len(families[0][1][0]) - 1
+        rowIds = []
+        ids = []
+        familyIds = []
+        for (name, (indptr, indices)) in families:
+            counts = numpy.diff(indptr)
+            rowIds.append(numpy.repeat(numpy.arange(nRows), counts))
+            ids.append(indices)
+            familyIds.append(numpy.zeros(len(indices), dtype=numpy.int32)
+                             + self.index.families.id(name))
+        rowIds = numpy.concatenate(rowIds)
+        order = numpy.argsort(rowIds, kind='mergesort')
+        ids = numpy.concatenate(ids)[order]
+        familyIds = numpy.concatenate(familyIds)[order]
+        indptr = numpy.zeros(nRows + 1, dtype=numpy.int32)
+        numpy.cumsum(numpy.bincount(rowIds, minlength=nRows), out=indptr[1:])
+
+        matrices = []
+        firstRow = 0
+        for (sentence, wordSets, rowTokens) in sentences:
+            lastRow = firstRow + len(rowTokens)
+            first = indptr[firstRow]
+            last = indptr[lastRow]
+            matrices.append(featureindex.FeatureMatrix(
+                numpy.array([token.index for token in rowTokens], dtype=numpy.int32),
+                indptr[firstRow:lastRow + 1] - first, ids[first:last], familyIds[first:last]))
+            firstRow = lastRow
+        return matrices
+
+
+def compareFeatures(finder, absList, mode):
+    """ compute the features of a finder for a list of abstracts with the
+        string code and with a FeatureEngine and return a list of
+        (token, family, features only from strings, features only from engine)
+        for each feature family where they differ. the tokens are left with
+        the features computed by the engine. """
+    engine = finder.featureEngine
+    store = finder.featureStore
+    finder.featureStore = None
+    try:
+        for abstract in absList:
+            for sentence in abstract.sentences:
+                for token in sentence:
+                    token.features = {}
+        finder.featureEngine = None
+        finder.computeFeatures(absList, mode)
+        expected = {}
+        for abstract in absList:
+            for sentence in abstract.sentences:
+                for token in sentence:
+                    expected[id(token)] = token.features
+                    token.features = {}
+        if engine is None:
+            finder.featureEngine = FeatureEngine(finder)
+        else:
+            finder.featureEngine = engine
+        finder.computeFeatures(absList, mode)
+    finally:
+        finder.featureEngine = engine
+        finder.featureStore = store
+
+    differences = []
+    for abstract in absList:
+        for sentence in abstract.sentences:
+            for token in sentence:
+                stringFeatures = expected[id(token)]
+                for family in sorted(set(stringFeatures.keys()) | set(token.features.keys())):
+                    a = stringFeatures.get(family, set([]))
+                    b = token.features.get(family, set([]))
+                    if a != b:
+                        differences.append((token, family, a - b, b - a))
+    return differences
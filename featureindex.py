@@ -0,0 +1,241 @@
+#!/usr/bin/env python
+
+"""
+ Integer ids for token features and sparse matrices of the features of a sentence.
+
+ Token.features maps each feature family (e.g. 'lexical', 'tContext') to a set of
+ feature strings. A FeatureIndex maps each feature string to an integer id and
+ builds a sparse matrix of the features of the tokens in a sentence in
+ compressed sparse row (CSR) form: one row per token and one column per feature.
+
+ The feature sets of the tokens are still where the features are kept. The
+ classifier back ends get a FeatureMatrix for each sentence when they need it
+ (see BaseTokenClassifier.featureMatrices) and do not keep it, so the matrices
+ do not reduce the memory used by the features. They let feature selection,
+ profiling and the in-process CRF work on arrays of ids instead of strings.
+ Back ends that run an external tool turn the ids back into strings when they
+ write a feature file.
+
+ Each classifier has its own FeatureIndex and starts a new one for each model
+ it trains or applies, so the index only holds the features of one model.
+
+ A FeatureFilter keeps only the features that are frequent in the training data.
+ It is saved next to the model so the same features are used when the model is
+ applied.
+"""
+
+__author__ = 'Rodney L. Summerscales'
+
+import cPickle
+
+import numpy
+
+from sentencecolumns import Vocabulary
+
+
+class FeatureMatrix:
+    """ Sparse matrix of the features of some of the tokens in a sentence.
+
+        Row i describes the token sentence[tokenIndices[i]]. The ids of its features
+        are indices[indptr[i]:indptr[i+1]] and families[j] is the id of the family
+        of feature indices[j]. The features of a row are in the order they were
+        found in token.features. """
+    tokenIndices = None   # index in the sentence of the token for each row
+    indptr = None         # start of each row in indices (one extra entry at the end)
+    indices = None        # feature ids
+    families = None       # feature family id for each entry in indices
+
+    def __init__(self, tokenIndices, indptr, indices, families):
+        self.tokenIndices = tokenIndices
+        self.indptr = indptr
+        self.indices = indices
+        self.families = families
+
+    def __len__(self):
+        """ return the number of rows (tokens) in the matrix """
+        return len(self.tokenIndices)
+
+    def nFeatures(self):
+        """ return the total number of features in the matrix """
+        return len(self.indices)
+
+    def row(self, i):
+        """ return array of the feature ids for row i """
+        return self.indices[self.indptr[i]:self.indptr[i + 1]]
+
+    def rowFamilies(self, i):
+        """ return array of the family ids of the features in row i """
+        return self.families[self.indptr[i]:self.indptr[i + 1]]
+
+    def nbytes(self):
+        """ return the number of bytes used by the arrays of the matrix """
+        return self.tokenIndices.nbytes + self.indptr.nbytes + self.indices.nbytes \
+            + self.families.nbytes
+
+
+class FeatureIndex:
+    """ Map feature strings and feature family names to integer ids. """
+    features = None   # Vocabulary of feature strings
+    families = None   # Vocabulary of feature family names
+
+    def __init__(self):
+        self.features = Vocabulary()
+        self.families = Vocabulary()
+
+    def __len__(self):
+        """ return the number of distinct features in the index """
+        return len(self.features)
+
+    def featureMatrix(self, sentence, tokenFilter=None, addFeatures=True):
+        """ return a FeatureMatrix with the features of each token in a sentence.
+            tokenFilter = if given, only tokens for which tokenFilter(token) is
+                          True get a row
+            addFeatures = if False, features that are not already in the index
+                          are left out (e.g. when applying a trained model) """
+        tokenIndices = []
+        indptr = [0]
+        indices = []
+        families = []
+        featureIds = self.features.ids
+        getFeatureId = self.features.id
+        for token in sentence.tokens:
+            if tokenFilter != None and tokenFilter(token) != True:
+                continue
+            tokenIndices.append(token.index)
+            for family, featureSet in token.features.items():
+                familyId = self.families.id(family)
+                nFeatures = len(indices)
+                if addFeatures:
+                    indices.extend([getFeatureId(feature) for feature in featureSet])
+                else:
+                    indices.extend([featureIds[feature] for feature in featureSet
+                                    if feature in featureIds])
+                families.extend([familyId] * (len(indices) - nFeatures))
+            indptr.append(len(indices))
+        return FeatureMatrix(numpy.array(tokenIndices, dtype=numpy.int32),
+                             numpy.array(indptr, dtype=numpy.int32),
+                             numpy.array(indices, dtype=numpy.int32),
+                             numpy.array(families, dtype=numpy.int32))
+
+    def featureStrings(self, ids):
+        """ return list of the feature strings for a sequence of feature ids """
+        strings = self.features.strings
+        return [strings[id] for id in ids]
+
+    def familyName(self, id):
+        """ return the name of the feature family with a given id """
+        return self.families.string(id)
+
+
+class FeatureFilter:
+    """ Features selected by how often they occur in the training data.
+
+        A feature is kept if it occurs at least minCount times. If
+        maxFeaturesPerFamily is given, at most that many of the most frequent
+        features of each family are kept (ties are broken by the feature
+        string, so the selection does not depend on feature ids). """
+    fileVersion = 1
+    minCount = 1
+    maxFeaturesPerFamily = None
+    features = None      # family name -> set of the feature strings that are kept
+    counts = None        # family name -> (number of features kept, number of features seen)
+    __keys = None        # (index, sorted array of (family id << 32) | feature id kept)
+
+    def __init__(self, minCount=1, maxFeaturesPerFamily=None):
+        self.minCount = minCount
+        self.maxFeaturesPerFamily = maxFeaturesPerFamily
+        self.features = {}
+        self.counts = {}
+        self.__keys = None
+
+    def fit(self, matrices, index):
+        """ select features from the rows of a list of FeatureMatrix objects
+            whose ids come from a given FeatureIndex """
+        keys = [(matrix.families.astype(numpy.int64) << 32) | matrix.indices for matrix in matrices]
+        if len(keys) > 0:
+            keys = numpy.concatenate(keys)
+        else:
+            keys = numpy.zeros(0, dtype=numpy.int64)
+        (keys, counts) = numpy.unique(keys, return_counts=True)
+        familyIds = (keys >> 32).tolist()
+        featureIds = (keys & 0xffffffff).tolist()
+        counts = counts.tolist()
+        candidates = {}
+        for (familyId, featureId, count) in zip(familyIds, featureIds, counts):
+            candidates.setdefault(index.familyName(familyId), []).append((count, featureId))
+
+        self.features = {}
+        self.counts = {}
+        strings = index.features.strings
+        for (family, featureCounts) in candidates.items():
+            kept = [(-count, strings[featureId]) for (count, featureId) in featureCounts
+                    if count >= self.minCount]
+            kept.sort()
+            if self.maxFeaturesPerFamily != None:
+                kept = kept[:self.maxFeaturesPerFamily]
+            self.features[family] = set([feature for (count, feature) in kept])
+            self.counts[family] = (len(kept), len(featureCounts))
+        self.__keys = None
+
+    def keys(self, index):
+        """ return sorted array of (family id << 32) | feature id for the
+            features that are kept, using the ids of a given FeatureIndex.
+            the features that are kept are added to the index, so matrices of
+            the features that are kept can be built without adding the others
+            (see FeatureIndex.featureMatrix). """
+        if self.__keys is None or self.__keys[0] is not index:
+            keys = []
+            getId = index.features.id
+            for (family, features) in self.features.items():
+                familyId = index.families.id(family)
+                keys.extend([(familyId << 32) | getId(feature) for feature in features])
+            self.__keys = (index, numpy.array(sorted(keys), dtype=numpy.int64))
+        return self.__keys[1]
+
+    def apply(self, matrix, index):
+        """ return a FeatureMatrix with only the features of a given matrix that are kept """
+        keys = (matrix.families.astype(numpy.int64) << 32) | matrix.indices
+        keptKeys = self.keys(index)
+        positions = numpy.searchsorted(keptKeys, keys)
+        keep = positions < len(keptKeys)
+        keep[keep] = keptKeys[positions[keep]] == keys[keep]
+        rows = numpy.repeat(numpy.arange(len(matrix)), numpy.diff(matrix.indptr))
+        indptr = numpy.zeros(len(matrix) + 1, dtype=numpy.int32)
+        numpy.cumsum(numpy.bincount(rows[keep], minlength=len(matrix)), out=indptr[1:])
+        return FeatureMatrix(matrix.tokenIndices, indptr, matrix.indices[keep], matrix.families[keep])
+
+    def save(self, filename):
+        """ write the selected features to a file """
+        out = open(filename, 'wb')
+        cPickle.dump({'version': self.fileVersion, 'minCount': self.minCount,
+                      'maxFeaturesPerFamily': self.maxFeaturesPerFamily,
+                      'features': self.features, 'counts': self.counts},
+                     out, cPickle.HIGHEST_PROTOCOL)
+        out.close()
+
+    def printCounts(self):
+        """ print the number of features kept for each family """
+        print 'Feature selection: min count =', self.minCount, \
+            'max features per family =', self.maxFeaturesPerFamily
+        for family in sorted(self.counts.keys()):
+            (nKept, nSeen) = self.counts[family]
+            print '  %-12s %8d of %8d' % (family, nKept, nSeen)
+
+
+def loadFeatureFilter(filename):
+    """ return the FeatureFilter saved in a file or None if there is no such file """
+    try:
+        file = open(filename, 'rb')
+    except IOError:
+        return None
+    try:
+        data = cPickle.load(file)
+    finally:
+        file.close()
+    if data.get('version') != FeatureFilter.fileVersion:
+        raise ValueError('Unknown feature filter version in ' + filename)
+    featureFilter = FeatureFilter(data['minCount'], data['maxFeaturesPerFamily'])
+    featureFilter.features = data['features']
+    featureFilter.counts = data['counts']
+    return featureFilter
+
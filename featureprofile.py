@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+
+"""
+ Cost and size of each token feature family.
+
+ A FeatureProfile records, for each feature family computed by a finder
+ (e.g. lexical, semantic, syntactic, tContext, sentence, acronym):
+
+   seconds       time spent computing the family
+   tokens        number of tokens the family was computed for
+   features      number of features the family produced
+   distinct      number of different features in the family
+   bytes         bytes the family used in the feature files given to the classifier
+
+ Time is exclusive: while the lexical and semantic features of a neighbor are
+ computed for the context window features of a token, the time is counted for
+ the lexical and semantic families, not for tContext.
+
+ A FinderTask with a profile path gives a FeatureProfile to its finder and the
+ finder's token classifier and writes the profile to a tab separated file.
+"""
+
+__author__ = 'Rodney L. Summerscales'
+
+import time
+
+import numpy
+
+
+class FamilyProfile:
+    """ Counts for one feature family """
+    seconds = 0
+    nTokens = 0
+    nFeatures = 0
+    distinct = None   # set of the features seen in this family
+    nBytes = 0
+
+    def __init__(self):
+        self.seconds = 0
+        self.nTokens = 0
+        self.nFeatures = 0
+        self.distinct = set([])
+        self.nBytes = 0
+
+
+def featureBytes(feature):
+    """ return the number of bytes used to write a feature followed by a space """
+    if isinstance(feature, unicode):
+        return len(feature.encode('utf-8')) + 1
+    return len(feature) + 1
+
+
+class FeatureProfile:
+    """ Time and size of each feature family computed by a finder """
+    families = None   # family name -> FamilyProfile
+    timers = None     # stack of [family name, start time] for the families being timed
+
+    def __init__(self):
+        self.families = {}
+        self.timers = []
+
+    def family(self, name):
+        """ return the FamilyProfile for a given family """
+        family = self.families.get(name)
+        if family is None:
+            family = FamilyProfile()
+            self.families[name] = family
+        return family
+
+    def start(self, name):
+        """ start timing a given family. if another family is being timed, its
+            timer is paused until stop() is called for this family. """
+        now = time.time()
+        if len(self.timers) > 0:
+            timer = self.timers[-1]
+            self.family(timer[0]).seconds += now - timer[1]
+        self.timers.append([name, now])
+
+    def stop(self):
+        """ stop timing the family of the last call to start() """
+        now = time.time()
+        (name, startTime) = self.timers.pop()
+        self.family(name).seconds += now - startTime
+        if len(self.timers) > 0:
+            self.timers[-1][1] = now
+
+    def countFeatures(self, absList, tokenFilter=None):
+        """ count the features of each family for the tokens in a list of
+            abstracts that pass a token filter """
+        for abstract in absList:
+            for sentence in abstract.sentences:
+                for token in sentence:
+                    if tokenFilter != None and tokenFilter(token) != True:
+                        continue
+                    for (name, features) in token.features.items():
+                        family = self.family(name)
+                        family.nTokens += 1
+                        family.nFeatures += len(features)
+                        family.distinct.update(features)
+
+    def countWritten(self, matrix, index):
+        """ count the bytes written for each family for the rows of a FeatureMatrix
+            whose feature ids come from a given FeatureIndex """
+        if matrix.nFeatures() == 0:
+            return
+        lengths = index.features.table(featureBytes, numpy.int32)
+        nBytes = numpy.bincount(matrix.families, weights=lengths[matrix.indices])
+        for familyId in nBytes.nonzero()[0].tolist():
+            self.family(index.familyName(familyId)).nBytes += int(nBytes[familyId])
+
+    def write(self, filename, name, mode, totalSeconds=None):
+        """ write the profile to a tab separated file with a line for each family.
+            name = name of the finder task
+            mode = 'train', 'test' or 'crossval'
+            totalSeconds = if given, time spent computing all features (written
+                           on a line for the family 'all') """
+        out = open(filename, 'w')
+        out.write('\t'.join(['task', 'mode', 'family', 'seconds', 'tokens', 'features',
+                             'features_per_token', 'distinct', 'bytes']) + '\n')
+        rows = [(familyName, self.families[familyName]) for familyName in sorted(self.families.keys())]
+        if totalSeconds != None:
+            total = FamilyProfile()
+            total.seconds = totalSeconds
+            for (familyName, family) in rows:
+                total.nTokens = max(total.nTokens, family.nTokens)
+                total.nFeatures += family.nFeatures
+                total.nBytes += family.nBytes
+                total.distinct.update(family.distinct)
+            rows.append(('all', total))
+        for (familyName, family) in rows:
+            if family.nTokens > 0:
+                perToken = float(family.nFeatures) / family.nTokens
+            else:
+                perToken = 0
+            out.write('%s\t%s\t%s\t%.4f\t%d\t%d\t%.2f\t%d\t%d\n'
+                      % (name, mode, familyName, family.seconds, family.nTokens, family.nFeatures,
+                         perToken, len(family.distinct), family.nBytes))
+        out.close()
+
+
+class NoProfile:
+    """ Stand-in for a FeatureProfile when nothing is recorded """
+
+    def start(self, name):
+        pass
+
+    def stop(self):
+        pass
+
+
+noProfile = NoProfile()
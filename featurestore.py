@@ -0,0 +1,641 @@
+#!/usr/bin/env python
+
+"""
+ Token features shared by the finders of a run configuration.
+
+ Several finders compute the same features for the same sentences (e.g. the
+ group, outcome and condition mention finders differ only in the sentences
+ they are given). A FeatureStore keeps the features computed for the tokens
+ of a sentence, keyed by the feature configuration of the finder that
+ computed them, so that a finder with the same configuration can reuse them.
+
+ The stored features are kept on the sentence. They are discarded when a
+ token in the sentence changes (see Token.changed) and are not pickled.
+
+ Changing the labels of a token (e.g. the time, age and primary_outcome labels
+ assigned by the rule based finders) does not discard them. The store keeps the
+ labels of the tokens at the time their features were computed. When the labels
+ are different, only the features that depend on them are recomputed by the
+ finder (see MentionFinder.updateLabelFeatures) before the features are reused.
+
+ A FeatureStore can also keep the features in a directory (see FeatureDirectory)
+ so that later runs, cross validation folds and runs with other random seeds
+ read them from disk instead of computing them again. Features read from the
+ directory stay in the arrays read from the file as sparse matrices, and the
+ classifiers take the features of the tokens from these matrices (see
+ featureMatrix) instead of looking up each feature string again.
+"""
+
+__author__ = 'Rodney L. Summerscales'
+
+import os
+import hashlib
+import tempfile
+import weakref
+import cPickle
+
+import numpy
+
+from featureindex import FeatureMatrix
+
+# errors raised when a feature file holds something that is not a record
+decodeErrors = (cPickle.UnpicklingError, EOFError, ValueError, KeyError, IndexError,
+                TypeError, AttributeError, ImportError)
+
+# change this when the format of feature files or the way features are
+# computed changes, so that old feature files are ignored
+featureFileVersion = 3
+
+
+def sentenceDigest(sentence):
+    """ return sha1 digest of the information about a sentence and its tokens
+        that token features are computed from. token labels are not included,
+        they are kept with the features (see labelState). """
+    parts = [sentence.parseString, sentence.section, sentence.nlmCategory]
+    for token in sentence.tokens:
+        parts.append((token.text, token.lemma, token.pos, token.specialValueType,
+                      sorted([a.type for a in token.annotations]),
+                      sorted(token.semanticTags),
+                      sorted([(uc.id, sorted(uc.types), uc.inRxnorm) for uc in token.umlsConcepts]),
+                      [(d.type, d.index) for d in token.governors or []],
+                      [(d.type, d.index) for d in token.dependents or []]))
+    return hashlib.sha1(repr(parts)).hexdigest()
+
+
+def labelState(sentence):
+    """ return dict mapping token index -> sorted tuple of label types for the
+        tokens in a sentence that have labels """
+    state = {}
+    for token in sentence.tokens:
+        if len(token.labels) > 0:
+            state[token.index] = tuple(sorted([a.type for a in token.labels]))
+    return state
+
+
+def changedLabels(oldState, newState):
+    """ return sorted list of the indices of the tokens whose labels differ
+        between two label states """
+    indices = set(oldState.keys()).union(newState.keys())
+    return sorted([i for i in indices if oldState.get(i) != newState.get(i)])
+
+
+def configurationDigest(configuration):
+    """ return short digest of a feature configuration """
+    return hashlib.sha1(repr(configuration)).hexdigest()[:16]
+
+
+def featureMatrix(index, sentence, tokenFilter=None, addFeatures=True):
+    """ return the FeatureMatrix built by index.featureMatrix(sentence, tokenFilter,
+        addFeatures), except that the features in the sets a token was given by
+        a FeatureStore that read them from a feature file are taken from the
+        matrix of the file (see StoredFeatures). the features of a row are in a
+        different order than index.featureMatrix() puts them in. """
+    storedList = []
+    record = sentence.storedFeatures
+    if record is not None:
+        storedList = [entry[3] for entry in record[2].values()
+                      if entry[3] is not None and entry[3].hasTokenFeatures()]
+    if len(storedList) == 0:
+        return index.featureMatrix(sentence, tokenFilter, addFeatures)
+
+    # output row of each (row, family) of the stored matrices whose feature set a token still has
+    reused = [numpy.full((len(stored.matrix), len(stored.record.familyIds)), -1, dtype=numpy.int32)
+              for stored in storedList]
+    tokenIndices = []
+    rowList = []
+    indices = []
+    families = []
+    featureIds = index.features.ids
+    getFeatureId = index.features.id
+    for token in sentence.tokens:
+        if tokenFilter != None and tokenFilter(token) != True:
+            continue
+        row = len(tokenIndices)
+        tokenIndices.append(token.index)
+        features = token.features
+        for (stored, rowFamilies) in zip(storedList, reused):
+            storedFeatures = stored.tokenFeatures().get(token.index)
+            if storedFeatures is not None:
+                storedRow = stored.rows()[token.index]
+                familyIds = stored.record.familyIds
+                remaining = {}
+                for (family, featureSet) in features.items():
+                    if storedFeatures.get(family) is featureSet:
+                        rowFamilies[storedRow, familyIds[family]] = row
+                    else:
+                        remaining[family] = featureSet
+                features = remaining
+        for (family, featureSet) in features.items():
+            familyId = index.families.id(family)
+            nFeatures = len(indices)
+            if addFeatures:
+                indices.extend([getFeatureId(feature) for feature in featureSet])
+            else:
+                indices.extend([featureIds[feature] for feature in featureSet
+                                if feature in featureIds])
+            families.extend([familyId] * (len(indices) - nFeatures))
+        rowList.extend([row] * (len(indices) - len(rowList)))
+
+    rows = [numpy.array(rowList, dtype=numpy.int32)]
+    indices = [numpy.array(indices, dtype=numpy.int32)]
+    families = [numpy.array(families, dtype=numpy.int32)]
+    for (stored, rowFamilies) in zip(storedList, reused):
+        matrix = stored.matrix
+        storedRows = numpy.repeat(numpy.arange(len(matrix)), numpy.diff(matrix.indptr))
+        outputRows = rowFamilies[storedRows, matrix.families]
+        keep = outputRows >= 0
+        (recordFeatureIds, recordFamilyIds) = stored.record.ids(index, addFeatures)
+        ids = recordFeatureIds[matrix.indices[keep]]
+        found = ids >= 0
+        rows.append(outputRows[keep][found])
+        indices.append(ids[found])
+        families.append(recordFamilyIds[matrix.families[keep]][found])
+    rows = numpy.concatenate(rows)
+    order = numpy.argsort(rows, kind='mergesort')
+    indptr = numpy.zeros(len(tokenIndices) + 1, dtype=numpy.int32)
+    numpy.cumsum(numpy.bincount(rows, minlength=len(tokenIndices)), out=indptr[1:])
+    return FeatureMatrix(numpy.array(tokenIndices, dtype=numpy.int32), indptr,
+                         numpy.concatenate(indices)[order], numpy.concatenate(families)[order])
+
+
+
+class StoredFeatures:
+    """ Features of the tokens of a sentence read from a feature file.
+
+        The arrays of the matrix are views of the array of its record and hold
+        the ids of the FeatureRecord the sentence is in. The feature dictionaries
+        of the tokens are only built when they are first needed (see tokenFeatures).
+        As long as a token keeps the feature sets it was given, featureMatrix()
+        takes its features from the matrix instead of from the sets. """
+    record = None          # FeatureRecord holding the features
+    matrix = None          # FeatureMatrix with the ids of the record
+    familyMasks = None     # bit mask of the feature families of each row (families may be empty)
+    __tokenFeatures = None # token index -> feature dictionary (None until needed)
+    __rows = None          # token index -> row of the matrix (None until needed)
+
+    def __init__(self, record, matrix, familyMasks):
+        self.record = record
+        self.matrix = matrix
+        self.familyMasks = familyMasks
+        self.__tokenFeatures = None
+        self.__rows = None
+
+    def hasTokenFeatures(self):
+        """ return True if the feature dictionaries of the tokens were built """
+        return self.__tokenFeatures is not None
+
+    def rows(self):
+        """ return dict mapping token index -> row of the matrix """
+        if self.__rows is None:
+            self.__rows = dict([(tokenIndex, row) for (row, tokenIndex)
+                                in enumerate(self.matrix.tokenIndices.tolist())])
+        return self.__rows
+
+    def tokenFeatures(self):
+        """ return dict mapping token index -> feature dictionary """
+        if self.__tokenFeatures is not None:
+            return self.__tokenFeatures
+        matrix = self.matrix
+        names = self.record.header['families']
+        featureStrings = self.record.strings[matrix.indices]
+        families = matrix.families
+        nFeatures = len(families)
+
+        # the features of each family are together in a row, find where each run starts
+        runStarts = numpy.ones(nFeatures, dtype=bool)
+        if nFeatures > 0:
+            runStarts[1:] = families[1:] != families[:-1]
+            rowStarts = matrix.indptr[:-1]
+            runStarts[rowStarts[rowStarts < nFeatures]] = True
+        runStarts = numpy.flatnonzero(runStarts)
+        runFamilies = families[runStarts].tolist()
+        runStarts = runStarts.tolist()
+        runEnds = runStarts[1:] + [nFeatures]
+
+        indptr = matrix.indptr.tolist()
+        masks = self.familyMasks.tolist()
+        tokenFeatures = {}
+        run = 0
+        for (row, tokenIndex) in enumerate(matrix.tokenIndices.tolist()):
+            features = dict([(names[familyId], set([])) for familyId in range(len(names))
+                             if masks[row] & (1 << familyId)])
+            while run < len(runStarts) and runStarts[run] < indptr[row + 1]:
+                features[names[runFamilies[run]]] = set(featureStrings[runStarts[run]:runEnds[run]])
+                run += 1
+            tokenFeatures[tokenIndex] = features
+        self.__tokenFeatures = tokenFeatures
+        return tokenFeatures
+
+
+class FeatureRecord:
+    """ Features of some of the sentences of an abstract in a feature file.
+        The feature and family ids in its array are positions in the lists of
+        feature strings and family names in its header. """
+    header = None     # header of the record (see FeatureDirectory)
+    array = None      # int32 array of the record
+    strings = None    # object array of the feature strings of the record
+    familyIds = None  # family name -> family id in the record
+    __ids = None      # (index, addFeatures, index size, feature id map, family id map)
+
+    def __init__(self, header, array):
+        self.header = header
+        self.array = array
+        self.strings = numpy.empty(len(header['features']), dtype=object)
+        self.strings[:] = header['features']
+        self.familyIds = dict([(name, i) for (i, name) in enumerate(header['families'])])
+        self.__ids = None
+
+    def decode(self, digest):
+        """ return StoredFeatures for the sentence with a given digest. its
+            arrays are views of the array of the record. """
+        array = self.array
+        start = self.header['sentences'][digest]
+        nRows = int(array[start])
+        nFeatures = int(array[start + 1])
+        start += 2
+        tokenIndices = array[start:start + nRows]
+        start += nRows
+        familyMasks = array[start:start + nRows]
+        start += nRows
+        indptr = array[start:start + nRows + 1]
+        start += nRows + 1
+        indices = array[start:start + nFeatures]
+        start += nFeatures
+        families = array[start:start + nFeatures]
+        return StoredFeatures(self, FeatureMatrix(tokenIndices, indptr, indices, families), familyMasks)
+
+    def ids(self, index, addFeatures=True):
+        """ return (feature ids, family ids): arrays mapping the feature and
+            family ids of the record to the ids of a given FeatureIndex.
+            addFeatures = if False, features that are not already in the index
+                          get the id -1 """
+        ids = self.__ids
+        if ids is None or ids[0] is not index or ids[1] != addFeatures \
+                or (not addFeatures and ids[2] != len(index)):
+            if addFeatures:
+                getId = index.features.id
+                featureIds = numpy.array([getId(feature) for feature in self.header['features']],
+                                         dtype=numpy.int32)
+            else:
+                featureIds = index.features.lookup(self.header['features'])
+            familyIds = numpy.array([index.families.id(name) for name in self.header['families']],
+                                    dtype=numpy.int32)
+            ids = (index, addFeatures, len(index), featureIds, familyIds)
+            self.__ids = ids
+        return (ids[3], ids[4])
+
+
+class FeatureFile:
+    """ The records of a feature file that could be read. """
+    records = None    # FeatureRecord objects in the order they are in the file
+    sentences = None  # sentence digest -> the last FeatureRecord holding its features
+    complete = True   # False if the file ends with something that is not a record
+
+    def __init__(self):
+        self.records = []
+        self.sentences = {}
+        self.complete = True
+
+    def nSentences(self):
+        """ return the number of sentences in all records, including sentences
+            whose features were replaced by a later record """
+        return sum([len(record.header['sentences']) for record in self.records])
+
+
+class FeatureDirectory:
+    """ Maintain a directory of feature files, one for each abstract and
+        feature configuration.
+
+        A feature file is a list of records. Each record starts with a pickled
+        header (format version, abstract id, feature configuration, the feature
+        strings and family names used in the record, and the position of the
+        features and the label state of each sentence keyed by sentence digest).
+        It is followed by an int32 array. For each sentence the array holds
+
+          number of rows, number of features,
+          token index of each row, bit mask of the feature families of each row,
+          start of each row (CSR indptr), feature ids, family id of each feature
+
+        New features are appended to the file as a new record. A sentence in a
+        later record replaces the same sentence in an earlier one. The file is
+        written again without the replaced sentences and the sentences that are
+        no longer in the abstract once they outnumber the others.
+
+        Features are only used if the abstract id, sentence digest and
+        configuration all match, so changing any of them invalidates them.
+        Features whose label state differs from the sentence are updated by
+        the FeatureStore. """
+    path = None       # directory containing feature files
+    files = None      # (abstract id, configuration digest) -> FeatureFile of files read
+    pending = None    # (abstract id, configuration digest) -> [abstract, configuration, sentences]
+
+    def __init__(self, path):
+        """ path = directory used to store feature files. it is created if needed """
+        if len(path) > 0 and path[-1] != '/':
+            path = path + '/'
+        self.path = path
+        self.files = {}
+        self.pending = {}
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+    def filename(self, abstractId, configuration):
+        """ return name of the feature file for an abstract and feature configuration """
+        return '%s%s.%s.features' % (self.path, abstractId, configurationDigest(configuration))
+
+    def readFile(self, abstractId, configuration):
+        """ return the FeatureFile with the records of a feature file that can be
+            read. the arrays of the records are read into memory and the file is
+            closed, so no file stays open. records that are out of date are
+            ignored, as is everything after a record that cannot be decoded
+            (e.g. one that was only partly written). errors reading the file
+            are raised. """
+        key = (abstractId, configurationDigest(configuration))
+        if key in self.files:
+            return self.files[key]
+        featureFile = FeatureFile()
+        filename = self.filename(abstractId, configuration)
+        if os.path.exists(filename):
+            size = os.path.getsize(filename)
+            file = open(filename, 'rb')
+            try:
+                offset = 0
+                while offset < size:
+                    file.seek(offset)
+                    header = cPickle.load(file)
+                    offset = file.tell()
+                    if not isinstance(header, dict) or header.get('version') != featureFileVersion \
+                            or header.get('abstract') != abstractId \
+                            or header.get('configuration') != configuration \
+                            or offset + 4 * header['length'] > size:
+                        break
+                    array = numpy.fromfile(file, dtype=numpy.int32, count=header['length'])
+                    record = FeatureRecord(header, array)
+                    featureFile.records.append(record)
+                    for digest in header['sentences']:
+                        featureFile.sentences[digest] = record
+                    offset += 4 * header['length']
+            except decodeErrors, e:
+                print 'Ignoring the rest of unreadable feature file', filename, ':', e
+            finally:
+                file.close()
+            featureFile.complete = (offset == size)
+        self.files[key] = featureFile
+        return featureFile
+
+    def load(self, abstractId, digest, configuration):
+        """ return (StoredFeatures, label state) for a sentence with a given
+            digest in an abstract, computed with a given feature configuration.
+            label state = token labels when the features were computed (see labelState)
+            return None if the features are not in the directory. """
+        record = self.readFile(abstractId, configuration).sentences.get(digest)
+        if record is None:
+            return None
+        return (record.decode(digest), record.header['labels'][digest])
+
+    def add(self, abstract, digest, configuration, tokenFeatures, labels):
+        """ add the features of a sentence to the feature file for its abstract
+            the next time flush() is called.
+            tokenFeatures = dict mapping token index -> feature dictionary
+            labels = token labels the features were computed with (see labelState) """
+        key = (abstract.id, configurationDigest(configuration))
+        if key not in self.pending:
+            self.pending[key] = [abstract, configuration, {}]
+        self.pending[key][2][digest] = (tokenFeatures, labels)
+
+    def flush(self, digestFunction=sentenceDigest):
+        """ append the new features of each abstract to its feature file.
+            features of sentences that are no longer in the abstract are ignored.
+            the file is written again if it holds more replaced or old sentences
+            than current ones, or if it does not end with a complete record. """
+        for (key, (abstract, configuration, newFeatures)) in self.pending.items():
+            currentDigests = set([digestFunction(sentence) for sentence in abstract.allSentences()])
+            sentences = dict([(digest, features) for (digest, features) in newFeatures.items()
+                              if digest in currentDigests])
+            featureFile = self.readFile(abstract.id, configuration)
+            kept = [digest for digest in featureFile.sentences
+                    if digest in currentDigests and digest not in sentences]
+            del self.files[key]
+            if len(sentences) == 0:
+                continue
+            if len(featureFile.records) > 0 and featureFile.complete \
+                    and featureFile.nSentences() <= 2 * (len(kept) + len(sentences)):
+                self.append(abstract.id, configuration, sentences)
+            else:
+                for digest in kept:
+                    record = featureFile.sentences[digest]
+                    sentences[digest] = (record.decode(digest).tokenFeatures(),
+                                         record.header['labels'][digest])
+                self.write(abstract.id, configuration, sentences)
+        self.pending = {}
+        self.files = {}
+
+    def encode(self, abstractId, configuration, sentences):
+        """ return (header, array) of a record holding the features of some sentences.
+            sentences = dict mapping sentence digest -> (token features, label state)
+                        where token features maps token index -> feature dictionary """
+        featureIds = {}
+        strings = []
+        familyIds = {}
+        familyNames = []
+        positions = {}
+        labels = {}
+        values = []
+        for (digest, (tokenFeatures, labelState)) in sentences.items():
+            positions[digest] = len(values)
+            labels[digest] = labelState
+            tokenIndices = sorted(tokenFeatures.keys())
+            familyMasks = []
+            indptr = [0]
+            indices = []
+            families = []
+            for tokenIndex in tokenIndices:
+                mask = 0
+                for (family, featureSet) in tokenFeatures[tokenIndex].items():
+                    if family not in familyIds:
+                        familyIds[family] = len(familyNames)
+                        familyNames.append(family)
+                    familyId = familyIds[family]
+                    mask |= 1 << familyId
+                    for feature in featureSet:
+                        id = featureIds.get(feature)
+                        if id is None:
+                            id = len(strings)
+                            featureIds[feature] = id
+                            strings.append(feature)
+                        indices.append(id)
+                        families.append(familyId)
+                familyMasks.append(mask)
+                indptr.append(len(indices))
+            values += [len(tokenIndices), len(indices)]
+            values += tokenIndices + familyMasks + indptr + indices + families
+
+        header = {'version': featureFileVersion, 'abstract': abstractId,
+                  'configuration': configuration, 'features': strings,
+                  'families': familyNames, 'sentences': positions, 'labels': labels,
+                  'length': len(values)}
+        return (header, numpy.array(values, dtype=numpy.int32))
+
+    def append(self, abstractId, configuration, sentences):
+        """ append a record with the features of some sentences to the feature
+            file for an abstract (see encode). a record that is only partly
+            written is ignored when the file is read. """
+        (header, array) = self.encode(abstractId, configuration, sentences)
+        filename = self.filename(abstractId, configuration)
+        try:
+            file = open(filename, 'ab')
+            try:
+                cPickle.dump(header, file, cPickle.HIGHEST_PROTOCOL)
+                file.write(array.tostring())
+            finally:
+                file.close()
+        except Exception, e:
+            print 'Unable to append to feature file', filename, ':', e
+
+    def write(self, abstractId, configuration, sentences):
+        """ write the feature file for an abstract with one record holding the
+            features of some sentences (see encode).
+
+            The file is written to a temporary file first and then renamed,
+            so an interrupted run never leaves a partial feature file behind. """
+        (header, array) = self.encode(abstractId, configuration, sentences)
+        filename = self.filename(abstractId, configuration)
+        (fd, tmpFilename) = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+        try:
+            file = os.fdopen(fd, 'wb')
+            try:
+                cPickle.dump(header, file, cPickle.HIGHEST_PROTOCOL)
+                file.write(array.tostring())
+            finally:
+                file.close()
+            os.rename(tmpFilename, filename)
+        except Exception, e:
+            print 'Unable to write feature file', filename, ':', e
+            if os.path.exists(tmpFilename):
+                os.remove(tmpFilename)
+
+
+class FeatureStore:
+    """ Features of the tokens in each sentence, for each feature configuration. """
+    generation = 0    # features stored before the last call to clear() are ignored
+    hits = 0          # number of sentences whose stored features were reused
+    misses = 0        # number of sentences whose features had to be computed
+    diskHits = 0      # number of sentences whose features were read from the directory
+    labelUpdates = 0  # number of sentences whose label features were updated
+    directory = None  # FeatureDirectory used to keep features between runs (optional)
+    sentences = None  # weak set of the sentences holding features of this store
+
+    def __init__(self, path=None):
+        """ path = directory used to keep features between runs. if None,
+                   features are only kept in memory. """
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.diskHits = 0
+        self.labelUpdates = 0
+        self.sentences = weakref.WeakSet()
+        if path != None:
+            self.directory = FeatureDirectory(path)
+        else:
+            self.directory = None
+
+    def __sentenceRecord(self, sentence):
+        """ return [store, generation, entries, digest] for a sentence where
+            entries maps configuration -> stored features and digest is the
+            sentence digest (None until it is needed). an entry is
+            (number of tokens, token index -> feature dictionary, label state,
+            StoredFeatures if the features were read from the directory).
+            records made by another
+            store or before clear() are dropped. """
+        record = sentence.storedFeatures
+        if record is None or record[0] is not self or record[1] != self.generation:
+            record = [self, self.generation, {}, None]
+            sentence.storedFeatures = record
+            self.sentences.add(sentence)
+        return record
+
+    def sentenceDigest(self, sentence):
+        """ return the digest of a sentence, computing it only once while the
+            sentence does not change """
+        record = self.__sentenceRecord(sentence)
+        if record[3] is None:
+            record[3] = sentenceDigest(sentence)
+        return record[3]
+
+    def usesDirectory(self, sentence):
+        """ return True if features for a given sentence are kept in the directory """
+        return self.directory is not None and sentence.abstract is not None \
+            and sentence.abstract.id is not None
+
+    def get(self, sentence, configuration, tokens, updateLabels=None):
+        """ return list of the feature dictionaries stored for some of the
+            tokens of a sentence, computed with a given feature configuration.
+            return None unless features are stored for all of the tokens.
+
+            updateLabels(sentence, tokenFeatures, changed) is called if token
+            labels changed since the features were computed. it is given the
+            stored token features (token index -> feature dictionary) and the
+            indices of the tokens whose labels changed, and returns the token
+            features with the label dependent features updated. the stored
+            features are not modified. the updated features are not written
+            to the directory: updating them is cheaper than writing the file.
+            if updateLabels is None, features are not reused after labels change. """
+        entries = self.__sentenceRecord(sentence)[2]
+        entry = entries.get(configuration)
+        if (entry is None or entry[0] != len(sentence)) and self.usesDirectory(sentence):
+            stored = self.directory.load(sentence.abstract.id, self.sentenceDigest(sentence),
+                                         configuration)
+            if stored is not None:
+                entry = (len(sentence), stored[0].tokenFeatures(), stored[1], stored[0])
+                entries[configuration] = entry
+                self.diskHits += 1
+        if entry is not None and entry[0] == len(sentence):
+            labels = labelState(sentence)
+            if labels != entry[2]:
+                if updateLabels is None:
+                    self.misses += 1
+                    return None
+                changed = changedLabels(entry[2], labels)
+                entry = (len(sentence), updateLabels(sentence, entry[1], changed), labels, entry[3])
+                entries[configuration] = entry
+                self.labelUpdates += 1
+            tokenFeatures = entry[1]
+            try:
+                features = [tokenFeatures[token.index] for token in tokens]
+                self.hits += 1
+                return features
+            except KeyError:
+                pass
+        self.misses += 1
+        return None
+
+    def put(self, sentence, configuration, tokens):
+        """ store the current features of some of the tokens of a sentence.
+            the feature sets are shared with the tokens, so they should not be
+            modified after they are stored. """
+        entries = self.__sentenceRecord(sentence)[2]
+        entry = entries.get(configuration)
+        labels = labelState(sentence)
+        if entry is None or entry[0] != len(sentence) or entry[2] != labels:
+            entry = (len(sentence), {}, labels, None)
+            entries[configuration] = entry
+        for token in tokens:
+            entry[1][token.index] = dict(token.features)
+        if self.usesDirectory(sentence):
+            self.directory.add(sentence.abstract, self.sentenceDigest(sentence), configuration,
+                               entry[1], labels)
+
+    def flush(self):
+        """ write features computed since the last flush to the directory """
+        if self.directory is not None:
+            self.directory.flush(self.sentenceDigest)
+
+    def clear(self):
+        """ forget all stored features (features in the directory are kept) """
+        self.flush()
+        self.generation += 1
+        for sentence in list(self.sentences):
+            record = sentence.storedFeatures
+            if record is not None and record[0] is self:
+                sentence.storedFeatures = None
+        self.sentences.clear()
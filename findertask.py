@@ -4,6 +4,11 @@
 
 import sys
 import os.path
+import time
+import multiprocessing
+import rundirectory
+
+import featureprofile
 
 from abstractlist import AbstractList
 from finder import Finder
@@ -45,17 +50,26 @@ class FinderTask:
     finder=None
     discardLabels=False
     finderFilters=[]
+    profilePath=None
+    profile=None
 
     def __init__(self, finder=None, modelFilename=None, modelPath=None, \
-                 discardLabels=False, finderFilters=[]):
+                 discardLabels=False, finderFilters=[], profilePath=None):
         """ Initialize new finder task given a Finder object and
             a destination path for writing the resulting abstract XML files.
 
             if discardLabels == True, clear the labels for each token that match
               the set of labels specified in the Finder. This is done after features
               are computed.
+
+            if profilePath is given, the time and size of each feature family
+              are recorded and written to a file in this directory
+              (see featureprofile).
         """
         self.discardLabels = discardLabels
+        if profilePath != None and profilePath[-1] != '/':
+            profilePath = profilePath + '/'
+        self.profilePath = profilePath
         if modelPath == None:
             self.modelPath = '.'
         else:
@@ -78,25 +92,87 @@ class FinderTask:
                # self.modelFilename = self.modelPath+self.finder.entityTypesString + '.model'
                 self.modelFilename = self.modelPath+self.finder.getDefaultModelFilename() + '.model'
 
-    def train(self, absList):
-        """  train mention finding model """
+    def train(self, absList, trainer=None):
+        """  train mention finding model.
+             if a ConcurrentTrainer is given, the model is fit by one of its
+             worker processes once the features are computed. """
         print 'Training model to recognize:', self.finder.entityTypes, self.modelFilename
-        self.finder.computeFeatures(absList, mode='train')
+        seconds = self.computeFeatures(absList, 'train')
         if self.discardLabels:
             self.removeLabels(absList, self.finder.entityTypes)
+        if trainer == None:
+            self.fit(absList, seconds)
+        else:
+            trainer.start(self, absList, seconds)
+
+    def fit(self, absList, seconds, workPath=None):
+        """ train the finder's model on a list of abstracts whose features have
+            been computed and write the feature profile.
+            seconds = time spent computing the features
+            workPath = if given, directory for the intermediate files of the
+                       finder's token classifier """
+        tokenClassifier = getattr(self.finder, 'tokenClassifier', None)
+        if workPath != None and tokenClassifier != None:
+            tokenClassifier.workPath = workPath
         self.finder.train(absList, self.modelFilename)
+        self.writeProfile('train', seconds)
+
+    def workName(self):
+        """ return a name for the task that can be used in file names """
+        return '%s.%s' % (self.finder.entityTypesString, self.finder.finderType)
 
     def test(self, absList, statOut, postProcess=False, fold=None):
         """ apply mention finding model """
         print 'Finding:', self.finder.entityTypes
-        self.finder.computeFeatures(absList, mode='test')
+        seconds = self.computeFeatures(absList, 'test')
         if self.discardLabels:
             self.removeLabels(absList, self.finder.entityTypes)
         self.finder.test(absList, self.modelFilename, fold=fold)
+        self.writeProfile('test', seconds, fold)
         if postProcess:
             self.filterResults(absList)
         self.computeStats(absList, statOut, fold)
 
+    def computeFeatures(self, absList, mode):
+        """ compute the finder's features for a list of abstracts and return the
+            time in seconds. if the task has a profile path, a FeatureProfile is
+            given to the finder and its token classifier until writeProfile() is
+            called. """
+        if self.profilePath != None:
+            self.profile = featureprofile.FeatureProfile()
+            self.setProfile(self.profile)
+        startTime = time.time()
+        self.finder.computeFeatures(absList, mode=mode)
+        seconds = time.time() - startTime
+        if self.profile != None:
+            self.profile.countFeatures(absList, getattr(self.finder, 'tokenFilter', None))
+        return seconds
+
+    def setProfile(self, profile):
+        """ give a FeatureProfile to the finder and its token classifier """
+        if hasattr(self.finder, 'featureProfile'):
+            self.finder.featureProfile = profile
+        tokenClassifier = getattr(self.finder, 'tokenClassifier', None)
+        if tokenClassifier != None:
+            tokenClassifier.featureProfile = profile
+
+    def writeProfile(self, mode, seconds, fold=None):
+        """ write the feature profile recorded since computeFeatures() to
+            <profile path>/<entity types>.<finder type>.<mode>[.<fold>].features.tsv """
+        if self.profile == None:
+            return
+        if fold != None:
+            foldString = '.%d' % fold
+        else:
+            foldString = ''
+        if not os.path.isdir(self.profilePath):
+            os.makedirs(self.profilePath)
+        filename = '%s%s.%s.%s%s.features.tsv' % (self.profilePath, self.finder.entityTypesString,
+                                                  self.finder.finderType, mode, foldString)
+        self.profile.write(filename, self.finder.entityTypesString, mode, seconds)
+        self.setProfile(None)
+        self.profile = None
+
     def computeStats(self, absList, statOut, fold=None):
         """ compute finder performance stats for a given list of abstracts. write result to file """
         if fold != None:
@@ -104,7 +180,8 @@ class FinderTask:
         else:
             foldString = ''
 
-        errorFilename = '%s.%s%s.errors.txt'%(self.finder.entityTypesString,self.finder.finderType, foldString)
+        errorFilename = rundirectory.outputFilename('%s.%s%s.errors.txt'%(self.finder.entityTypesString,
+                                                                          self.finder.finderType, foldString))
         print '~~~~~~~~~~~~~~~~~ Writing:', errorFilename
         print 'fold=',fold
 
@@ -125,13 +202,15 @@ class FinderTask:
             were loaded.
         """
         print 'Training/testing models to recognize:', self.finder.entityTypes
-        self.finder.computeFeatures(absList, mode='crossval')
+        seconds = self.computeFeatures(absList, 'crossval')
         if self.discardLabels:
             self.removeLabels(absList, self.finder.entityTypes)
         self.finder.crossvalidate(absList, self.modelPath)
+        self.writeProfile('crossval', seconds)
         if postProcess:
             self.filterResults(absList)
-        errorFilename = self.finder.entityTypesString+'.'+self.finder.finderType + '.errors.txt'
+        errorFilename = rundirectory.outputFilename(self.finder.entityTypesString+'.'+self.finder.finderType
+                                                    + '.errors.txt')
         errorOut = open(errorFilename, 'w')
         self.finder.computeStats(absList, statOut, errorOut)
         errorOut.close()
@@ -150,3 +229,63 @@ class FinderTask:
                         for label in labels:
                             token.removeLabel(label)
 
+
+class ConcurrentTrainer:
+    """ Fit the models of finder tasks in worker processes so that models that
+        do not depend on each other are trained at the same time.
+
+        A worker is forked when a task has computed the features for its
+        model. It gets a copy of the abstracts as they are at that point, so
+        the next task may compute its own features (and apply its own sentence
+        filter) while the model is being fit. Each task's token classifier
+        writes its intermediate files to <work path>/<entity types>.<finder type>.
+        The feature profile of a task is written by its worker.
+    """
+    nWorkers = 1
+    workPath = None
+    running = None    # list of (FinderTask, Process) for the workers that have not been waited for
+
+    def __init__(self, nWorkers, workPath):
+        """ nWorkers = maximum number of models fit at the same time
+            workPath = directory for the work directories of the tasks """
+        self.nWorkers = max(1, nWorkers)
+        self.workPath = workPath
+        self.running = []
+
+    def start(self, finderTask, absList, seconds):
+        """ fit the model of a finder task in a new worker process, waiting
+            for the oldest worker to finish if all workers are busy """
+        while len(self.running) >= self.nWorkers:
+            self.join(0)
+        workPath = os.path.join(self.workPath, finderTask.workName())
+        if not os.path.isdir(workPath):
+            os.makedirs(workPath)
+        print 'Fitting model for', finderTask.finder.entityTypes, 'in', workPath
+        sys.stdout.flush()
+        process = multiprocessing.Process(target=finderTask.fit, args=(absList, seconds, workPath))
+        process.start()
+        # the worker writes the profile recorded while computing the features
+        finderTask.setProfile(None)
+        finderTask.profile = None
+        self.running.append((finderTask, process))
+
+    def join(self, i):
+        """ wait for the i-th running worker to finish.
+            raise RuntimeError if it failed. """
+        (finderTask, process) = self.running.pop(i)
+        process.join()
+        if process.exitcode != 0:
+            raise RuntimeError('Training %s failed (exit code %s)'
+                               % (finderTask.modelFilename, process.exitcode))
+
+    def wait(self):
+        """ wait for all of the workers to finish.
+            raise RuntimeError if any of them failed. """
+        failed = []
+        while len(self.running) > 0:
+            try:
+                self.join(0)
+            except RuntimeError, e:
+                failed.append(str(e))
+        if len(failed) > 0:
+            raise RuntimeError('; '.join(failed))
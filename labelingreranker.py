@@ -9,6 +9,7 @@ import random
 import math
 
 import templates
+import rundirectory
 from finder import Finder
 from basetokenclassifier import TokenLabel
 from tokenlist import TokenList
@@ -482,7 +483,8 @@ class LabelingReRanker(Finder):
       
   def trainRanker(self, absList, modelFilename, includeLabeling=[]):
     """ train a ranker model from a given training file """
-    trainFilename = self.__getFilename('features.rerank.train.txt', fold=None, includeLabeling=includeLabeling)
+    trainFilename = rundirectory.workFilename(self.__getFilename('features.rerank.train.txt', fold=None,
+                                                                 includeLabeling=includeLabeling))
     modelFilename = self.__getFilename(modelFilename, fold=None, includeLabeling=includeLabeling)
    
     self.computeAndWriteFeatures(absList, trainFilename, includeLabeling, forTraining=True)
@@ -496,8 +498,8 @@ class LabelingReRanker(Finder):
     """ apply a trained ranker to a given test file """         
     fString = '.' + '-'.join(includeLabeling)
     
-    testFilename = self.__getFilename('features.rerank.test.txt', fold, includeLabeling)
-    resultFilename = self.__getFilename('rerank.results.txt', fold, includeLabeling)
+    testFilename = rundirectory.workFilename(self.__getFilename('features.rerank.test.txt', fold, includeLabeling))
+    resultFilename = rundirectory.workFilename(self.__getFilename('rerank.results.txt', fold, includeLabeling))
     modelFilename = self.__getFilename(modelFilename, fold=None, includeLabeling=includeLabeling)
         
     featureVectors = self.computeAndWriteFeatures(absList, testFilename, includeLabeling, forTraining=False)
@@ -554,10 +556,13 @@ class LabelingReRanker(Finder):
     print '--- clean'
    
   def readResultFileAndAssignScores(self, featureVectors, resultFilename):
-    """ read a result file and assign scores to each feature vector in a list of feature vectors """
-    resultLines = open(resultFilename, 'r').readlines()
+    """ read a result file and assign scores to each feature vector in a list of feature vectors.
+        the file is read one line at a time. """
+    resultFile = open(resultFilename, 'r')
     i = 0    # current feature vector
-    for line in resultLines:
+    lineNo = 0
+    for line in resultFile:
+      lineNo += 1
       try:
         parsedLine = line.strip().split()
         score = float(parsedLine[0])
@@ -565,8 +570,9 @@ class LabelingReRanker(Finder):
         i = i + 1
       except:
         print 'Error parsing re-ranker result file'
-        print 'i = %d, len(featureVectors) = %d, len(resultLines) = %d, line = %s, parsedLine = %s' \
-            % (i, len(featureVectors), len(resultLines), line, parsedLine)
+        print 'i = %d, len(featureVectors) = %d, line number = %d, line = %s, parsedLine = %s' \
+            % (i, len(featureVectors), lineNo, line, parsedLine)
+    resultFile.close()
     
   def assignMostPopularLabeling(self, sentence, includeLabeling=['group', 'outcome', 'eventrate', 'number']):
     """ ignore re-ranker score. Identify the labeling with largest number of popular tags """
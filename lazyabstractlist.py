@@ -0,0 +1,327 @@
+#!/usr/bin/env python
+
+"""
+ maintain a list of abstracts that are only loaded while they are being used
+"""
+
+import os
+import glob
+import shutil
+import tempfile
+import weakref
+import cPickle
+import collections
+import xml.etree.cElementTree as ElementTree
+
+import abstract
+import abstractcache
+from abstractlist import AbstractList
+
+
+__author__ = 'Rodney L. Summerscales'
+
+
+# attributes that are rebuilt when an abstract is loaded or are only caches
+unsavedAttributes = frozenset(['sentences', 'dirty', 'xmlFileStamp', 'columns', 'syntax',
+                               'storedFeatures'])
+
+
+def attributeSignature(object):
+    """ return list of (name, value, length of value) for the attributes of an
+        object that hold state (see stateSignature) """
+    signature = []
+    for (name, value) in sorted(object.__dict__.items()):
+        if name not in unsavedAttributes:
+            try:
+                length = len(value)
+            except (TypeError, AttributeError):
+                length = None
+            signature.append((name, value, length))
+    return signature
+
+
+def stateSignature(abs):
+    """ return a value that changes when state that is not in the xml file of
+        an abstract is added to it: attributes of the abstract or its sentences
+        are assigned, entries are added to them, or tokens get features or
+        top-k labels. changes to the tokens themselves are tracked by the dirty
+        flag of the abstract (see Token.changed). """
+    signature = [attributeSignature(abs)]
+    for sentence in abs.titleSentences + abs.affiliationSentences + abs.allSentences():
+        signature.append(attributeSignature(sentence))
+        for token in sentence.tokens:
+            if token.hasState():
+                signature.append(token)
+    return signature
+
+
+def sameSignature(signature1, signature2):
+    """ return True if two state signatures hold the same objects """
+    if len(signature1) != len(signature2):
+        return False
+    for (part1, part2) in zip(signature1, signature2):
+        if isinstance(part1, list):
+            if not isinstance(part2, list) or len(part1) != len(part2):
+                return False
+            for ((name1, value1, length1), (name2, value2, length2)) in zip(part1, part2):
+                if name1 != name2 or value1 is not value2 or length1 != length2:
+                    return False
+        elif part1 is not part2:
+            return False
+    return True
+
+
+def readAbstractId(filename):
+    """ return the id of the abstract in an xml file without reading the rest of it """
+    for event, element in ElementTree.iterparse(filename, events=('start',)):
+        if element.tag == 'abstract':
+            return element.get('id', '')
+    return ''
+
+
+class LazyAbstractList(AbstractList):
+    """ List of abstracts that keeps only a file handle for each abstract and
+        loads abstracts when they are accessed.
+
+        At most maxTokens tokens worth of abstracts are kept in memory. When the
+        limit is exceeded the least recently used abstracts are evicted: their
+        current state (labels, templates, entities, etc.) is written to a spill
+        file and read back from there the next time they are accessed.
+        Abstracts that have not changed since they were read from their xml
+        file are not written, they are read from the xml file (or its
+        snapshot) again.
+
+        len(), indexing and iteration behave the same as for AbstractList, so the
+        list can be passed to FinderTask and SummaryList. Cross-validation is not
+        supported, since it needs every abstract at once. """
+    maxTokens = 100000     # memory budget, as the number of tokens kept in memory
+    loadRegistries = True
+
+    def __init__(self, path=None, sentenceFilter=None, label='', loadRegistries=True,
+                 parser='iterparse', snapshotPath=None, maxTokens=100000, spillPath=None):
+        """ create new list of abstracts from the xml files in a directory
+
+            path = directory containing xml files
+            sentenceFilter = function that takes a Sentence object as a parameter
+                     and returns True if the sentence should be included
+                     and False if it should be ignored.
+                     (optional. default is to include every sentence.)
+            parser = xml parser used to read each file ('iterparse' or 'minidom').
+            snapshotPath = directory used to keep binary snapshots of loaded
+                     abstracts (optional. see AbstractList)
+            maxTokens = maximum number of tokens in abstracts kept in memory.
+                     at least one abstract is always kept in memory.
+            spillPath = directory used for the spill files of evicted abstracts.
+                     (optional. default is a new temporary directory.)
+                             """
+        self.cvSets = []
+        self.nFolds = 0
+        self.parser = parser
+        self.snapshotPath = snapshotPath
+        self.nWorkers = 1
+        self.loadRegistries = loadRegistries
+        self.maxTokens = maxTokens
+        if sentenceFilter == None:
+            self.sentenceFilter = lambda sentence: True
+        else:
+            self.sentenceFilter = sentenceFilter
+
+        self.__files = []         # xml file for each abstract in list
+        self.__loaded = collections.OrderedDict()   # abstracts in memory, least recently used first
+        self.__tokenCounts = {}   # number of tokens in each abstract in memory
+        self.__nTokens = 0        # number of tokens in memory
+        self.__spilled = {}       # spill file for each evicted abstract
+        self.__evicted = {}       # weak reference to each evicted abstract
+        self.__unchanged = {}     # state signature of abstracts read from xml files that were not written since
+        self.__cache = None
+        if spillPath == None:
+            self.__spillPath = tempfile.mkdtemp(prefix='abstracts')
+            self.__removeSpillPath = True
+        else:
+            if not os.path.isdir(spillPath):
+                os.makedirs(spillPath)
+            self.__spillPath = spillPath
+            self.__removeSpillPath = False
+
+        if path != None:
+            self.readXML(path, label, loadRegistries)
+
+    def readXML(self, path='', label='', loadRegistries=True):
+        """ build list of the xml files in a given directory.
+            abstracts are read when they are first accessed. """
+        if len(path) > 0 and path[-1] != '/':
+            path = path + '/'
+
+        self.clear()
+        self.loadRegistries = loadRegistries
+        if self.snapshotPath != None:
+            self.__cache = abstractcache.AbstractCache(self.snapshotPath)
+
+        # get list of xml files in given directory
+        if len(label) > 0:
+            self.__files = glob.glob(path+'*.'+label+'.xml')
+        else:
+            self.__files = glob.glob(path+'*.xml')
+        print 'Found %d files in %s' % (len(self.__files), path)
+
+    def clear(self):
+        """ remove all abstracts from the list and delete their spill files """
+        for filename in self.__spilled.values():
+            if os.path.exists(filename):
+                os.remove(filename)
+        self.__files = []
+        self.__loaded.clear()
+        self.__tokenCounts = {}
+        self.__nTokens = 0
+        self.__spilled = {}
+        self.__evicted = {}
+        self.__unchanged = {}
+
+    def close(self):
+        """ remove all abstracts and the spill directory (if it was created by this list).
+            call this when the list is no longer needed. """
+        self.clear()
+        if self.__removeSpillPath and os.path.isdir(self.__spillPath):
+            shutil.rmtree(self.__spillPath)
+
+    def numberLoaded(self):
+        """ return the number of abstracts currently in memory """
+        return len(self.__loaded)
+
+    def __loadAbstract(self, index):
+        """ return the abstract at a given position in the list, loading it if needed """
+        if index in self.__loaded:
+            abs = self.__loaded.pop(index)
+            self.__loaded[index] = abs    # now the most recently used
+            return abs
+
+        abs = None
+        if index in self.__evicted:
+            # some other object still uses the evicted abstract, keep using it
+            # so that neither copy misses changes made to the other one
+            abs = self.__evicted.pop(index)()
+        if abs == None and index in self.__spilled:
+            file = open(self.__spilled[index], 'rb')
+            abs = cPickle.load(file)
+            file.close()
+        fromFile = (abs == None)
+        if fromFile:
+            abs = self.__readFile(self.__files[index])
+        abs.filterSentences(self.sentenceFilter)
+        if fromFile:
+            self.__unchanged[index] = stateSignature(abs)
+
+        self.__loaded[index] = abs
+        nTokens = 0
+        for sentence in abs.titleSentences + abs.affiliationSentences + abs.allSentences():
+            nTokens += len(sentence.tokens)
+        self.__tokenCounts[index] = nTokens
+        self.__nTokens += nTokens
+        self.__evictAbstracts()
+        return abs
+
+    def __readFile(self, filename):
+        """ read abstract from an xml file (or its snapshot) """
+        abs = None
+        if self.__cache != None:
+            abs = self.__cache.load(filename)
+        if abs == None:
+            print 'Reading:', filename
+            if self.__cache != None:
+                stamp = self.__cache.fileStamp(filename)
+            abs = abstract.Abstract(filename, self.sentenceFilter, self.loadRegistries, self.parser)
+            if self.__cache != None:
+                self.__cache.save(filename, abs, stamp)
+        self.cleanupAbstractAnnotations(abs)
+        return abs
+
+    def __evictAbstracts(self):
+        """ evict least recently used abstracts until the loaded abstracts fit
+            in the memory budget. """
+        while self.__nTokens > self.maxTokens and len(self.__loaded) > 1:
+            (index, abs) = self.__loaded.popitem(last=False)
+            self.__nTokens -= self.__tokenCounts.pop(index)
+            self.__evicted[index] = weakref.ref(abs)
+            signature = self.__unchanged.get(index)
+            if signature is not None and not abs.dirty \
+                    and sameSignature(signature, stateSignature(abs)):
+                # nothing to save, read the xml file again when it is needed
+                continue
+            self.__unchanged.pop(index, None)
+            if index not in self.__spilled:
+                (fd, self.__spilled[index]) = tempfile.mkstemp(dir=self.__spillPath, suffix='.spill')
+                os.close(fd)
+            file = open(self.__spilled[index], 'wb')
+            file.write(abstractcache.pickleAbstract(abs))
+            file.close()
+
+    def applySentenceFilter(self, sentenceFilter):
+        """ apply a given filter to determine which sentences are included in the
+            main sentence list (Abstract.sentence) for each abstract.
+
+            Abstracts that are not in memory are filtered when they are loaded. """
+        self.sentenceFilter = sentenceFilter
+        for abs in self.__loaded.values():
+            abs.filterSentences(sentenceFilter)
+
+    def createCrossValidationSets(self, nFolds, randomSeed=42):
+        """ crossvalidation sets need every abstract in memory at once """
+        if nFolds > 1:
+            raise ValueError('LazyAbstractList does not support crossvalidation')
+
+    def copyList(self, absList):
+        """ copying abstracts from another list is not supported """
+        raise TypeError('LazyAbstractList can only be read from xml files')
+
+    def sort(self):
+        """ sort the list of abstracts by pubmed id """
+        if len(self.__loaded) > 0 or len(self.__spilled) > 0:
+            raise ValueError('LazyAbstractList can only be sorted before abstracts are used')
+        self.__files = sorted(self.__files, key=readAbstractId)
+
+    def index(self, abs):
+        """ return the index of a given abstract. abstracts that are not in
+            memory cannot be held by the caller, so only the loaded abstracts
+            and the evicted ones that are still referenced are searched. """
+        for index, loadedAbs in self.__loaded.items():
+            if loadedAbs is abs:
+                return index
+        for index, reference in self.__evicted.items():
+            if reference() is abs:
+                return index
+        raise ValueError('abstract is not in the list')
+
+    def remove(self, abs):
+        """ remove a given abstract from list of abstracts """
+        index = self.index(abs)
+        del self.__files[index]
+        if index in self.__spilled:
+            os.remove(self.__spilled[index])
+        # indices of the following abstracts all change
+        self.__loaded = collections.OrderedDict(
+            [(i - (i > index), a) for i, a in self.__loaded.items() if i != index])
+        self.__tokenCounts = dict([(i - (i > index), n)
+                                   for i, n in self.__tokenCounts.items() if i != index])
+        self.__nTokens = sum(self.__tokenCounts.values())
+        self.__spilled = dict([(i - (i > index), f) for i, f in self.__spilled.items() if i != index])
+        self.__evicted = dict([(i - (i > index), r) for i, r in self.__evicted.items() if i != index])
+        self.__unchanged = dict([(i - (i > index), u) for i, u in self.__unchanged.items()
+                                 if i != index])
+
+    def __len__(self):
+        """ implement len() method """
+        return len(self.__files)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self.__files)
+        if index < 0 or index >= len(self.__files):
+            raise IndexError('abstract index out of range')
+        return self.__loadAbstract(index)
+
+    def __setitem__(self, index, value):
+        raise TypeError('LazyAbstractList can only be read from xml files')
+
+    def __iter__(self):
+        for index in range(len(self.__files)):
+            yield self.__loadAbstract(index)
@@ -5,9 +5,182 @@
 #import sys
 #import Queue
 import os
+import atexit
+import subprocess
+import cStringIO
+import classifierpipe
 from basetokenclassifier import BaseTokenClassifier
 from basetokenclassifier import TokenLabel
 
+######################################################################
+# Mallet tag server
+######################################################################
+
+class MalletTagServer:
+  """ Client for a long lived java process that keeps Mallet CRF models in
+      memory and labels batches of token sequences sent to it through a pipe
+      (see src/ebm/MalletTagServer.java). This avoids starting a JVM and reading
+      the model each time a classifier is tested.
+      
+      The server is compiled the first time it is needed. If it cannot be
+      compiled or started, tag() returns False and the caller should run
+      the Mallet simple tagger instead.
+      """
+  sourceFilename = 'src/ebm/MalletTagServer.java'
+  classDirectory = 'bin'          # directory the server is compiled to
+  className = 'ebm.MalletTagServer'
+  classpath = ''                  # classpath of the Mallet jar files
+  maxMemory = '2g'                # maximum java heap size
+  maxSequences = 1000             # maximum number of sequences sent in one TAG request
+  process = None                  # server process (None if not running)
+  compiled = None                 # True/False once compiling the server was tried
+  
+  def __init__(self, classpath, maxMemory='2g'):
+    self.classpath = classpath
+    self.maxMemory = maxMemory
+    self.process = None
+    self.compiled = None
+    
+  def compile(self):
+    """ compile the server if it has not been compiled or its source changed.
+        return True if the compiled server is available. compiling is only
+        tried once. """
+    if self.compiled != None:
+      return self.compiled
+    classFilename = os.path.join(self.classDirectory, 'ebm', 'MalletTagServer.class')
+    if os.path.exists(classFilename) and (os.path.exists(self.sourceFilename) == False \
+       or os.path.getmtime(classFilename) >= os.path.getmtime(self.sourceFilename)):
+      self.compiled = True
+    elif os.path.exists(self.sourceFilename):
+      if os.path.isdir(self.classDirectory) == False:
+        os.makedirs(self.classDirectory)
+      cmd = 'javac -cp %s -d %s %s' % (self.classpath, self.classDirectory, self.sourceFilename)
+      print cmd
+      self.compiled = os.system(cmd) == 0 and os.path.exists(classFilename)
+    else:
+      self.compiled = False
+    return self.compiled
+    
+  def start(self):
+    """ start the server if it is not running. return True if it is running. """
+    if self.process != None and self.process.poll() == None:
+      return True
+    self.process = None
+    if self.compile() == False:
+      return False
+    cmd = ['java', '-Xmx' + self.maxMemory, '-cp', self.classDirectory + ':' + self.classpath,
+           self.className]
+    try:
+      self.process = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+    except OSError, e:
+      print 'Unable to start Mallet tag server:', e
+      return False
+    return True
+    
+  def tag(self, modelFilename, sequences, nBest, readOutput):
+    """ label token sequences in SimpleTagger format with a model. the
+        sequences are sent in TAG requests of at most maxSequences sequences,
+        so they are never all held in memory at once.
+        sequences = iterator over strings with the lines of a sequence followed
+          by an empty line
+        nBest = number of labelings for each sequence
+        readOutput(lines) = function called with an iterator over the lines of
+          the reply to each request, which are in the format written by the
+          Mallet simple tagger
+        return (True, list of the values returned by readOutput) if the
+        sequences were labeled, otherwise (False, None) """
+    if self.start() == False:
+      return (False, None)
+    values = []
+    for features in self.requests(sequences):
+      (tagged, value) = self.request(modelFilename, features, nBest, readOutput)
+      if tagged == False:
+        return (False, None)
+      values.append(value)
+    return (True, values)
+
+  def requests(self, sequences):
+    """ generate the features sent in each TAG request for an iterator over sequences """
+    batch = []
+    for sequence in sequences:
+      batch.append(sequence)
+      if len(batch) == self.maxSequences:
+        yield ''.join(batch)
+        batch = []
+    if len(batch) > 0:
+      yield ''.join(batch)
+
+  def request(self, modelFilename, features, nBest, readOutput):
+    """ send one TAG request for a string of features in SimpleTagger format.
+        return (True, value returned by readOutput) if the sequences were
+        labeled, otherwise (False, None) """
+    try:
+      self.process.stdin.write('TAG %d %d %s\n' % (nBest, features.count('\n'), os.path.abspath(modelFilename)))
+      self.process.stdin.write(features)
+      self.process.stdin.flush()
+      line = self.process.stdout.readline()
+      if line.startswith('ERROR'):
+        print 'Mallet tag server:', line.strip()
+        self.process.stdout.readline()
+        return (False, None)
+      lines = self.replyLines(line)
+      value = readOutput(lines)
+      for line in lines:
+        pass
+    except IOError, e:
+      print 'Mallet tag server failed:', e
+      self.close()
+      return (False, None)
+    return (True, value)
+
+  def replyLines(self, line):
+    """ generate the lines of a reply, starting with a given line that has
+        already been read, up to the END line """
+    while line != '' and line != 'END\n':
+      yield line
+      line = self.process.stdout.readline()
+    if line == '':
+      raise IOError('Mallet tag server stopped')
+    
+  def close(self):
+    """ stop the server """
+    if self.process != None:
+      try:
+        self.process.stdin.write('QUIT\n')
+        self.process.stdin.close()
+        self.process.wait()
+      except (IOError, OSError):
+        pass
+      self.process = None
+
+
+tagServers = {}    # classpath -> MalletTagServer shared by the classifiers using it
+
+def getTagServer(classpath):
+  """ return the MalletTagServer for a given Mallet classpath """
+  if classpath not in tagServers:
+    tagServers[classpath] = MalletTagServer(classpath)
+  return tagServers[classpath]
+
+def closeTagServers():
+  """ stop all of the tag servers that were started """
+  for server in tagServers.values():
+    server.close()
+
+atexit.register(closeTagServers)
+
+def splitSequences(lines):
+  """ generate the sequences in lines of features in SimpleTagger format as
+      strings with the lines of a sequence and the empty line that ends it """
+  sequence = []
+  for line in lines:
+    sequence.append(line)
+    if line.strip() == '':
+      yield ''.join(sequence)
+      sequence = []
+  if len(sequence) > 0:
+    yield ''.join(sequence)
+
 ######################################################################
 # Experimental mention finder
 ######################################################################
@@ -20,12 +193,23 @@ class MalletTokenClassifier(BaseTokenClassifier):
   simpleTagger = ''   # command for mallet simple tagger
   crfOrder = 1
   nIterations = 100
+  tagServer = None    # MalletTagServer used to label tokens (None = run simple tagger)
+  nThreads = 1        # number of threads Mallet uses for training
+  labelings = None    # label filename -> token labels read from the output of the tagger
       
-  def __init__(self, order=1, fullyConnected=False, nIterations=100, topK=1):
+  def __init__(self, order=1, fullyConnected=False, nIterations=100, topK=1, minFeatureCount=1,
+               maxFeaturesPerFamily=None, useTagServer=False, nThreads=1, streamFeatures=True):
     """ Create a new mention finder to find a given list of mention types.
         entityTypes = list of mention types to find (e.g. group, outcome)
+        minFeatureCount, maxFeaturesPerFamily = thresholds used to select the
+          features used for training (see FeatureFilter)
+        useTagServer = if True, label tokens with a MalletTagServer shared by
+          all classifiers instead of starting the simple tagger for each test
+        nThreads = number of threads Mallet uses for training (Mallet --threads)
+        streamFeatures = if True, pipe features to Mallet and parse its output
+          as it is written. if False, write feature and label files (for debugging)
     """
-    BaseTokenClassifier.__init__(self, 'mallet', topK)
+    BaseTokenClassifier.__init__(self, 'mallet', topK, minFeatureCount, maxFeaturesPerFamily)
     self.simpleTagger = 'java -Xmx2g -cp ' + self.classpath  \
                          + ' cc.mallet.fst.SimpleTagger'
     self.crfOrder = order
@@ -34,25 +218,40 @@ class MalletTokenClassifier(BaseTokenClassifier):
     else:
       self.connectedOption = 'false'
     self.nIterations = nIterations
+    self.nThreads = nThreads
+    self.streamFeatures = streamFeatures
+    self.labelings = {}
+    if useTagServer:
+      self.tagServer = getTagServer(self.classpath)
       
   def train(self, absList, modelFilename, entityTypes, tokenFilter=None):
     """ Train a mention finder model given a list of abstracts """
-    featureFilename = 'features.'+self.entityTypesString(entityTypes)+'.train.txt'
+    featureFilename = self.workFilename('features.'+self.entityTypesString(entityTypes)+'.train.txt')
             
-    self.writeFeatureFile(absList, featureFilename, entityTypes, True, tokenFilter)
+    self.selectFeatures(absList, modelFilename, tokenFilter)
+    if self.streamFeatures:
+      inputFilename = classifierpipe.stdinFilename
+    else:
+      self.writeFeatureFile(absList, featureFilename, entityTypes, True, tokenFilter)
+      inputFilename = featureFilename
     
     options = '--train true --default-label other --fully-connected '+ self.connectedOption \
           +' --feature-induction false' \
           + ' --orders ' + str(self.crfOrder) \
           + ' --iterations ' + str(self.nIterations) \
           + ' --gaussian-variance 1'  
-#          + ' --threads 4'
+    if self.nThreads > 1:
+      options += ' --threads ' + str(self.nThreads)
 
     outputOptions = ''
     cmd = self.simpleTagger + ' ' + options +' --model-file ' + modelFilename   \
-            + ' ' + featureFilename + ' ' + outputOptions + ' 2>/dev/null'
+            + ' ' + inputFilename + ' ' + outputOptions + ' 2>/dev/null'
     print cmd
-    os.system(cmd)
+    if self.streamFeatures:
+      classifierpipe.run(cmd, lambda featureFile: self.writeFeatureStream(absList, featureFile, entityTypes,
+                                                                       True, tokenFilter, featureFilename))
+    else:
+      os.system(cmd)
     
 
 
@@ -60,11 +259,42 @@ class MalletTokenClassifier(BaseTokenClassifier):
     """ Apply the mention finder to a given list of abstracts
         using the given model file.
     """  
-    featureFilename = 'features.'+self.entityTypesString(entityTypes)+'.test.txt'
+    featureFilename = self.workFilename('features.'+self.entityTypesString(entityTypes)+'.test.txt')
 
-    self.writeFeatureFile(absList, featureFilename, entityTypes, False, tokenFilter)
+    self.useSelectedFeatures(modelFilename)
+    if self.streamFeatures:
+      writeInput = lambda featureFile: self.writeFeatureStream(absList, featureFile, entityTypes,
+                                                               False, tokenFilter, featureFilename)
+      readOutput = lambda lines: self.readNBestLines(lines, 'Mallet output for ' + featureFilename)
+    else:
+      self.writeFeatureFile(absList, featureFilename, entityTypes, False, tokenFilter)
+      
+    if self.tagServer != None:
+      print 'Labeling', featureFilename, 'with model', modelFilename, 'using Mallet tag server'
+      if self.streamFeatures:
+        sequences = self.featureSequences(absList, entityTypes, False, tokenFilter, featureFilename)
+        (tagged, values) = self.tagServer.tag(modelFilename, sequences, self.topK, readOutput)
+        if tagged:
+          self.labelings[labeledFilename] = [tokenLabels for labels in values for tokenLabels in labels]
+          return
+      else:
+        featureFile = open(featureFilename, 'r')
+        labeledFile = open(labeledFilename, 'w')
+        (tagged, values) = self.tagServer.tag(modelFilename, splitSequences(featureFile), self.topK,
+                                              labeledFile.writelines)
+        labeledFile.close()
+        featureFile.close()
+        if tagged:
+          return
+      print 'Running Mallet simple tagger instead'
 #    options = ''
     options = ' --default-label other --n-best ' + str(self.topK)
+    if self.streamFeatures:
+      cmd = '%s %s --model-file %s %s' % (self.simpleTagger, options, modelFilename, classifierpipe.stdinFilename)
+      print cmd
+      (labels, status) = classifierpipe.run(cmd, writeInput, readOutput)
+      self.labelings[labeledFilename] = labels
+      return
     outputOptions = '> ' + labeledFilename
   
 #    cmd = '%s %s --model-file %s %s %s 2>/dev/null' \
@@ -77,110 +307,67 @@ class MalletTokenClassifier(BaseTokenClassifier):
   
     
   def readLabelFile(self, labelFilename, entityTypes):
-    """ read a mallet label file and return the list of labels """
-    labelLines = open(labelFilename, 'r').readlines()
-    labels = []
-    lineNo = 1
-    sequenceProb = []
-    for i in range(self.topK):
-      sequenceProb.append(0.0)
-    
-    currentTopK = self.topK  
-    for line in labelLines:
-      try:
-        topKLabels = line.strip().split()
-        if len(topKLabels) > 0:
-          if topKLabels[0] == 'k' :
-            newTopK = int(topKLabels[1])
-            if newTopK != currentTopK:
-              currentTopK = newTopK
-              sequenceProb = []
-              for i in range(currentTopK):
-                sequenceProb.append(0.0)
-            # this is the list of sequence probabilities
-            for i in range(currentTopK):
-              sequenceProb[i] = float(topKLabels[i+2])
-#            print lineNo, topKLabels[1], currentTopK, sequenceProb
-          elif len(topKLabels) == 2*currentTopK:
-            tokenLabelList = []
-            for i in range(0,currentTopK*2,2):
-              label = topKLabels[i]
-              prob = float(topKLabels[i+1])
-              tLabel = TokenLabel(label)
-              tLabel.prob = prob
-              tLabel.sequenceProb = sequenceProb[i/2]
-              tokenLabelList.append(tLabel)
-#              print 'Read:', tLabel.label, tLabel.sequenceProb, tLabel.prob  
-    
-            labels.append(tokenLabelList)  
-#        if len(topKLabels) == self.topK:
-#    #        for i in range(len(topKLabels)):
-#    #          if topKLabels[i] == 'O':
-#    #            topKLabels[i] = 'other'
-#          if self.topK == 1:
-#            labels.append(topKLabels[0])
-#          else:
-#            labels.append(topKLabels) 
-      except:
-        print '%s: Error at line number %d' % (labelFilename, lineNo)  
-      lineNo += 1     
-    return labels
+    """ return the labels read from the output of the tagger by the last call
+        to test() for a label file, or read them from a mallet label file """
+    if labelFilename in self.labelings:
+      return self.labelings.pop(labelFilename)
+    return self.readNBestLabels(labelFilename)
         
   def writeFeatureFile(self, absList, filename, entityTypes, includeLabels, tokenFilter=None):
     """ write features for each token to a file that can be read by 
         the Mallet simple tagger """
     featureFile = open(filename,'w')
-    featureSetHash = {}
-    for abs in absList:
-      s = 0
-      for sentence in abs.sentences:
-#        currentChunkLength = 0
-        for token in sentence.tokens:
-          # write features for the token
-          if tokenFilter == None or tokenFilter(token) == True: 
-            hasFeatures = False
-            for featureType,featureSet in token.features.items():
-              if featureType not in featureSetHash:
-                featureSetHash[featureType] = set([])
-              for feature in featureSet:
-                featureSetHash[featureType].add(feature)
-                hasFeatures = True
-                try:
-                  featureFile.write(feature+' ')
-                except UnicodeEncodeError: 
-                  print 'UnicodeEncodeError:',
-                  print 'abs=',abs.id, 'sentence=', s, 'token=',token.index
-                  print 'feature=', feature
-                  featureFile.write(feature.encode('ascii', 'xmlcharrefreplace'))
-            if hasFeatures == False:
-              featureFile.write('NO_FEATURES ')
-
-            # write the label for the token
-            if includeLabels == True:
-              # see if the token has one of the labels the finder will look for
-              label='other'
-              for mType in entityTypes:
-                if token.hasAnnotation(mType):
-                  label = mType
-                  break
-              featureFile.write(label+'\n')
-            else:
-              featureFile.write('\n')
-#          currentChunkLength += 1    
-#          if token.text == ',' and currentChunkLength > 4 and (len(sentence.tokens) - 1 - token.index) > 4:
-#            featureFile.write('\n')
-#            currentChunkLength = 0
-        featureFile.write('\n')
-        s += 1
+    self.writeFeatureStream(absList, featureFile, entityTypes, includeLabels, tokenFilter, filename)
     featureFile.close()
+
+  def writeFeatureStream(self, absList, featureFile, entityTypes, includeLabels, tokenFilter=None, name=''):
+    """ write features for each token to an open file or pipe in the format
+        read by the Mallet simple tagger.
+        name = name of the feature file (for the feature counts that are printed) """
+    for sequence in self.featureSequences(absList, entityTypes, includeLabels, tokenFilter, name):
+      featureFile.write(sequence)
+
+  def featureSequences(self, absList, entityTypes, includeLabels, tokenFilter=None, name=''):
+    """ generate a string with the features of the tokens of each sentence in
+        the format read by the Mallet simple tagger, ending with an empty line.
+        the feature counts are printed after the last sentence.
+        name = name of the feature file (for the feature counts that are printed) """
+    familyFeatures = set([])   # (family id << 32) | feature id of each distinct feature
+    families = set([])
+    for abs, s, sentence, matrix in self.featureMatrices(absList, tokenFilter):
+      featureFile = cStringIO.StringIO()
+      for i in range(len(matrix)):
+        token = sentence.tokens[matrix.tokenIndices[i]]
+        # write features for the token
+        ids = matrix.row(i)
+        if len(ids) > 0:
+          self.writeFeatures(featureFile, self.featureIndex.featureStrings(ids), abs, s, token)
+        else:
+          featureFile.write('NO_FEATURES ')
+        families.update(token.features.keys())
+
+        # write the label for the token
+        if includeLabels == True:
+          # see if the token has one of the labels the finder will look for
+          label='other'
+          for mType in entityTypes:
+            if token.hasAnnotation(mType):
+              label = mType
+              break
+          featureFile.write(label+'\n')
+        else:
+          featureFile.write('\n')
+      familyFeatures.update(((matrix.families.astype('int64') << 32) | matrix.indices).tolist())
+      featureFile.write('\n')
+      yield featureFile.getvalue()
     
     print '----------------------------'
-    print 'Feature counts for ', filename
-    for featureType, featureSet in featureSetHash.items():
-      print featureType, len(featureSet)
-      featureSetHash[featureType].clear()
-    featureSetHash.clear()
+    print 'Feature counts for ', name
+    featureCounts = dict.fromkeys(families, 0)
+    for feature in familyFeatures:
+      featureCounts[self.featureIndex.familyName(feature >> 32)] += 1
+    for featureType, count in featureCounts.items():
+      print featureType, count
     print '----------------------------'
            
 
-
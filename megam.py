@@ -5,6 +5,7 @@
 #import sys
 #import Queue
 import os
+import classifierpipe
 from basetokenclassifier import BaseTokenClassifier
 from basetokenclassifier import TokenLabel
 
@@ -18,44 +19,70 @@ class MegamTokenClassifier(BaseTokenClassifier):
       in a list of abstracts.
       """
   binaryThreshold = 0.5
+  labelings = None    # label filename -> token labels read from the output of megam
       
-  def __init__(self, binaryThreshold=0.5):
+  def __init__(self, binaryThreshold=0.5, minFeatureCount=1, maxFeaturesPerFamily=None, streamFeatures=True):
     """ Create a new mention finder to find a given list of mention types.
         entityTypes = list of mention types to find (e.g. group, outcome)
+        minFeatureCount, maxFeaturesPerFamily = thresholds used to select the
+          features used for training (see FeatureFilter)
+        streamFeatures = if True, pipe features to megam and parse its output
+          as it is written. if False, write feature and label files (for debugging)
     """
-    BaseTokenClassifier.__init__(self, 'megam')
+    BaseTokenClassifier.__init__(self, 'megam', 1, minFeatureCount, maxFeaturesPerFamily)
     self.binaryThreshold = binaryThreshold
+    self.streamFeatures = streamFeatures
+    self.labelings = {}
       
   def train(self, absList, modelFilename, entityTypes, tokenFilter=None):
     """ Train a mention finder model given a list of abstracts """
 
-    featureFilename = 'features.'+self.entityTypesString(entityTypes)+'.train.txt'
+    featureFilename = self.workFilename('features.'+self.entityTypesString(entityTypes)+'.train.txt')
             
-    self.writeFeatureFile(absList, featureFilename, entityTypes, True, tokenFilter)
+    self.selectFeatures(absList, modelFilename, tokenFilter)
+    if self.streamFeatures:
+      inputFilename = classifierpipe.stdinFilename
+    else:
+      self.writeFeatureFile(absList, featureFilename, entityTypes, True, tokenFilter)
+      inputFilename = featureFilename
 
     if len(entityTypes) > 1:
       cType = 'multiclass'
     else:
       cType = 'binary'
-    cmd = 'lib/megam/megam.opt -quiet  %s %s > %s' %(cType, featureFilename, modelFilename)
+    cmd = 'lib/megam/megam.opt -quiet  %s %s > %s' %(cType, inputFilename, modelFilename)
 #    cmd = 'bin/megam.opt -quiet -tune binary ' + featureFilename + ' > ' \
 #      + modelFilename
     print cmd  
-    os.system(cmd)    
+    if self.streamFeatures:
+      classifierpipe.run(cmd, lambda featureFile: self.writeFeatureStream(absList, featureFile, entityTypes,
+                                                                       True, tokenFilter))
+    else:
+      os.system(cmd)    
 
 
   def test(self, absList, modelFilename, labeledFilename, entityTypes, tokenFilter=None):
     """ Apply the mention finder to a given list of abstracts
         using the given model file.
     """  
-    featureFilename = 'features.'+self.entityTypesString(entityTypes)+'.test.txt'
+    featureFilename = self.workFilename('features.'+self.entityTypesString(entityTypes)+'.test.txt')
 
-    self.writeFeatureFile(absList, featureFilename, entityTypes, True, tokenFilter)
+    self.useSelectedFeatures(modelFilename)
     
     if len(entityTypes) > 1:
       cType = 'multiclass'
     else:
       cType = 'binary'
+    if self.streamFeatures:
+      cmd = 'lib/megam/megam.opt -quiet -predict %s %s %s' %(modelFilename, cType, classifierpipe.stdinFilename)
+      print cmd
+      (labels, status) = classifierpipe.run(cmd,
+                          lambda featureFile: self.writeFeatureStream(absList, featureFile, entityTypes,
+                                                                      True, tokenFilter),
+                          lambda lines: self.readLabelLines(lines, entityTypes))
+      self.labelings[labeledFilename] = labels
+      return
+    self.writeFeatureFile(absList, featureFilename, entityTypes, True, tokenFilter)
     cmd = 'lib/megam/megam.opt -quiet -predict %s %s %s > %s' %(modelFilename, cType, featureFilename, labeledFilename)
 #    cmd = 'bin/megam.opt -quiet -predict ' + modelFilename + ' binary ' \
 #       + featureFilename + ' > ' + labeledFilename 
@@ -63,8 +90,17 @@ class MegamTokenClassifier(BaseTokenClassifier):
     os.system(cmd)
           
   def readLabelFile(self, labelFilename, entityTypes):
-    """ read a mallet label file and return the list of labels """
-    labelLines = open(labelFilename, 'r').readlines()
+    """ return the labels read from the output of megam by the last call to
+        test() for a label file, or read them from a megam label file """
+    if labelFilename in self.labelings:
+      return self.labelings.pop(labelFilename)
+    labelFile = open(labelFilename, 'r')
+    labelList = self.readLabelLines(labelFile, entityTypes)
+    labelFile.close()
+    return labelList
+
+  def readLabelLines(self, labelLines, entityTypes):
+    """ parse the lines written by megam one at a time and return the list of labels """
     labelList = []
     
     if len(entityTypes) == 1:
@@ -101,6 +137,12 @@ class MegamTokenClassifier(BaseTokenClassifier):
   def writeFeatureFile(self, absList, filename, entityTypes, includeLabels, tokenFilter=None):
     """ write features for each token to a file that can be read by 
         the Mallet simple tagger """
+    featureFile = open(filename,'w')
+    self.writeFeatureStream(absList, featureFile, entityTypes, includeLabels, tokenFilter)
+    featureFile.close()
+
+  def writeFeatureStream(self, absList, featureFile, entityTypes, includeLabels, tokenFilter=None):
+    """ write features for each token to an open file or pipe in the format read by megam """
         
     labelConversionHash = {'other':'0'}
     i = 1
@@ -108,36 +150,24 @@ class MegamTokenClassifier(BaseTokenClassifier):
       labelConversionHash[eType] = str(i)
       i += 1
         
-    featureFile = open(filename,'w')
-    for abs in absList:
-      s = 0
-      for sentence in abs.sentences:
-        for token in sentence.tokens:
-          if tokenFilter == None or tokenFilter(token) == True: 
-            # write the label for the token
-            if includeLabels == True:
-              # see if the token has one of the labels the finder will look for
-              label='other'
-              for mType in entityTypes:
-                if token.hasAnnotation(mType):
-                  label = mType
-                  break
-              featureFile.write(labelConversionHash[label]+' ')
-            
-            # write features for the token
-            for featureSet in token.features.values():
-              for feature in featureSet:
-                try:
-                  featureFile.write(feature+' ')
-                except UnicodeEncodeError: 
-                  print 'UnicodeEncodeError:',
-                  print 'abs=',abs.id, 'sentence=', s, 'token=',token.index
-                  print 'feature=', feature
-                  featureFile.write(feature.encode('ascii', 'xmlcharrefreplace'))
-            featureFile.write('\n')
-#        featureFile.write('\n')
-        s += 1
-    featureFile.close()
+    for abs, s, sentence, matrix in self.featureMatrices(absList, tokenFilter):
+      for i in range(len(matrix)):
+        token = sentence.tokens[matrix.tokenIndices[i]]
+        # write the label for the token
+        if includeLabels == True:
+          # see if the token has one of the labels the finder will look for
+          label='other'
+          for mType in entityTypes:
+            if token.hasAnnotation(mType):
+              label = mType
+              break
+          featureFile.write(labelConversionHash[label]+' ')
+        
+        # write features for the token
+        ids = matrix.row(i)
+        if len(ids) > 0:
+          self.writeFeatures(featureFile, self.featureIndex.featureStrings(ids), abs, s, token)
+        featureFile.write('\n')
            
 
 
@@ -6,6 +6,10 @@ import sys
 import os.path
 import nltk
 import random
+import hashlib
+import featureengine
+import featureprofile
+import rundirectory
 
 from nltk.corpus import stopwords
 from basementionfinder import BaseMentionFinder
@@ -72,10 +76,22 @@ class MentionFinder(BaseMentionFinder):
 #  dependencyPaths = {}
   tokenFilter = None
   randomSeed = 42
+  memoizeFeatures = True  # reuse token features for context windows and dependencies
+  featureMemo = None      # (lexical, semantic) features of tokens in current sentence
+  featureStore = None     # FeatureStore shared with other finders (optional)
+  contextWindow = 4       # number of tokens on each side used for context features
+  featureEngine = None    # FeatureEngine used to compute features (None = compute them token by token)
+  featureProfile = None   # FeatureProfile recording the cost of each feature family (optional)
+  lexicalFamily = 'lexical'  # name of the feature family of a token's own lexical features
   
-  def __init__(self, entityTypes, tokenClassifier, labelFeatures=[], useReport=True, tokenFilter=None, randomSeed=42):
+  def __init__(self, entityTypes, tokenClassifier, labelFeatures=[], useReport=True, tokenFilter=None, randomSeed=42,
+               featureStore=None, useFeatureEngine=False):
     """ Create a new mention finder to find a given list of mention types.
         entityTypes = list of mention types to find (e.g. group, outcome)
+        featureStore = FeatureStore used to share token features with other
+                       finders that have the same feature configuration
+        useFeatureEngine = if True, compute features for whole sentences with
+                           numpy arrays (see featureengine)
     """
     BaseMentionFinder.__init__(self, entityTypes, tokenClassifier)
     self.useReport = useReport
@@ -86,6 +102,9 @@ class MentionFinder(BaseMentionFinder):
     self.labelSet = set(labelFeatures)
     self.tokenFilter = tokenFilter
     self.randomSeed = randomSeed
+    self.featureStore = featureStore
+    if useFeatureEngine:
+      self.featureEngine = featureengine.FeatureEngine(self)
     random.seed(self.randomSeed)    
 
   def train(self, absList, modelfilename):
@@ -99,7 +118,7 @@ class MentionFinder(BaseMentionFinder):
         """
     foldString = self.getFoldString(fold)
     
-    labeledFilename = 'tokens.%d.%s%s.txt' % (self.randomSeed, self.entityTypesString, foldString)    
+    labeledFilename = rundirectory.workFilename('tokens.%d.%s%s.txt' % (self.randomSeed, self.entityTypesString, foldString))
     self.tokenClassifier.test(absList, modelfilename, labeledFilename, self.entityTypes, self.tokenFilter)
     self.readLabelsAndAssign(absList, labeledFilename)
 
@@ -143,7 +162,7 @@ class MentionFinder(BaseMentionFinder):
         sharedErrors[i].append(0)
     
     
-    resultsOut = open(filename,'w')
+    resultsOut = open(rundirectory.workFilename(filename),'w')
     for abstract in absList:
       resultsOut.write('---%s---\n' % abstract.id)      
       for sentence in abstract.sentences:
@@ -586,35 +605,231 @@ class MentionFinder(BaseMentionFinder):
         
         mode = 'train', 'test', or 'crossval'
     """
+    profile = self.featureProfile or featureprofile.noProfile
+    if self.featureEngine != None:
+      self.computeEngineFeatures(absList, mode, lambda sentence: sentence.tokens)
+      profile.start('acronym')
+      for abs in absList:
+        for sentence in abs.sentences:
+          for token in sentence.tokens:          
+            token.features['acronym'] = self.acronymFeatures(token, abs)
+      profile.stop()
+      return
+      
     phraseList = []
     for abs in absList:
       registryWords = self.registryWordSets(abs)
+      configuration = self.featureConfiguration(mode, registryWords)
                                       
       for sentence in abs.sentences:
+        if self.useStoredFeatures(sentence, configuration, sentence.tokens, mode):
+          continue
+        self.startSentenceFeatures()
+        profile.start('sentence')
         sFeatures = self.sentenceFeatures(sentence)
+        profile.stop()
         parenDepth = 0
         for token in sentence.tokens:
           # compute features for this token
           token.features = {}
                       
           # compute features
-          token.features['lexical'] = self.tokenFeatures(token)
-          token.features['semantic'] = self.semanticFeatures(token, mode, \
-                                         wordSets=registryWords)
+          [lexical, semantic] = self.baseFeatures(token, mode, registryWords)
+          token.features['lexical'] = set(lexical)
+          token.features['semantic'] = set(semantic)
+          profile.start('syntactic')
           token.features['syntactic'] = self.syntacticContextFeatures(token, mode, \
                                             parenDepth, registryWords)
-          token.features['tContext'] = self.tokenContextFeatures(token, mode, 4,\
+          profile.stop()
+          profile.start('tContext')
+          token.features['tContext'] = self.tokenContextFeatures(token, mode, self.contextWindow,\
                                              registryWords)
+          profile.stop()
           token.features['sentence'] = sFeatures
           
           if token.text == '-LRB-':
             parenDepth = parenDepth + 1
           elif token.text == '-RRB-':
             parenDepth = parenDepth - 1
+        self.storeFeatures(sentence, configuration, sentence.tokens)
+      self.featureMemo = None
 
+      # acronym features depend on tokens in other sentences, so they are
+      # never stored
+      profile.start('acronym')
       for sentence in abs.sentences:
         for token in sentence.tokens:          
           token.features['acronym'] = self.acronymFeatures(token, abs)
+      profile.stop()
+    if self.featureStore != None:
+      self.featureStore.flush()
+
+  def computeEngineFeatures(self, absList, mode, rowTokens, patternFamily=None):
+    """ compute features with the feature engine for the tokens of each sentence
+        in a list of abstracts that are not in the feature store.
+        rowTokens(sentence) returns the list of tokens in a sentence that need features.
+        see FeatureEngine.computeFeatures for the other arguments. """
+    sentences = []
+    configurations = []
+    for abs in absList:
+      registryWords = self.registryWordSets(abs)
+      configuration = self.featureConfiguration(mode, registryWords)
+      for sentence in abs.sentences:
+        tokens = rowTokens(sentence)
+        if self.useStoredFeatures(sentence, configuration, tokens, mode):
+          continue
+        sentences.append((sentence, registryWords, tokens))
+        configurations.append(configuration)
+      
+    self.featureEngine.computeFeatures(sentences, mode, self.contextWindow, self.lexicalFamily, \
+                                       patternFamily, self.featureProfile)
+    for ((sentence, registryWords, tokens), configuration) in zip(sentences, configurations):
+      self.storeFeatures(sentence, configuration, tokens)
+    if self.featureStore != None:
+      self.featureStore.flush()
+
+  def featureConfiguration(self, mode, registryWords={}):
+    """ return a key describing everything other than the sentence itself
+        that the features computed by this finder for an abstract depend on.
+        registryWords = word sets from the abstract's trial registry entry """
+    wordSets = [(label, sorted(words)) for label, words in sorted(registryWords.items())]
+    return (self.__class__.__name__, mode, tuple(sorted(self.labelSet)), self.useReport,
+            self.contextWindow, hashlib.sha1(repr(wordSets)).hexdigest())
+
+  def useStoredFeatures(self, sentence, configuration, tokens, mode):
+    """ if the feature store has features for the given tokens of a sentence
+        that were computed with the same configuration, assign them to the
+        tokens and return True. otherwise return False.
+        features that depend on token labels are updated if the labels changed. """
+    if self.featureStore == None:
+      return False
+    updateLabels = lambda sentence, tokenFeatures, changed: \
+        self.updateLabelFeatures(sentence, mode, tokenFeatures, changed)
+    stored = self.featureStore.get(sentence, configuration, tokens, updateLabels)
+    if stored == None:
+      return False
+    for token, features in zip(tokens, stored):
+      token.features = dict(features)
+    return True
+
+  def storeFeatures(self, sentence, configuration, tokens):
+    """ save the features computed for the given tokens of a sentence in the
+        feature store """
+    if self.featureStore != None:
+      self.featureStore.put(sentence, configuration, tokens)
+
+  def labelDependentFeatures(self, token, mode):
+    """ return the semantic features of a token, without a prefix, that depend
+        on the labels assigned to tokens (see semanticFeatures) """
+    features = self.labelFeatures(token, mode)
+    if token.isNumber() == False and token.hasLabel('primary_outcome'):
+      features.add('primary_outcome')
+    return features
+
+  def updateLabelFeatures(self, sentence, mode, tokenFeatures, changed):
+    """ return a copy of the stored features of the tokens in a sentence in
+        which the features that depend on token labels are recomputed.
+        tokenFeatures = dict mapping token index -> feature dictionary
+        changed = indices of the tokens whose labels changed
+        
+        label features are part of the semantic features of a token and are
+        copied to the tContext and syntactic features of the tokens around it
+        and the tokens it is linked to in the dependency parse. only these
+        families are updated, and only for tokens that can see a changed token.
+        the other feature sets are shared with tokenFeatures.
+    """
+    window = self.contextWindow
+    nTokens = len(sentence)
+    changed = set(changed)
+    affected = set([])
+    for i in tokenFeatures:
+      token = sentence[i]
+      if changed.intersection(range(max(0, i-window), min(nTokens, i+window+1))) \
+         or changed.intersection([dep.index for dep in token.dependents]) \
+         or changed.intersection([gov.index for gov in token.governors if gov.isRoot() == False]):
+        affected.add(i)
+    
+    names = set(['label_' + label for label in self.labelSet] + ['primary_outcome'])
+    labelFeatures = {}
+    def prefixedLabelFeatures(index, prefix):
+      if index not in labelFeatures:
+        labelFeatures[index] = self.labelDependentFeatures(sentence[index], mode)
+      return set([prefix + f for f in labelFeatures[index]])
+        
+    updated = dict(tokenFeatures)
+    for i in affected:
+      token = sentence[i]
+      features = dict(tokenFeatures[i])
+      if 'semantic' in features:
+        features['semantic'] = features['semantic'].difference(names)
+        features['semantic'].update(prefixedLabelFeatures(i, ''))
+      if 'tContext' in features:
+        context = features['tContext'].copy()
+        for j in range(max(0, i-window), min(nTokens, i+window+1)):
+          if j != i:
+            prefix = 'tcontext_'+str(j-i)+'_'
+            context.difference_update([prefix + f for f in names])
+            context.update(prefixedLabelFeatures(j, prefix))
+        features['tContext'] = context
+      if 'syntactic' in features:
+        syntactic = features['syntactic'].difference(['dep_' + f for f in names])
+        syntactic.difference_update(['gov_' + f for f in names])
+        if token.isNumber() == False:
+          for dep in token.dependents:
+            syntactic.update(prefixedLabelFeatures(dep.index, 'dep_'))
+        for gov in token.governors:
+          if gov.isRoot() == False:
+            syntactic.update(prefixedLabelFeatures(gov.index, 'gov_'))
+        features['syntactic'] = syntactic
+      updated[i] = features
+    return updated
+
+  def startSentenceFeatures(self):
+    """ start computing features for a new sentence.
+        the memo of token features from the previous sentence is discarded.
+    """
+    if self.memoizeFeatures:
+      self.featureMemo = {}
+    else:
+      self.featureMemo = None
+
+  def baseFeatures(self, token, mode, wordSets={}):
+    """ return [lexical, semantic] features of a token without a prefix.
+        
+        while a sentence is being processed the features of each token
+        are computed once and reused for the context window and dependency
+        features of its neighbors. the returned sets should not be modified.
+    """
+    if self.featureMemo == None:
+      return self.computeBaseFeatures(token, mode, wordSets)
+    
+    key = (id(token), mode, id(wordSets))
+    features = self.featureMemo.get(key)
+    if features == None:
+      features = self.computeBaseFeatures(token, mode, wordSets)
+      self.featureMemo[key] = features
+    return features
+
+  def computeBaseFeatures(self, token, mode, wordSets={}):
+    """ compute and return [lexical, semantic] features of a token without a prefix """
+    profile = self.featureProfile
+    if profile == None:
+      return [self.tokenFeatures(token), \
+              self.semanticFeatures(token, mode, wordSets=wordSets)]
+    profile.start(self.lexicalFamily)
+    lexical = self.tokenFeatures(token)
+    profile.stop()
+    profile.start('semantic')
+    semantic = self.semanticFeatures(token, mode, wordSets=wordSets)
+    profile.stop()
+    return [lexical, semantic]
+    
+  def prefixedFeatures(self, token, mode, prefix, wordSets={}):
+    """ return the lexical and semantic features of a token with a given prefix """
+    [lexical, semantic] = self.baseFeatures(token, mode, wordSets)
+    features = set([prefix + f for f in lexical])
+    features.update([prefix + f for f in semantic])
+    return features
                   
   def acronymFeatures(self, token, abstract):
     """ if this token is an acronym, return features based on its expansion """
@@ -804,7 +1019,7 @@ class MentionFinder(BaseMentionFinder):
  
   def closestVerb(self, token):
     """ return closest ancestor verb in phrase structure parse tree """
-    verbNode = token.parseTreeNode.closestParentVerbNode()
+    verbNode = token.sentence.getSyntax().closestVerbNode(token.index)
     if verbNode == None:
       return None
     else:
@@ -824,16 +1039,14 @@ class MentionFinder(BaseMentionFinder):
         depToken = token.sentence[dep.index]
         prefix = 'dep_'
         features.add(prefix + 'type_'+dep.type)
-        features = features.union(self.tokenFeatures(depToken, prefix))
-        features = features.union(self.semanticFeatures(depToken, mode, prefix, wordSets))
+        features.update(self.prefixedFeatures(depToken, mode, prefix, wordSets))
       
     for gov in token.governors:
       if gov.isRoot() == False:
         govToken = token.sentence[gov.index]
         prefix = 'gov_'
         features.add(prefix+'type_'+gov.type)
-        features = features.union(self.tokenFeatures(govToken, prefix))
-        features = features.union(self.semanticFeatures(govToken, mode, prefix, wordSets))
+        features.update(self.prefixedFeatures(govToken, mode, prefix, wordSets))
 
     verbToken = self.closestVerb(token)
     if verbToken != None:
@@ -850,8 +1063,7 @@ class MentionFinder(BaseMentionFinder):
         continue
       prefix = 'tcontext_'+str(i-token.index)+'_'
       cToken = token.sentence[i]
-      features = features.union(self.tokenFeatures(cToken, prefix))
-      features = features.union(self.semanticFeatures(cToken, mode, prefix, wordSets))
+      features.update(self.prefixedFeatures(cToken, mode, prefix, wordSets))
       
     return features
    
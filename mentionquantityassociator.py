@@ -10,10 +10,13 @@
 import os
 import operator
 import baseassociator
+import classifierpipe
+import rundirectory
 
 
 class MentionQuantityAssociator(baseassociator.BaseMentionQuantityAssociator):
     """ train/test system that associates mentions with quantities in a sentence """
+    streamFeatures = True   # if False, write feature and result files for megam (for debugging)
 
     def __init__(self, mentionType, quantityType, useLabels=True):
         """ create a new mention-quantity associator given a specific mention type
@@ -23,13 +26,20 @@ class MentionQuantityAssociator(baseassociator.BaseMentionQuantityAssociator):
 
     def train(self, absList, modelFilename):
         """ Train a mention-quantity associator model given a list of abstracts """
-        trainFilename = 'features.'+self.mentionType+'-'+self.quantityType+'.train.txt'
-
-        self.writeFeatureFile(absList, trainFilename, forTraining=True)
-        cmd = 'lib/megam/megam.opt -quiet -tune binary ' + trainFilename + ' > ' \
-              + modelFilename
-        print cmd
-        os.system(cmd)
+        trainFilename = rundirectory.workFilename('features.'+self.mentionType+'-'+self.quantityType+'.train.txt')
+
+        if self.streamFeatures:
+            cmd = 'lib/megam/megam.opt -quiet -tune binary ' + classifierpipe.stdinFilename + ' > ' \
+                  + modelFilename
+            print cmd
+            featureVectors = self.getFeatureVectors(absList, forTraining=True)
+            classifierpipe.run(cmd, lambda out: self.writeFeatureVectors(featureVectors, out))
+        else:
+            self.writeFeatureFile(absList, trainFilename, forTraining=True)
+            cmd = 'lib/megam/megam.opt -quiet -tune binary ' + trainFilename + ' > ' \
+                  + modelFilename
+            print cmd
+            os.system(cmd)
 
     def test(self, absList, modelFilename, fold=None):
         """ Apply the mention-quantity associator to a given list of abstracts
@@ -40,24 +50,29 @@ class MentionQuantityAssociator(baseassociator.BaseMentionQuantityAssociator):
         else:
             foldString = ''
 
-        testFilename = 'features.%s-%s%s.test.txt'%(self.mentionType, self.quantityType, foldString)
-        resultFilename = '%s-%s%s.results.txt'%(self.mentionType, self.quantityType, foldString)
-
-        self.writeFeatureFile(absList, testFilename, forTraining=False)
-        cmd = 'lib/megam/megam.opt -quiet -predict ' + modelFilename + ' binary ' \
-              + testFilename + ' > ' + resultFilename
-        print cmd
-        os.system(cmd)
+        testFilename = rundirectory.workFilename('features.%s-%s%s.test.txt'%(self.mentionType, self.quantityType,
+                                                                              foldString))
+        resultFilename = rundirectory.workFilename('%s-%s%s.results.txt'%(self.mentionType, self.quantityType,
+                                                                          foldString))
 
-        # get probabilites from result file
-        resultLines = open(resultFilename, 'r').readlines()
         featureVectors = self.getFeatureVectors(absList, forTraining=False)
-        i = 0    # current feature vector
-        for line in resultLines:
-            parsedLine = line.strip().split()
-            prob = float(parsedLine[-1])
-            featureVectors[i].prob = prob
-            i = i + 1
+        if self.streamFeatures:
+            cmd = 'lib/megam/megam.opt -quiet -predict ' + modelFilename + ' binary ' \
+                  + classifierpipe.stdinFilename
+            print cmd
+            classifierpipe.run(cmd, lambda out: self.writeFeatureVectors(featureVectors, out),
+                               lambda lines: self.readResults(lines, featureVectors))
+        else:
+            self.writeFeatureFile(absList, testFilename, forTraining=False)
+            cmd = 'lib/megam/megam.opt -quiet -predict ' + modelFilename + ' binary ' \
+                  + testFilename + ' > ' + resultFilename
+            print cmd
+            os.system(cmd)
+
+            # get probabilites from result file
+            resultFile = open(resultFilename, 'r')
+            self.readResults(resultFile, featureVectors)
+            resultFile.close()
         # chose the most likely association for each value
         for abstract in absList:
             for s in abstract.sentences:
@@ -84,11 +99,26 @@ class MentionQuantityAssociator(baseassociator.BaseMentionQuantityAssociator):
                     list.append(fv)
         return list
 
+    def readResults(self, resultLines, featureVectors):
+        """ assign the probabilities in lines of megam output to a list of
+            feature vectors, reading the lines one at a time """
+        i = 0    # current feature vector
+        for line in resultLines:
+            parsedLine = line.strip().split()
+            prob = float(parsedLine[-1])
+            featureVectors[i].prob = prob
+            i = i + 1
+
+    def writeFeatureVectors(self, featureVectors, out):
+        """ write a list of feature vectors to an open file or pipe in the format read by megam """
+        for fv in featureVectors:
+            fv.writeToMegamFile(out)
+
     def writeFeatureFile(self, absList, featureFilename, forTraining):
         """ write features to a file that can be read by megam  """
         featureVectors = self.getFeatureVectors(absList, forTraining)
         out = open(featureFilename, 'w')
-        debugout = open('debug.'+featureFilename, 'w')
+        debugout = open(os.path.join(os.path.dirname(featureFilename), 'debug.'+os.path.basename(featureFilename)), 'w')
 
         for fv in featureVectors:
             fv.writeToMegamFile(out)
@@ -1,6 +1,7 @@
 import sys
 import os.path
 import nltk
+import featureprofile
 from nltk.corpus import stopwords
 from finder import EntityStats
 from mentionfinder import MentionFinder
@@ -13,12 +14,17 @@ class NumberFinder(MentionFinder):
   """ Used for training/testing a classifier to find mentions 
       in a list of abstracts.
       """  
-  def __init__(self, entityTypes, tokenClassifier, labelFeatures=[], useReport=True):
+  contextWindow = 3
+  lexicalFamily = 'token'
+  
+  def __init__(self, entityTypes, tokenClassifier, labelFeatures=[], useReport=True, featureStore=None,
+               useFeatureEngine=False):
     """ Create a new mention finder to find a given list of mention types.
         entityTypes = list of mention types to find (e.g. group, outcome)
     """
     MentionFinder.__init__(self, entityTypes, tokenClassifier, labelFeatures, useReport, \
-                           tokenFilter=self.isImportantNumber)
+                           tokenFilter=self.isImportantNumber, featureStore=featureStore, \
+                           useFeatureEngine=useFeatureEngine)
     self.finderType = 'number'
        
 #  def readLabelsAndAssign(self, absList, labeledFilename):
@@ -89,11 +95,25 @@ class NumberFinder(MentionFinder):
     """ compute features for each token in each abstract in a given
         list of abstracts.
     """
+    profile = self.featureProfile or featureprofile.noProfile
+    if self.featureEngine != None:
+      self.computeEngineFeatures(absList, mode, \
+          lambda sentence: [token for token in sentence if self.isImportantNumber(token)], \
+          patternFamily='pattern')
+      return
+      
     for abstract in absList:
       registryWords = self.registryWordSets(abstract)
+      configuration = self.featureConfiguration(mode, registryWords)
 
       for sentence in abstract.sentences:
+        numbers = [token for token in sentence if self.isImportantNumber(token)]
+        if self.useStoredFeatures(sentence, configuration, numbers, mode):
+          continue
+        self.startSentenceFeatures()
+        profile.start('sentence')
         sFeatures = self.sentenceFeatures(sentence)
+        profile.stop()
           
         # build list of numbers that should be classified 
         parenDepth = 0
@@ -104,20 +124,34 @@ class NumberFinder(MentionFinder):
   
             # compute features
             token.features['sentence'] = sFeatures
+            profile.start('token')
             token.features['token'] = self.tokenFeatures(token)
+            profile.stop()
+            profile.start('syntactic')
             token.features['syntactic'] = self.syntacticContextFeatures(token, mode, \
                                                     parenDepth, registryWords)
-            token.features['tContext'] = self.tokenContextFeatures(token, mode, 3, \
+            profile.stop()
+            profile.start('tContext')
+            token.features['tContext'] = self.tokenContextFeatures(token, mode, self.contextWindow, \
                                                     registryWords)
+            profile.stop()
+            profile.start('semantic')
             token.features['semantic'] = self.semanticFeatures(token, mode)
+            profile.stop()
+            profile.start('pattern')
 
             token.features['pattern'] = self.numberPatternFeatures(token) # redundant, handled by semantic
+            profile.stop()
           else:
             # not a number, check if we are entering or leaving a parenthetical
             if token.text == '-LRB-':
               parenDepth += 1
             elif token.text == '-RRB-':
               parenDepth -= 1
+        self.storeFeatures(sentence, configuration, numbers)
+    self.featureMemo = None
+    if self.featureStore != None:
+      self.featureStore.flush()
 
                   
 
@@ -8,6 +8,11 @@ import sys
 import re
 import xmlutil
 
+# start of a phrase in a treebank string: whitespace and left parens followed
+# by the phrase type, which ends at the next space. For a token node the type
+# is followed by the token text and a right paren.
+phraseStartPattern = re.compile('\s*\(*([^ ]*)( ?)(?:(?=[^(])([^)]*)\)?)?')
+
 ##############################################################
 # node in a parse tree for a sentence
 ##############################################################
@@ -18,6 +23,9 @@ class ParseTreeNode:
   type = ''               # POS label/phrase label for node
   parent = None          # reference to parent node in parse tree
   childNodes = []        # list of children for current phrase
+  treeTokenNodes = None  # token nodes of the whole tree, in order (set by buildParseTree)
+  spanStart = 0          # this phrase covers treeTokenNodes[spanStart:spanEnd]
+  spanEnd = 0
   
   def __init__(self, parent=None):
     self.token = None
@@ -49,7 +57,7 @@ class ParseTreeNode:
     # normalize the whitespace (e.g. replace '\n' with ' ')
     parseString = re.sub('\s+', ' ', parseString)
 
-    [treeTokenNodes, s] = self.parse(parseString)
+    treeTokenNodes = self.parseTreebankString(parseString)
 
     i = 0
     # associate token objects with their node in the parse tree
@@ -95,6 +103,56 @@ class ParseTreeNode:
           
     return [tokenNodeList, parseString]
     
+  def parseTreebankString(self, parseString):
+    """ build the same tree as parse() does for a whole parse tree string,
+        in a single pass over the string. The position in the string is kept
+        as an index, so no copies of the rest of the string are made.
+        Also record the span of token nodes covered by each phrase.
+        returns the list of token nodes in the tree from left to right.
+    """
+    tokenNodes = []
+    openNodes = []       # phrases whose children are still being read
+    matchPhraseStart = phraseStartPattern.match
+    normalizeText = xmlutil.normalizeText
+    n = len(parseString)
+    i = 0
+    node = self
+    while node is not None:
+      # read the start of the phrase for the current node
+      if i < n:
+        match = matchPhraseStart(parseString, i)
+        (node.type, space, text) = match.groups()
+        i = match.end()
+        if not space or (text is None and i == n):
+          # the string ended before the contents of the phrase
+          raise IndexError('incomplete parse tree string')
+        
+        if text is not None:
+          # current node is a token node
+          node.text = normalizeText(text)
+          tokenNodes.append(node)
+        else:
+          # current node is an internal node with children
+          node.treeTokenNodes = tokenNodes
+          node.spanStart = len(tokenNodes)
+          openNodes.append(node)
+
+      # the next node is the next child of the innermost open phrase.
+      # close phrases until one has another child.
+      node = None
+      while openNodes:
+        parent = openNodes[-1]
+        if i < n and parseString[i] != ')':
+          node = ParseTreeNode(parent)
+          parent.childNodes.append(node)
+          break
+        # skip right paren that marks end of phrase
+        i += 1
+        parent.spanEnd = len(tokenNodes)
+        openNodes.pop()
+      
+    return tokenNodes
+    
   def isTokenNode(self):
     """ return true if the node only contains a token (i.e. it is a leaf) """
     if len(self.childNodes) == 0:
@@ -176,6 +234,8 @@ class ParseTreeNode:
     """ return list of leaf nodes (token nodes) from left to right in tree """  
     if self.isTokenNode():
       return [self]
+    if self.treeTokenNodes != None:
+      return self.treeTokenNodes[self.spanStart:self.spanEnd]
     
     list = []
     # otherwise, node must have at least one child
@@ -186,16 +246,14 @@ class ParseTreeNode:
     
   def tokenString(self):
     """ return string containing text from token nodes from left to right in tree """
-    tNodeList = self.tokenNodes()
-    textList = []
-    for tNode in tNodeList:
-      textList.append(tNode.text)
-    return ' '.join(textList)
+    return ' '.join([tNode.text for tNode in self.tokenNodes()])
     
   def firstToken(self):
     """ return the first token in the phrase """
     if self.isTokenNode():
       return self.token
+    elif self.treeTokenNodes != None and self.spanEnd > self.spanStart:
+      return self.treeTokenNodes[self.spanStart].token
     else:
       return self.childNodes[0].firstToken()
        
@@ -203,6 +261,8 @@ class ParseTreeNode:
     """ return the last token in the phrase """
     if self.isTokenNode():
       return self.token
+    elif self.treeTokenNodes != None and self.spanEnd > self.spanStart:
+      return self.treeTokenNodes[self.spanEnd - 1].token
     else:
       return self.childNodes[-1].lastToken()
        
@@ -377,18 +437,28 @@ class SimplifiedTreeNode(ParseTreeNode):
 ##############################################################
 # store a dependency relationship for a token  
 ##############################################################
-class Dependency:
+class Dependency(object):
   """ Store a dependency/governor relationship for a token """
-  index = -1  # index of the dependent or governor token 
-  type = ''   # type of dependency relationship
-  specific = None  # specific type of dependency
-  token = None  # the dependent or governor token
+  __slots__ = ('index',     # index of the dependent or governor token
+               'type',      # type of dependency relationship
+               'specific',  # specific type of dependency
+               'token')     # the dependent or governor token
   
-  def __init__(self, node):
-    self.index = int(node.getAttribute('idx'))
-    self.type = node.getAttribute('type')
+  def __init__(self, node=None):
+    self.index = -1
+    self.type = ''
     self.token = None
-    self.specific = node.getAttribute('specific')
+    self.specific = None
+    if node != None:
+      self.index = int(node.getAttribute('idx'))
+      self.type = node.getAttribute('type')
+      self.specific = node.getAttribute('specific')
+
+  def parseElement(self, element):
+    """ read dependency information from an ElementTree "dep" or "gov" element """
+    self.index = int(element.get('idx', ''))
+    self.type = element.get('type', '')
+    self.specific = element.get('specific', '')
       
   def isRoot(self):
     """ return True if this is a dependency from the ROOT """
@@ -410,17 +480,32 @@ class Dependency:
     node.setAttribute('idx', str(self.index))
     return node
 
+  def writeElement(self, writer, name):
+    """ write the same element as getXML() to an xmlutil.XMLWriter """
+    attributes = {'type':self.type, 'idx':str(self.index)}
+    if self.specific != None and len(self.specific) > 0:
+      attributes['specific'] = self.specific
+    writer.textElement(name, attributes)
+
 ##############################################################
 # manage a list of dependency relationships for a token  
 ##############################################################
 class DependencyList(list):
   """ A list of dependency relationships for a token """
+  __slots__ = ()
 
-  def __init__(self, nodeList):
+  def __init__(self, nodeList=[]):
     
     # parse xml node if given one
     for depNode in nodeList:
       self.append(Dependency(depNode))
+
+  def parseElements(self, elementList):
+    """ add a dependency for each ElementTree element in a given list """
+    for element in elementList:
+      dependency = Dependency()
+      dependency.parseElement(element)
+      self.append(dependency)
         
 
 
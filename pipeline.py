@@ -23,6 +23,31 @@ useReports = False     # do not use any information from trial reports
 boostResults = False     
 boostResults = True    # use alternate labels for ensemble to boost mention finding
 
+tokenClassifierType = 'mallet'  # Mallet CRF run in java
+#tokenClassifierType = 'crf'    # CRF trained and applied in process
+
+useTagServer = False   # start the Mallet simple tagger for each finder
+#useTagServer = True    # keep the Mallet models loaded in one java process
+
+malletThreads = 1      # threads used by each Mallet training process
+
+streamFeatures = True  # pipe features to Mallet
+#streamFeatures = False # write feature and label files (for debugging)
+
+featurePath = None     # only share token features between the finders of a run
+#featurePath = 'output/features'  # keep token features between runs
+
+useFeatureEngine = False  # compute finder features one token at a time
+#useFeatureEngine = True   # compute finder features with numpy arrays
+
+featureProfilePath = None  # do not record the time and size of each feature family
+#featureProfilePath = 'output/profiles'
+
+minFeatureCount = 1         # train on every feature
+#minFeatureCount = 3         # only train on features seen at least 3 times
+maxFeaturesPerFamily = None
+#maxFeaturesPerFamily = 5000 # only train on the most frequent features of each family
+
 randomSeed = None
 randomSeed = 42
 #randomSeed = 17
@@ -167,7 +192,16 @@ config = systemconfig.RunConfiguration(name, numberFinderType=nFinderType, \
                        randomSeed=randomSeed,\
                        desiredRecall=recall,\
                        boostResults=boostResults,\
-                       useTrialReports=useReports)
+                       useTrialReports=useReports,\
+                       featurePath=featurePath,\
+                       useFeatureEngine=useFeatureEngine,\
+                       featureProfilePath=featureProfilePath,\
+                       minFeatureCount=minFeatureCount,\
+                       maxFeaturesPerFamily=maxFeaturesPerFamily,\
+                       useTagServer=useTagServer,\
+                       tokenClassifierType=tokenClassifierType,\
+                       malletThreads=malletThreads,\
+                       streamFeatures=streamFeatures)
 
 
 abstractPath = 'corpora/ischemia/03-02-12/'
@@ -182,7 +216,7 @@ if crossvalidate == True:
   print '%d-fold cross-validation'%nFolds
   config.crossvalidate(path[test], nFolds, statList)
   statFilename = 'stats.crossval.%s.%d.r%d.txt'%(config.name, nFolds, randomSeed)  
-  statList.write(statFilename, separator=',', computeTotal=True)
+  statList.write(config.outputFilename(statFilename), separator=',', computeTotal=True)
 
 elif learningCurve:
   path = 'corpora/bmjcardio/'
@@ -215,7 +249,7 @@ elif learningCurve:
   config.test(testPath, statList)
 #  config.test(testPath, statList, abstractPath, useTrialReports=False)
 #  statList.write('stats.bmj.'+config.name+'.txt', separator=',')
-  statList.write('stats.bmj.'+config.name+'.txt', separator=',')
+  statList.write(config.outputFilename('stats.bmj.'+config.name+'.txt'), separator=',')
 
 
   if len(sys.argv) > 2:
@@ -226,49 +260,49 @@ elif learningCurve:
       for tPath in bmjTrain:
         config.train(path+tPath)
         config.test(bmjTest, statList)
-      statList.write('stats.bmj.'+config.name+'.txt')
+      statList.write(config.outputFilename('stats.bmj.'+config.name+'.txt'))
     elif run == 1:
       statList.clear()
       for tPath in bmjTrain:
         config.train(path+tPath)
         config.test(cardioTest, statList)
-      statList.write('stats.bmj-cardio.'+config.name+'.txt')
+      statList.write(config.outputFilename('stats.bmj-cardio.'+config.name+'.txt'))
     elif run == 2:  
       statList.clear()
       for tPath in cardioTrain:
         config.train(path+tPath)
         config.test(bmjTest, statList)
-      statList.write('stats.cardio-bmj.'+config.name+'.txt')
+      statList.write(config.outputFilename('stats.cardio-bmj.'+config.name+'.txt'))
     elif run == 3:
       statList.clear()
       for tPath in cardioTrain:
         config.train(path+tPath)
         config.test(cardioTest, statList)
-      statList.write('stats.cardio.'+config.name+'.txt')
+      statList.write(config.outputFilename('stats.cardio.'+config.name+'.txt'))
     elif run == 4:
       statList.clear()
       for tPath in setATrain:
         config.train(path+tPath)
         config.test(cardioTest, statList)
-      statList.write('stats.ischemia-a-cardio.'+config.name+'.txt')
+      statList.write(config.outputFilename('stats.ischemia-a-cardio.'+config.name+'.txt'))
     elif run == 5:
       statList.clear()
       for tPath in setATrain:
         config.train(path+tPath)
         config.test(bmjTest, statList)
-      statList.write('stats.ischemia-a-bmj.'+config.name+'.txt')
+      statList.write(config.outputFilename('stats.ischemia-a-bmj.'+config.name+'.txt'))
     elif run == 6:
       statList.clear()
       for tPath in cardioTrain:
         config.train(path+tPath)
         config.test(ischemiaTest, statList)
-      statList.write('stats.cardio-ischemia-a.'+config.name+'.txt')
+      statList.write(config.outputFilename('stats.cardio-ischemia-a.'+config.name+'.txt'))
     elif run == 7:
       statList.clear()
       for tPath in bmjTrain:
         config.train(path+tPath)
         config.test(ischemiaTest, statList)
-      statList.write('stats.bmj-ischemia-a.'+config.name+'.txt')
+      statList.write(config.outputFilename('stats.bmj-ischemia-a.'+config.name+'.txt'))
     elif run == 8:
       statList.clear()
 #      for tPath in ischemiaTrain:
@@ -280,25 +314,25 @@ elif learningCurve:
       for tPath in bmjATrain:
         config.train(path+tPath)
         config.test(ischemiaTest, statList)
-      statList.write('stats.bmj-a-ischemia-a.'+config.name+'.txt')
+      statList.write(config.outputFilename('stats.bmj-a-ischemia-a.'+config.name+'.txt'))
     elif run == 10:
       statList.clear()
       for tPath in bmjATrain:
         config.train(path+tPath)
         config.test(cardioTest, statList)
-      statList.write('stats.bmj-a-cardio.'+config.name+'.txt')
+      statList.write(config.outputFilename('stats.bmj-a-cardio.'+config.name+'.txt'))
     elif run == 11:
       statList.clear()
       for tPath in bmjBTrain:
         config.train(path+tPath)
         config.test(ischemiaTest, statList)
-      statList.write('stats.bmj-b-ischemia-a.'+config.nme+'.txt')
+      statList.write(config.outputFilename('stats.bmj-b-ischemia-a.'+config.nme+'.txt'))
     elif run == 12:
       statList.clear()
       for tPath in bmjBTrain:
         config.train(path+tPath)
         config.test(cardioTest, statList)
-      statList.write('stats.bmj-b-cardio.'+config.name+'.txt')
+      statList.write(config.outputFilename('stats.bmj-b-cardio.'+config.name+'.txt'))
 
 else:
   # test and train on separate data  
@@ -312,7 +346,7 @@ else:
 
   statFilename = 'stats.'+train+'.'+test+label+'.txt'  
   statFilename = 'stats.'+train+'.'+test+label+randomSeedLabel+'.txt'
-  statList.write(statFilename, separator=' & ')
+  statList.write(config.outputFilename(statFilename), separator=' & ')
 
 #  config.test(testPath, statList, abstractPath, useTrialReports=False)
 #  statList.write('stats.'+train+'.'+test+'.txt', separator=',')
@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+
+"""
+ Scratch directory for the intermediate files and outputs of a run.
+
+ Classifiers, finders and the run configuration used to write files with
+ fixed names (features.<types>.train.txt, tokens.<seed>.<types>.txt,
+ <types>.errors.txt, ...) to the current directory, so two runs started in the
+ same directory overwrote each other's files. Each RunConfiguration now owns a
+ RunDirectory with a unique name:
+
+   <root>/<run name>.<start time>.<pid>.<n>/          outputs (errors, stats, summaries)
+   <root>/<run name>.<start time>.<pid>.<n>/work/     intermediate files (feature,
+                                                      label and result files)
+   <root>/<run name>.<start time>.<pid>.<n>/models/   models trained by the run and
+                                                      the features selected for them
+
+ The name is chosen when the RunDirectory is made, but the directory is only
+ created when the run is activated (when it first trains, tests or
+ cross-validates), so configurations that are never run leave nothing on disk.
+ Code that writes such files asks for workFilename(name) or
+ outputFilename(name). These use the run directory that was activated last,
+ or the current directory if no run directory is active.
+
+ The cleanup policy says what is deleted:
+
+   'keep'           nothing
+   'intermediates'  the work directory, each time a run finishes
+   'all'            the work directory each time a run finishes and the whole
+                    run directory when the program exits
+
+ With 'keep' and 'intermediates' the run directories (and the work directory
+ of a run that was killed) stay in the root until they are deleted by hand.
+ The start time in their names sorts them by age, e.g. to delete the runs
+ of a configuration started before 2026:
+
+   rm -rf output/runs/<run name>.2025*
+"""
+
+__author__ = 'Rodney L. Summerscales'
+
+import os
+import time
+import atexit
+import shutil
+import itertools
+
+cleanupPolicies = ['keep', 'intermediates', 'all']
+
+runCounter = itertools.count()   # number of the next run directory of this process
+
+
+class RunDirectory:
+    """ Unique directory for the intermediate files and outputs of a run """
+    path = None                # directory for outputs
+    workPath = None            # directory for intermediate files
+    cleanup = 'intermediates'  # cleanup policy (see cleanupPolicies)
+
+    def __init__(self, root, name, cleanup='intermediates'):
+        """ choose a new directory for a run (it is created by create()).
+            root = directory the run directory is created in
+            name = name of the run (the start of the directory name)
+            cleanup = 'keep', 'intermediates' or 'all' """
+        if cleanup not in cleanupPolicies:
+            raise ValueError('Unknown cleanup policy: %s' % cleanup)
+        self.path = os.path.join(root, '%s.%s.%d.%d' % (name.replace(os.sep, '_'),
+                                                        time.strftime('%Y%m%d-%H%M%S'),
+                                                        os.getpid(), runCounter.next()))
+        self.workPath = os.path.join(self.path, 'work')
+        self.cleanup = cleanup
+        if cleanup == 'all':
+            atexit.register(self.remove)
+
+    def create(self):
+        """ create the run directory if it does not exist yet """
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+
+    def outputFilename(self, filename):
+        """ return the path of an output file in the run directory """
+        return os.path.join(self.path, filename)
+
+    def workFilename(self, filename):
+        """ return the path of an intermediate file in the work directory """
+        if not os.path.isdir(self.workPath):
+            os.makedirs(self.workPath)
+        return os.path.join(self.workPath, filename)
+
+    def finish(self):
+        """ delete the intermediate files unless the cleanup policy is 'keep' """
+        if self.cleanup != 'keep' and os.path.isdir(self.workPath):
+            shutil.rmtree(self.workPath, True)
+
+    def remove(self):
+        """ delete the run directory """
+        if os.path.isdir(self.path):
+            shutil.rmtree(self.path, True)
+
+
+active = None    # RunDirectory of the run in progress (None = use the current directory)
+
+
+def activate(runDirectory):
+    """ write intermediate files and outputs to a given RunDirectory
+        (None = the current directory), creating it if needed """
+    global active
+    if runDirectory != None:
+        runDirectory.create()
+    active = runDirectory
+
+
+def workFilename(filename):
+    """ return the path of an intermediate file of the active run """
+    if active == None:
+        return filename
+    return active.workFilename(filename)
+
+
+def outputFilename(filename):
+    """ return the path of an output file of the active run """
+    if active == None:
+        return filename
+    return active.outputFilename(filename)
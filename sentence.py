@@ -5,18 +5,19 @@
  define classes for a sentence in an abstract
 """
 
-import Queue
 import xmlutil
 import simplifiedsentence
 import umlschunk
 import sentencetoken
+import sentencecolumns
+import sentencesyntax
 import tokenlist
 
 import mention
 import parsetree
 
 
-class Sentence:
+class Sentence(object):
     index = 0  # index of sentence within the abstract
     abstract = None
     tokens = []  # tokens in the sentence
@@ -27,12 +28,17 @@ class Sentence:
     section = ''  # section label from abstract
     nlmCategory = ''  # label assigned to section from pubmed
     parseString = ''  # penn treebank style parse tree for sentence
-    parseTree = None  # root of parse tree
+    # parseTree = root of parse tree
+    # dependencyGraphRoot = root tokens of dependency graph for sentence
+    # (for sentences read from xml both are built when they are first used,
+    #  see __getattr__)
     simpleTree = None  # root of simplified parse tree
-    dependencyGraphRoot = None  # root token of dependency graph for sentence
     umlsChunks = []  # list of umls terms found by metemap
     annotatedMentions = None
     detectedMentions = None
+    columns = None  # cached columnar form of the tokens (see getColumns)
+    syntax = None  # cached dependency paths and closest verbs of the tokens (see getSyntax)
+    storedFeatures = None  # token features kept by a FeatureStore (see featurestore.py)
     reductionLemmas = {'less', 'reduction', 'decrease'}
     increaseLemmas = {'increase', 'more'}
     singularTimeWords = {'day', 'week', 'month', 'year'}
@@ -57,6 +63,9 @@ class Sentence:
         self.umlsChunks = []
         self.annotatedMentions = {}
         self.detectedMentions = {}
+        self.columns = None
+        self.syntax = None
+        self.storedFeatures = None
 
     def createFromTokenList(self, tokenList):
         """ create a sentence TokenList object """
@@ -84,43 +93,108 @@ class Sentence:
             t.parseXML(node, i, self)
             self.tokens.append(t)
             i = i + 1
-        if self.tokens[-1].text == '.':
-            self.tokens[-1].text = '-EOS-'
-            self.tokens[-1].lemma = '-EOS-'
-            self.tokens[-1].pos = 'eos'
 
-        # parse the parse tree
+        # get the parse tree string
         pNodes = sNode.getElementsByTagName('parse')
         if len(pNodes) == 1:
             self.parseString = xmlutil.getText(pNodes[0])
-            # build parse trees
-            if len(self.parseString) > 0:
-                self.parseTree = parsetree.ParseTreeNode()
-                self.parseTree.buildParseTree(self.parseString, self.tokens)
-                #         self.simpleTree = SimplifiedTreeNode()
-                #         self.simpleTree.buildSimplifiedTree(self.parseTree)
-
-                for token in self.tokens:
-                    for dep in token.dependents:
-                        dep.token = self.tokens[dep.index]
-                    for gov in token.governors:
-                        gov.token = self.tokens[gov.index]
-                    if token.isRoot():
-                        self.dependencyGraphRoot.append(token)
-                        #        self.dependencyGraphBFS()
 
         # build list of umls terms in sentence
+        chunkList = []
         uNodeList = sNode.getElementsByTagName('umlsChunk')
         for uNode in uNodeList:
-            umlsChunk = umlschunk.UMLSChunk(uNode, self)
+            chunkList.append(umlschunk.UMLSChunk(uNode, self))
+
+        self.__linkSentenceParts(chunkList)
+
+    def parseElement(self, sElement, index, abstract):
+        """ build the sentence from an ElementTree sentence element.
+            Builds the same sentence as parseXML() does for the equivalent
+            minidom element. """
+        self.section = sElement.get('section', '').replace(' ', '_')
+        self.index = index
+        self.abstract = abstract
+        self.nlmCategory = sElement.get('nlmCategory', '')
+
+        i = 0
+        for element in sElement.iter('token'):
+            t = sentencetoken.Token()
+            t.parseElement(element, i, self)
+            self.tokens.append(t)
+            i = i + 1
+
+        # get the parse tree string
+        pElements = list(sElement.iter('parse'))
+        if len(pElements) == 1:
+            self.parseString = xmlutil.getElementText(pElements[0])
+
+        # build list of umls terms in sentence
+        chunkList = []
+        for element in sElement.iter('umlsChunk'):
+            umlsChunk = umlschunk.UMLSChunk(sentence=self)
+            umlsChunk.parseElement(element)
+            chunkList.append(umlsChunk)
+
+        self.__linkSentenceParts(chunkList)
+
+    def __linkSentenceParts(self, chunkList):
+        """ finish building a sentence read from xml. build the parse tree,
+            link tokens to their dependencies and umls chunks and find
+            special values. """
+        if self.tokens[-1].text == '.':
+            self.tokens[-1].text = '-EOS-'
+            self.tokens[-1].lemma = '-EOS-'
+            self.tokens[-1].pos = 'eos'
+
+        if len(self.parseString) > 0:
+            # the parse tree and list of dependency graph roots are built
+            # when they are first used (see __getattr__)
+            del self.parseTree
+            del self.dependencyGraphRoot
+            for token in self.tokens:
+                del token.parseTreeNode
+                for dep in token.dependents:
+                    dep.token = self.tokens[dep.index]
+                for gov in token.governors:
+                    gov.token = self.tokens[gov.index]
+
+        for umlsChunk in chunkList:
             self.umlsChunks.append(umlsChunk)
             for i in range(umlsChunk.startIdx, umlsChunk.endIdx + 1):
                 token = self.tokens[i]
-                token.umlsChunks.append(umlsChunk)
+                token.addUMLSChunk(umlsChunk)
 
         # see if we can determine the types of some of the numbers
         self.findSpecialValues()
 
+    def __getattr__(self, name):
+        """ only called for attributes that have not been set.
+            builds the parse tree or the list of dependency graph roots for
+            a sentence read from xml the first time it is used. """
+        if name == 'parseTree':
+            self.buildParseTree()
+            return self.parseTree
+        elif name == 'dependencyGraphRoot':
+            self.dependencyGraphRoot = []
+            for token in self.tokens:
+                if token.isRoot():
+                    self.dependencyGraphRoot.append(token)
+            return self.dependencyGraphRoot
+        raise AttributeError(name)
+
+    def buildParseTree(self):
+        """ build the parse tree for the sentence from its parse string and
+            set the parse tree node for each token """
+        for token in self.tokens:
+            token.parseTreeNode = None
+        parseTree = None
+        if len(self.parseString) > 0:
+            parseTree = parsetree.ParseTreeNode()
+            parseTree.buildParseTree(self.parseString, self.tokens)
+            #         self.simpleTree = SimplifiedTreeNode()
+            #         self.simpleTree.buildSimplifiedTree(self.parseTree)
+        self.parseTree = parseTree
+
     def findSpecialValues(self):
         """ Use rules to identify special values in the sentence """
 
@@ -330,6 +404,37 @@ class Sentence:
         """ return number of tokens in sentence """
         return len(self.tokens)
 
+    def getColumns(self):
+        """ return the SentenceColumns for the tokens in this sentence.
+            The columns are kept until the text, lemma, pos, special value type,
+            annotations or labels of a token in the sentence change. """
+        if self.columns == None or len(self.columns) != len(self.tokens):
+            self.columns = sentencecolumns.SentenceColumns(self.tokens)
+        return self.columns
+
+    def invalidateColumns(self):
+        """ discard the columns for this sentence. they are rebuilt the next time
+            they are needed. """
+        self.columns = None
+
+    def getSyntax(self):
+        """ return the SentenceSyntax with the dependency paths and closest verbs
+            of the tokens in this sentence. it is kept until a token in the
+            sentence changes. """
+        if self.syntax == None or len(self.syntax) != len(self.tokens):
+            self.syntax = sentencesyntax.SentenceSyntax(self.tokens, self.dependencyGraphRoot)
+        return self.syntax
+
+    def __getstate__(self):
+        """ columns hold vocabulary ids that are only valid in this process
+            and stored features belong to a FeatureStore, so they are not pickled.
+            the syntax cache is rebuilt when it is needed. """
+        state = self.__dict__.copy()
+        state.pop('columns', None)
+        state.pop('syntax', None)
+        state.pop('storedFeatures', None)
+        return state
+
     def getSimplifiedSentence(self, entityTypes, mode):
         """ Create and return a simplified version of the sentence that only consists
             of tokens for mentions and special tokens (e.g. numbers, verbs, symbols)
@@ -382,29 +487,49 @@ class Sentence:
         for umlsChunk in self.umlsChunks:
             node.appendChild(umlsChunk.getXML(doc))
 
-        if self.parseTree != None:
-            s = self.parseTree.treebankString()
-            #      s = self.parseString
+        s = self.treebankString()
+        if s != None:
             node.appendChild(xmlutil.createNodeWithTextChild(doc, 'parse', s))
 
         return node
 
+    def writeElement(self, writer):
+        """ write the same sentence element as getXML() to an xmlutil.XMLWriter """
+        attributes = {}
+        if len(self.section) > 0:
+            attributes['section'] = self.section
+        if len(self.nlmCategory) > 0:
+            attributes['nlmCategory'] = self.nlmCategory
+        writer.startElement('sentence', attributes)
+        for token in self.tokens:
+            token.writeElement(writer)
+        for umlsChunk in self.umlsChunks:
+            umlsChunk.writeElement(writer)
+        s = self.treebankString()
+        if s != None:
+            writer.textElement('parse', {}, s)
+        writer.endElement()
+
+    def treebankString(self):
+        """ return the parse tree string written to xml (None if there is no
+            parse tree). the string read from xml is written as it is if the
+            parse tree was never built, so writing does not build every tree. """
+        if 'parseTree' not in self.__dict__:
+            return self.parseString
+        if self.parseTree == None:
+            return None
+        return self.parseTree.treebankString()
+
     def dependencyGraphBFS(self):
-        """ perform a Breadth-First search of the dependency graph for this sentence """
+        """ perform a Breadth-First search of the dependency graph for this sentence.
+            the parent of each token is the governor it was discovered from
+            (see SentenceSyntax) """
         self.markNodesUnvisited()
-        for root in self.dependencyGraphRoot:
-            q = Queue.Queue()
-            q.put(root)
-            while q.empty() == False:
-                token = q.get_nowait()
-                for dep in token.dependents:
-                    if dep.token.isDiscovered() == False:
-                        dep.token.discover()
-                        for gov in dep.token.governors:
-                            if gov.token == token:
-                                dep.token.parent = gov
-                        q.put(dep.token)
-                token.visit()
+        syntax = self.getSyntax()
+        for index in syntax.order:
+            self.tokens[index].visit()
+        for token in self.tokens:
+            token.parent = syntax.parent(token.index)
 
 
     def markNodesUnvisited(self):
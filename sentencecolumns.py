@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+
+"""
+ Columnar (array) form of the tokens in a sentence.
+
+ The text, lemma, part of speech and special value type of each token are
+ stored as integer ids in parallel numpy arrays and the annotations and labels
+ of each token are stored as bit masks. Strings are mapped to ids by
+ vocabularies shared by every sentence, so predicates on strings can be
+ evaluated once per vocabulary entry and then applied to whole sentences.
+"""
+
+__author__ = 'Rodney L. Summerscales'
+
+import numpy
+
+
+class Vocabulary:
+    """ Map strings to consecutive integer ids. """
+    strings = None     # string for each id
+    ids = None         # id for each string
+    __tables = None    # cached value of a function for each string in the vocabulary
+
+    def __init__(self):
+        self.strings = []
+        self.ids = {}
+        self.__tables = {}
+
+    def id(self, string):
+        """ return the id for a given string, adding it to the vocabulary if needed """
+        id = self.ids.get(string)
+        if id == None:
+            id = len(self.strings)
+            self.ids[string] = id
+            self.strings.append(string)
+        return id
+
+    def string(self, id):
+        """ return the string with a given id """
+        return self.strings[id]
+
+    def lookup(self, strings):
+        """ return array of ids for a list of strings.
+            strings that are not in the vocabulary get the id -1. """
+        return numpy.array([self.ids.get(string, -1) for string in strings], dtype=numpy.int32)
+
+    def table(self, function, dtype=numpy.bool_):
+        """ return an array containing function(string) for every string in the
+            vocabulary, indexed by id.
+
+            The array is computed once for each function and extended as new
+            strings are added, so use the same function object each time
+            (e.g. a module level function or a bound method, not a lambda). """
+        table = self.__tables.get(function)
+        if table is None:
+            table = numpy.zeros(0, dtype=dtype)
+        if len(table) < len(self.strings):
+            newValues = [function(string) for string in self.strings[len(table):]]
+            table = numpy.concatenate([table, numpy.array(newValues, dtype=table.dtype)])
+            self.__tables[function] = table
+        return table
+
+    def __len__(self):
+        return len(self.strings)
+
+    def __contains__(self, string):
+        return string in self.ids
+
+
+class BitVocabulary(Vocabulary):
+    """ Vocabulary of names (e.g. annotation types) that are stored as bits of
+        a 64 bit mask. At most 64 different names can be used. """
+    maxNames = 64
+
+    def id(self, name):
+        """ return the id for a given name, adding it to the vocabulary if needed """
+        if name not in self.ids and len(self.strings) == self.maxNames:
+            raise ValueError('More than %d annotation types: %s' % (self.maxNames, name))
+        return Vocabulary.id(self, name)
+
+    def mask(self, names):
+        """ return bit mask with a bit set for each name in a list of names """
+        mask = 0
+        for name in names:
+            mask |= 1 << self.id(name)
+        return numpy.uint64(mask)
+
+    def lookupMask(self, names):
+        """ return bit mask with a bit set for each name in a list of names that
+            is in the vocabulary. names are not added, so querying names that no
+            token has does not use up bits. """
+        mask = 0
+        for name in names:
+            id = self.ids.get(name)
+            if id != None:
+                mask |= 1 << id
+        return numpy.uint64(mask)
+
+
+# vocabularies shared by all sentences
+textVocabulary = Vocabulary()
+lemmaVocabulary = Vocabulary()
+posVocabulary = Vocabulary()
+specialValueVocabulary = Vocabulary()   # id 0 is used for tokens that are not special values
+specialValueVocabulary.id(None)
+annotationTypes = BitVocabulary()       # annotation and label names
+
+
+class SentenceColumns:
+    """ Arrays holding the token information for a sentence.
+        Element i of each array describes token i of the sentence.
+
+        A SentenceColumns object is a snapshot of the sentence when it was
+        created. Use Sentence.getColumns() to get the columns for a sentence,
+        it builds new columns when its tokens have changed. """
+    text = None              # text vocabulary id for each token
+    lemma = None             # lemma vocabulary id for each token
+    pos = None               # part of speech vocabulary id for each token
+    specialValueType = None  # special value vocabulary id for each token (0 = None)
+    annotations = None       # bit mask of annotation types for each token
+    labels = None            # bit mask of label types for each token
+
+    def __init__(self, tokens):
+        """ create columns for a list of tokens """
+        nTokens = len(tokens)
+        self.text = numpy.fromiter((textVocabulary.id(token.text) for token in tokens),
+                                   numpy.int32, nTokens)
+        self.lemma = numpy.fromiter((lemmaVocabulary.id(token.lemma) for token in tokens),
+                                    numpy.int32, nTokens)
+        self.pos = numpy.fromiter((posVocabulary.id(token.pos) for token in tokens),
+                                  numpy.int32, nTokens)
+        self.specialValueType = numpy.fromiter((specialValueVocabulary.id(token.specialValueType)
+                                                for token in tokens), numpy.int32, nTokens)
+        self.annotations = numpy.fromiter((annotationTypes.mask(a.type for a in token.annotations)
+                                           for token in tokens), numpy.uint64, nTokens)
+        self.labels = numpy.fromiter((annotationTypes.mask(a.type for a in token.labels)
+                                      for token in tokens), numpy.uint64, nTokens)
+
+    def __len__(self):
+        return len(self.text)
+
+    def hasAnnotation(self, name):
+        """ return boolean array that is True for tokens with a given annotation """
+        return (self.annotations & annotationTypes.lookupMask([name])) != 0
+
+    def hasLabel(self, name, mode='test'):
+        """ return boolean array that is True for tokens with a given label.
+            if mode is 'train', check the annotations instead (see Token.hasLabel) """
+        if mode == 'train':
+            return self.hasAnnotation(name)
+        return (self.labels & annotationTypes.lookupMask([name])) != 0
+
+    def isSpecialValue(self):
+        """ return boolean array that is True for tokens with a special value type """
+        return self.specialValueType != 0
+
+    def textIn(self, words):
+        """ return boolean array that is True for tokens whose text is in a set of words """
+        return numpy.in1d(self.text, textVocabulary.lookup(words))
+
+    def lemmaIn(self, lemmas):
+        """ return boolean array that is True for tokens whose lemma is in a set of lemmas """
+        return numpy.in1d(self.lemma, lemmaVocabulary.lookup(lemmas))
+
+    def posIn(self, tags):
+        """ return boolean array that is True for tokens with one of a set of pos tags """
+        return numpy.in1d(self.pos, posVocabulary.lookup(tags))
+
+    def textTable(self, function, dtype=numpy.bool_):
+        """ return array containing function(token.text) for each token """
+        return textVocabulary.table(function, dtype)[self.text]
+
+    def lemmaTable(self, function, dtype=numpy.bool_):
+        """ return array containing function(token.lemma) for each token """
+        return lemmaVocabulary.table(function, dtype)[self.lemma]
+
+    def posTable(self, function, dtype=numpy.bool_):
+        """ return array containing function(token.pos) for each token """
+        return posVocabulary.table(function, dtype)[self.pos]
@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+
+"""
+ Dependency paths and closest verbs for the tokens in a sentence.
+
+ The parent of each token in the dependency graph, the closest verb above each
+ token in the phrase structure parse tree and the dependency path from each
+ token to a verb or to the root are found for all of the tokens in a sentence
+ at once and kept until a token in the sentence changes (see Token.changed).
+"""
+
+__author__ = 'Rodney L. Summerscales'
+
+from collections import deque
+
+
+class SentenceSyntax:
+    """ Parent pointers, closest verbs and dependency paths of the tokens in a sentence """
+    tokens = None        # tokens in the sentence
+    parents = None       # governor Dependency each token was discovered from (None for roots)
+    order = None         # indices of the tokens reached by the search, in the order they were visited
+    __verbNodes = None   # closest verb node for each token (None = not found yet)
+    __paths = None       # (path function name, token index) -> path string or verb token
+
+    def __init__(self, tokens, roots):
+        """ tokens = list of tokens in the sentence
+            roots = root tokens of the dependency graph of the sentence """
+        self.tokens = tokens
+        self.parents = [None] * len(tokens)
+        self.order = []
+        self.__verbNodes = None
+        self.__paths = {}
+        self.__search(roots)
+
+    def __len__(self):
+        return len(self.tokens)
+
+    def __search(self, roots):
+        """ breadth first search of the dependency graph from each root.
+            a token is given the parent through which it is first discovered,
+            so following parents always ends at a token without one. """
+        discovered = [False] * len(self.tokens)
+        for root in roots:
+            discovered[root.index] = True
+            queue = deque([root.index])
+            while len(queue) > 0:
+                index = queue.popleft()
+                for dep in self.tokens[index].dependents:
+                    if discovered[dep.index] == False:
+                        discovered[dep.index] = True
+                        for gov in self.tokens[dep.index].governors:
+                            if gov.index == index:
+                                self.parents[dep.index] = gov
+                        queue.append(dep.index)
+                self.order.append(index)
+
+    def parent(self, index):
+        """ return the governor Dependency of the token at a given index in the
+            search tree or None """
+        return self.parents[index]
+
+    def closestVerbNode(self, index):
+        """ return the closest ancestor verb node in the parse tree of the token
+            at a given index or None (see ParseTreeNode.closestParentVerbNode) """
+        if self.__verbNodes is None:
+            self.__findVerbNodes()
+        return self.__verbNodes[index]
+
+    def __findVerbNodes(self):
+        """ find the closest verb node for each token. each parse tree node is
+            looked at once. """
+        closest = {}   # id of parse tree node -> closest verb node
+        self.__verbNodes = []
+        for token in self.tokens:
+            node = token.parseTreeNode
+            # walk up to the first node whose closest verb is known
+            walked = []
+            verbNode = None
+            while node is not None:
+                if id(node) in closest:
+                    verbNode = closest[id(node)]
+                    break
+                parent = node.parent
+                if parent is None:
+                    verbNode = None
+                    walked.append(node)
+                    break
+                if parent.type == 'VP' and len(parent.childNodes) > 0 \
+                        and parent.childNodes[0] != node \
+                        and len(parent.childNodes[0].text) > 0:
+                    verbNode = parent.childNodes[0]
+                    walked.append(node)
+                    break
+                walked.append(node)
+                node = parent
+            for node in walked:
+                closest[id(node)] = verbNode
+            self.__verbNodes.append(verbNode)
+
+    def __uncached(self, kind, index):
+        """ return the indices of the tokens from the token at a given index up
+            to (but not including) the first ancestor in the search tree whose
+            path of a given kind is cached, starting with the highest one """
+        chain = []
+        while index is not None and (kind, index) not in self.__paths:
+            chain.append(index)
+            parent = self.parents[index]
+            if parent is None:
+                index = None
+            else:
+                index = parent.index
+        chain.reverse()
+        return chain
+
+    def pathToRoot(self, index):
+        """ return the path of token text from the root of the search tree to
+            the token at a given index (see Token.pathToRoot) """
+        key = ('root', index)
+        if key not in self.__paths:
+            for i in self.__uncached('root', index):
+                parent = self.parents[i]
+                if parent is None:
+                    path = self.tokens[i].text
+                else:
+                    path = self.__paths[('root', parent.index)] + '<-' + self.tokens[i].text
+                self.__paths[('root', i)] = path
+        return self.__paths[key]
+
+    def pathToVerb(self, index, includeSpecific=True):
+        """ return the path of dependency relationships from the closest verb
+            governing the token at a given index (see Token.pathToVerb) """
+        if includeSpecific == False:
+            token = self.tokens[index]
+            parent = self.parents[index]
+            if token.isVerb() or parent is None:
+                return self.pathToVerb(index)
+            return self.pathToVerb(parent.index) + '<-' + parent.type
+        key = ('verb', index)
+        if key not in self.__paths:
+            for i in self.__uncached('verb', index):
+                token = self.tokens[i]
+                parent = self.parents[i]
+                if token.isVerb():
+                    path = 'VB_' + token.lemma
+                elif parent is None:
+                    path = 'ROOT<-' + token.lemma
+                else:
+                    path = self.__paths[('verb', parent.index)] + '<-' + parent.fullname()
+                self.__paths[('verb', i)] = path
+        return self.__paths[key]
+
+    def parentVerb(self, index):
+        """ return the closest verb token governing the token at a given index
+            or None (see Token.parentVerb) """
+        key = ('verbToken', index)
+        if key not in self.__paths:
+            for i in self.__uncached('verbToken', index):
+                token = self.tokens[i]
+                parent = self.parents[i]
+                if token.isVerb():
+                    verb = token
+                elif parent is None:
+                    verb = None
+                else:
+                    verb = self.__paths[('verbToken', parent.index)]
+                self.__paths[('verbToken', i)] = verb
+        return self.__paths[key]
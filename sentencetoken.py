@@ -5,6 +5,7 @@ Store all relevant information for a token from a sentence.
 """
 
 import re
+import operator
 import nltk.corpus
 
 import xmlutil
@@ -16,34 +17,112 @@ from annotation import Annotation, AnnotationList
 __author__ = 'Rodney L. Summerscales'
 
 
-class Token:
+# bits of the predicate flags of a token (see Token.getFlags)
+numberFlag = 1 << 0
+integerFlag = 1 << 1
+nullNumberFlag = 1 << 2
+percentageFlag = 1 << 3
+stopWordFlag = 1 << 4
+symbolFlag = 1 << 5
+acronymFlag = 1 << 6
+timeWordFlag = 1 << 7
+timeUnitFlag = 1 << 8
+measurementFlag = 1 << 9
+currencyFlag = 1 << 10
+negationFlag = 1 << 11
+specialTokenFlag = 1 << 12
+valueAcronymFlag = 1 << 13
+verbFlag = 1 << 14
+groupWordFlag = 1 << 15
+outcomeWordFlag = 1 << 16
+importantIntegerFlag = 1 << 17
+importantNumberFlag = 1 << 18
+parenthesisFlag = 1 << 19
+
+
+class LazyDict(object):
+    """ Token attribute holding a dictionary that is only created when the
+        attribute is first used. Most tokens never get features or top-k labels,
+        so they do not need their own empty dictionaries. """
+
+    def __init__(self, slotName):
+        """ slotName = name of the slot holding the dictionary (None until it is used) """
+        self.slotName = slotName
+
+    def __get__(self, token, tokenClass):
+        if token is None:
+            return self
+        value = getattr(token, self.slotName)
+        if value is None:
+            value = {}
+            setattr(token, self.slotName, value)
+        return value
+
+    def __set__(self, token, value):
+        setattr(token, self.slotName, value)
+
+
+def trackedAttribute(slotName):
+    """ return a Token attribute stored in a given slot. assigning to it calls
+        Token.changed(), since the attribute is stored in the columns of the
+        sentence (see Sentence.getColumns) or written to xml files.
+        code that builds a token that is not in use yet sets the slot directly. """
+    def setValue(token, value):
+        setattr(token, slotName, value)
+        token.changed()
+
+    return property(operator.attrgetter(slotName), setValue)
+
+
+class Token(object):
     """ This object contains all relevant information about a token. """
-    text = ''  # the token itself
-    pos = ''  # part of speech tag
-    #  stem=''              # stem of the token with affixes stripped
-    lemma = ''  # common lemma for the word
-    __units = ''
-    index = -1  # position of token in sentence
-    governors = None  # dependencies where this token is the dependent
-    dependents = None  # dependencies where this token is the governor
-    __visited = False  # has the node been officially "visited"
-    __discovered = False  # has the node been discovered yet?
-    parent = False  # parent on shortest path to a node in dependency graph
-
-    features = {}
-    allFeatures = {}
-    semanticTags = None
-    annotations = None  # annotations from original corpus
-    labels = None  # annotations that have been detected by later systems
-    specialValueType = None  # token is a number of a special type that we do not classify
-    # e.g. HR, ARR, NNT, CI
+    __slots__ = ('_text',  # the token itself
+                 '_pos',  # part of speech tag
+                 '_lemma',  # common lemma for the word
+                 '__units',
+                 'index',  # position of token in sentence
+                 '_governors',  # dependencies where this token is the dependent
+                 '_dependents',  # dependencies where this token is the governor
+                 '__visited',  # has the node been officially "visited"
+                 '__discovered',  # has the node been discovered yet?
+                 'parent',  # parent on shortest path to a node in dependency graph
+                 '_features', '_allFeatures', '_topKLabels',
+                 '_semanticTags',
+                 '_annotations',  # annotations from original corpus
+                 '_labels',  # annotations that have been detected by later systems
+                 '_specialValueType',  # token is a number of a special type that we do not classify
+                                      # e.g. HR, ARR, NNT, CI
+                 'sentence',
+                 'parseTreeNode',
+                 'simplifiedTreeNode',
+                 'umlsChunks',
+                 '_umlsConcepts',
+                 '_flags')  # predicate flags (None until first used, see getFlags)
+
+    features = LazyDict('_features')
+    allFeatures = LazyDict('_allFeatures')
+    topKLabels = LazyDict('_topKLabels')
+
+    text = trackedAttribute('_text')
+    lemma = trackedAttribute('_lemma')
+    pos = trackedAttribute('_pos')
+    specialValueType = trackedAttribute('_specialValueType')
+    annotations = trackedAttribute('_annotations')
+    labels = trackedAttribute('_labels')
+    semanticTags = trackedAttribute('_semanticTags')
+    umlsConcepts = trackedAttribute('_umlsConcepts')
+    governors = trackedAttribute('_governors')
+    dependents = trackedAttribute('_dependents')
+
+    # shared values for tokens with no semantic tags, umls chunks or concepts.
+    # they are immutable, so add tags, chunks and concepts using the
+    # addSemanticTag(), addUMLSChunk() and addUMLSConcept() methods.
+    noSemanticTags = frozenset()
+    noUMLSChunks = ()
+    noUMLSConcepts = ()
+
     #  stemmer = nltk.stem.PorterStemmer()
     #  lemmatizer = nltk.stem.wordnet.WordNetLemmatizer()
-    sentence = None
-    parseTreeNode = None
-    simplifiedTreeNode = None
-    umlsChunks = None
-    umlsConcepts = None
     #  numberPattern = re.compile('(-?\d+\.\d*$)|(-?\d+$)|(-?\.\d+$)')
 
     acronymPattern = re.compile('[A-Z]+[A-Z0-9]*$')
@@ -73,7 +152,7 @@ class Token:
                     '\'', ':', ';'}
 
     currencyWordSet = {"pound", "dollar", "euro", "$"}
-    stopWordSet = nltk.corpus.stopwords.words('english')
+    stopWordSet = frozenset(nltk.corpus.stopwords.words('english') + ['versus'])
     negationWordSet = {'not', 'no', 'without', 'never', 'neither', 'none', 'non'}
     nullNumberWords = {'none', 'no'}
     timeFrequencyWords = {'hourly', 'daily', 'weekly', 'monthly', 'yearly', 'diem'}
@@ -81,35 +160,77 @@ class Token:
     def __init__(self, text='', lemma=None, pos=None):
         """ create a new token
             """
-        self.text = text
+        # a new token is not in a sentence yet, so there is no one to tell
+        # about changes (see changed()). set the slots directly.
+        self.sentence = None
+        self._text = text
         if lemma == None:
-            self.lemma = self.text
+            self._lemma = text
         else:
-            self.lemma = lemma
+            self._lemma = lemma
         if pos == None:
-            self.pos = ''
+            self._pos = ''
         else:
-            self.pos = pos
+            self._pos = pos
 
         self.__units = ''
-        self.features = {}
-        self.allFeatures = {}
-        self.topKLabels = {}
+        self._features = None
+        self._allFeatures = None
+        self._topKLabels = None
         self.index = None
-        self.semanticTags = set([])
-        self.umlsChunks = []
-        self.umlsConcepts = []
+        self._semanticTags = self.noSemanticTags
+        self.umlsChunks = self.noUMLSChunks
+        self._umlsConcepts = self.noUMLSConcepts
         self.parseTreeNode = None
-        self.sentence = None
         self.simplifiedTreeNode = None
         self.__visited = False
         self.parent = None
         self.__discovered = False
-        self.specialValueType = None
-        self.dependents = None
-        self.governors = None
-        self.annotations = set([])
-        self.labels = set([])
+        self._specialValueType = None
+        self._dependents = None
+        self._governors = None
+        self._annotations = set([])
+        self._labels = set([])
+        self._flags = None
+
+    def __getattr__(self, name):
+        """ only called for attributes that have not been set.
+            tokens read from xml do not get their parse tree node until the
+            parse tree of their sentence is first used. """
+        if name == 'parseTreeNode' and self.sentence is not None:
+            self.sentence.buildParseTree()
+            return object.__getattribute__(self, name)
+        raise AttributeError(name)
+
+    def changed(self):
+        """ called when information about this token changes (e.g. its text,
+            lemma or annotations). drops the columns and stored features
+            of its sentence and marks the abstract as dirty so that it is
+            written again. """
+        self._flags = None
+        sentence = self.sentence
+        if sentence is not None:
+            sentence.columns = None
+            sentence.syntax = None
+            sentence.storedFeatures = None
+            if sentence.abstract is not None:
+                sentence.abstract.dirty = True
+
+    def labelsChanged(self):
+        """ called when the labels assigned to this token change. like changed(),
+            but the stored features of the sentence are kept. the feature store
+            updates the features that depend on labels when they are used. """
+        sentence = self.sentence
+        if sentence is not None:
+            sentence.columns = None
+            if sentence.abstract is not None:
+                sentence.abstract.dirty = True
+
+    def hasState(self):
+        """ return True if features or top-k labels were assigned to this token
+            (they are not part of the xml file it was read from) """
+        return self._features is not None or self._allFeatures is not None \
+            or self._topKLabels is not None
 
     def parseXML(self, tNode, index, sentence):
         """ create a new token from an xml token element.
@@ -117,50 +238,97 @@ class Token:
             index = the index of the element in the sentence (0 indexed)
             sentence = the Sentence object containing this token
             """
-        self.sentence = sentence
-        self.index = index
-
-        self.text = xmlutil.normalizeText(tNode.getAttribute('text'))
-        if self.index == 0 and self.text[0] >= 'A' and self.text[0] <= 'Z' \
-                and (len(self.text) == 1 or (self.text[1] >= 'a' and self.text[1] <= 'z')):
-            # first word in the sentence is capitalized and is not part of an acronym
-            self.text = self.text.lower()
-
-        self.lemma = xmlutil.normalizeText(tNode.getAttribute('lemma'))
-        if len(self.lemma) == 0:
-            self.lemma = self.text
-
-        self.pos = tNode.getAttribute('pos')
-        if self.pos == None:
-            self.pos = ''
+        self.__setTokenText(index, sentence, tNode.getAttribute('text'),
+                            tNode.getAttribute('lemma'), tNode.getAttribute('pos'))
 
+        # the abstract being read is not changed by building its tokens
         dNodes = tNode.getElementsByTagName('dep')
-        self.dependents = parsetree.DependencyList(dNodes)
+        self._dependents = parsetree.DependencyList(dNodes)
 
         gNodes = tNode.getElementsByTagName('gov')
-        self.governors = parsetree.DependencyList(gNodes)
-        for gov in self.governors:
-            if gov.index == self.index:
-                #         print 'Governor index matches dependent index'
-                #         print self.text
-                #         print self.sentence.toString()
-                #         sys.exit()
-                self.governors.remove(gov)
+        self._governors = parsetree.DependencyList(gNodes)
+        self.__removeSelfGovernors()
 
         aNodes = tNode.getElementsByTagName('annotation')
-        self.annotations = AnnotationList(aNodes)
+        self._annotations = AnnotationList(aNodes)
 
         lNodes = tNode.getElementsByTagName('label')
-        self.labels = AnnotationList(lNodes)
+        self._labels = AnnotationList(lNodes)
 
         sNodes = tNode.getElementsByTagName('semantic')
         for node in sNodes:
             semTag = xmlutil.getText(node)
-            self.semanticTags.add(semTag)
+            self.addSemanticTag(semTag)
 
         uNodes = tNode.getElementsByTagName('umls')
         for node in uNodes:
-            self.umlsConcepts.append(umlsconcept.UMLSConcept(node))
+            self.addUMLSConcept(umlsconcept.UMLSConcept(node))
+
+    def parseElement(self, tElement, index, sentence):
+        """ create a new token from an ElementTree token element.
+            Builds the same token as parseXML() does for the equivalent
+            minidom element.
+            tElement = ElementTree token element
+            index = the index of the element in the sentence (0 indexed)
+            sentence = the Sentence object containing this token
+            """
+        self.__setTokenText(index, sentence, tElement.get('text', ''),
+                            tElement.get('lemma', ''), tElement.get('pos', ''))
+
+        # the abstract being read is not changed by building its tokens
+        self._dependents = parsetree.DependencyList()
+        self._dependents.parseElements(tElement.iter('dep'))
+
+        self._governors = parsetree.DependencyList()
+        self._governors.parseElements(tElement.iter('gov'))
+        self.__removeSelfGovernors()
+
+        self._annotations = AnnotationList()
+        self._annotations.parseElements(tElement.iter('annotation'))
+
+        self._labels = AnnotationList()
+        self._labels.parseElements(tElement.iter('label'))
+
+        for element in tElement.iter('semantic'):
+            self.addSemanticTag(xmlutil.getElementText(element))
+
+        for element in tElement.iter('umls'):
+            concept = umlsconcept.UMLSConcept()
+            concept.parseElement(element)
+            self.addUMLSConcept(concept)
+
+    def __setTokenText(self, index, sentence, text, lemma, pos):
+        """ set the position, text, lemma and part of speech for a token read
+            from an xml file """
+        self.sentence = sentence
+        self.index = index
+
+        text = xmlutil.normalizeText(text)
+        if index == 0 and text[0] >= 'A' and text[0] <= 'Z' \
+                and (len(text) == 1 or (text[1] >= 'a' and text[1] <= 'z')):
+            # first word in the sentence is capitalized and is not part of an acronym
+            text = text.lower()
+        self._text = text
+
+        lemma = xmlutil.normalizeText(lemma)
+        if len(lemma) == 0:
+            lemma = text
+        self._lemma = lemma
+
+        if pos == None:
+            pos = ''
+        self._pos = pos
+
+    def __removeSelfGovernors(self):
+        """ remove governor dependencies that point back at this token """
+        for gov in self.governors:
+            if gov.index == self.index:
+                #         print 'Governor index matches dependent index'
+                #         print self.text
+                #         print self.sentence.toString()
+                #         sys.exit()
+                self.governors.remove(gov)
+                self.changed()
 
     def isRoot(self):
         """ return True if this token has a dependency from the root """
@@ -277,6 +445,7 @@ class Token:
         """ add a new label (assigned by a classifier) """
         label = Annotation(name)
         self.labels.add(label)
+        self.labelsChanged()
 
     def setLabelAttribute(self, name, attrib, value):
         """ add an attribute value to a given label.
@@ -290,6 +459,7 @@ class Token:
             self.addLabel(name)
             label = self.labels.get(name)
         label.setAttributeValue(attrib, value)
+        self.labelsChanged()
 
     def addAnnotation(self, name):
         """ add a new annotation (treated as ground truth. use wisely).
@@ -298,6 +468,7 @@ class Token:
         if self.hasAnnotation(name) == False:
             annotation = Annotation(name)
             self.annotations.add(annotation)
+            self.changed()
 
     def setAnnotationAttribute(self, name, attrib, value):
         """ add an attribute value to a given Annotation.
@@ -312,6 +483,7 @@ class Token:
             self.addAnnotation(name)
             annotation = self.annotations.get(name)
         annotation.setAttributeValue(attrib, value)
+        self.changed()
 
     def copyAnnotation(self, token, name):
         """ copy an annotation with a given name from a given token """
@@ -320,6 +492,7 @@ class Token:
             newAnnotation = Annotation(name)
             newAnnotation.copy(annotation)
             self.annotations.add(newAnnotation)
+            self.changed()
 
     def convertLabelToAnnotation(self, name):
         """ transform the label with the given name into an annotation for this token.
@@ -327,29 +500,51 @@ class Token:
         if name in self.labels:
             self.annotations.add(self.labels.get(name))
             self.labels.remove(name)
+            self.changed()
 
     def removeAnnotation(self, name):
         """ remove an annotation that was manually assigned. """
         if name in self.annotations:
             self.annotations.remove(name)
+            self.changed()
 
     def removeLabel(self, name):
         """ remove a label assigned by a classifier """
         if name in self.labels:
             self.labels.remove(name)
+            self.labelsChanged()
 
     def removeAllLabels(self, labelList=[]):
         """ remove ALL labels assigned by a classifier. If given a list of labels,
             remove only those labels that appear on the list. """
         if len(labelList) == 0:
-            self.labels = AnnotationList()
+            self._labels = AnnotationList()
+            self.labelsChanged()
         else:
             for label in labelList:
                 self.removeLabel(label)
 
     def addSemanticTag(self, tag):
         """ add a new semantic tag to list of semantic tags for this token """
+        if tag in self.semanticTags:
+            return
+        if len(self.semanticTags) == 0:
+            self.semanticTags = set([])
         self.semanticTags.add(tag)
+        self.changed()
+
+    def addUMLSChunk(self, umlsChunk):
+        """ add a umls chunk that contains this token """
+        if len(self.umlsChunks) == 0:
+            self.umlsChunks = []
+        self.umlsChunks.append(umlsChunk)
+
+    def addUMLSConcept(self, concept):
+        """ add a umls concept for this token """
+        if len(self.umlsConcepts) == 0:
+            self.umlsConcepts = []
+        self.umlsConcepts.append(concept)
+        self.changed()
 
     def hasSemanticTag(self, tag):
         """ return True if token has given semantic tag """
@@ -481,62 +676,154 @@ class Token:
 
         return node
 
+    def writeElement(self, writer):
+        """ write the same token element as getXML() to an xmlutil.XMLWriter """
+        attributes = {'id': str(self.index), 'text': self.text}
+        if len(self.lemma) > 0 and self.lemma != self.text:
+            attributes['lemma'] = self.lemma
+        if len(self.pos) > 0:
+            attributes['pos'] = self.pos
+        writer.startElement('token', attributes)
+        for gov in self.governors:
+            gov.writeElement(writer, 'gov')
+        for dep in self.dependents:
+            dep.writeElement(writer, 'dep')
+        for tag in self.semanticTags:
+            writer.textElement('semantic', {}, tag)
+        for annotation in self.annotations:
+            annotation.writeElement(writer, 'annotation')
+        for label in self.labels:
+            label.writeElement(writer, 'label')
+        for uc in self.umlsConcepts:
+            uc.writeElement(writer)
+        writer.endElement()
+
+    def computeFlags(self):
+        """ compute the predicate flags of this token from its text, lemma,
+            part of speech, annotations and semantic tags """
+        text = self.text
+        flags = 0
+        if text.lower() in self.nullNumberWords:
+            flags |= nullNumberFlag | numberFlag | integerFlag
+        else:
+            try:
+                float(text)
+                flags |= numberFlag
+            except:
+                pass
+            if text.isdigit():
+                flags |= integerFlag
+        if self.hasAnnotation('percentage'):
+            flags |= percentageFlag
+        if text in self.stopWordSet:
+            flags |= stopWordFlag
+        if text in self.symbolTokens:
+            flags |= symbolFlag
+        if len(text) > 1 and self.acronymPattern.match(text) != None:
+            flags |= acronymFlag
+        if 'time' in self.semanticTags:
+            flags |= timeWordFlag
+            if text.lower() not in self.timeFrequencyWords:
+                flags |= timeUnitFlag
+        if 'measurement' in self.semanticTags:
+            flags |= measurementFlag
+        elif '/' in text:
+            # check if this token matches a common pattern for ratio of units
+            # i.e. units1 / units2
+            # the first character of each part should be a letter.
+            # assume that this implies they are units.
+            for part in text.lower().split('/'):
+                if len(part) == 0 or part[0] < 'a' or part[0] > 'z':
+                    break
+            else:
+                flags |= measurementFlag
+        if self.lemma in self.currencyWordSet:
+            flags |= currencyFlag
+        if text in self.negationWordSet:
+            flags |= negationFlag
+        if text == 'SPECIAL_TERM':
+            flags |= specialTokenFlag
+        if text in self.valueAcronyms:
+            flags |= valueAcronymFlag
+        if self.pos[0:2] == 'VB':
+            flags |= verbFlag
+        if 'group' in self.semanticTags:
+            flags |= groupWordFlag
+        if 'outcome' in self.semanticTags:
+            flags |= outcomeWordFlag
+        if text == '-LRB-' or text == '-RRB-':
+            flags |= parenthesisFlag
+        if flags & numberFlag and self.specialValueType is None:
+            if flags & nullNumberFlag:
+                value = 0
+            elif flags & integerFlag:
+                value = int(text)
+            else:
+                value = float(text)
+            if value >= 0:
+                flags |= importantNumberFlag
+                if flags & integerFlag and not flags & percentageFlag:
+                    flags |= importantIntegerFlag
+        self._flags = flags
+        return flags
+
+    def getFlags(self):
+        """ return the predicate flags of this token (a combination of the
+            *Flag values in this module). they are computed when first needed and
+            kept until the token changes (see changed()). """
+        flags = self._flags
+        if flags is None:
+            flags = self.computeFlags()
+        return flags
+
     def isImportantInteger(self):
         """  return true if the integer is one that could be an outcome number
              or group size """
-        if (self.specialValueType == None and self.isInteger() == True and self.getValue() >= 0
-                    and self.isPercentage() == False):
-            return True
-        else:
-            return False
+        flags = self._flags
+        if flags is None:
+            flags = self.computeFlags()
+        return flags & importantIntegerFlag != 0
 
     def isImportantNumber(self):
         """  return true if the integer is one that could be an outcome number,
              group size, or event rate
         """
-        if self.isNumber() and self.specialValueType is None and self.getValue() >= 0:
-            return True
-        else:
-            return False
+        flags = self._flags
+        if flags is None:
+            flags = self.computeFlags()
+        return flags & importantNumberFlag != 0
 
     def isInteger(self):
         """ return true if the token is an integer """
-        if self.text.isdigit() or self.isNullNumberWord():
-            return True
-        else:
-            return False
+        flags = self._flags
+        if flags is None:
+            flags = self.computeFlags()
+        return flags & integerFlag != 0
 
     def isNumber(self):
         """ return true if the token is a number (integer or floating point) """
-        if self.isNullNumberWord():
-            return True
-        try:
-            float(self.text)
-            return True
-        except:
-            return False
-            #    if self.numberPattern.match(self.text) != None or self.isNullNumberWord():
-            #      return True
-            #    else:
-            #      return False
+        flags = self._flags
+        if flags is None:
+            flags = self.computeFlags()
+        return flags & numberFlag != 0
 
     def isNullNumberWord(self):
         """ return true if the token is a word that is sometimes interpreted as zero.
             {"none", "no"}
             """
-        return self.text.lower() in self.nullNumberWords
+        return self.getFlags() & nullNumberFlag != 0
 
     def isPercentage(self):
         """ return true if the token is a percentage number (e.g. 50%) """
-        return self.hasAnnotation('percentage')
+        return self.getFlags() & percentageFlag != 0
 
     def isSymbol(self):
         """ return true if the token is a symbol token (e.g. !, @, /, <, >)"""
-        return self.text in self.symbolTokens
+        return self.getFlags() & symbolFlag != 0
 
     def isAcronym(self):
         """ return true if the token is an acronym """
-        return len(self.text) > 1 and self.acronymPattern.match(self.text) != None
+        return self.getFlags() & acronymFlag != 0
 
     def isLocation(self):
         """ return true if the token is a location word """
@@ -550,12 +837,15 @@ class Token:
 
     def isStopWord(self):
         """ return true if the token is in a list of stop words """
-        return self.text in self.stopWordSet or self.text == 'versus'
+        flags = self._flags
+        if flags is None:
+            flags = self.computeFlags()
+        return flags & stopWordFlag != 0
 
     def isSpecialToken(self):
         """ return true if the token is in a list of special tokens added during
             preprocessing phase"""
-        return self.text == 'SPECIAL_TERM'
+        return self.getFlags() & specialTokenFlag != 0
 
     def isSpecialValueTerm(self):
         """ return true if this token is a term that refers to a type of value found in
@@ -578,38 +868,26 @@ class Token:
 
     def isTimeWord(self):
         """ return true if this token appears in a list of common time words """
-        return 'time' in self.semanticTags
+        return self.getFlags() & timeWordFlag != 0
 
     def isTimeUnitWord(self):
         """ return true if this token appears in a list of common time UNITS
             e.g. seconds, minutes, yrs
             but exclude time words that describe the frequency (daily, monthly, yearly) """
-        return 'time' in self.semanticTags and self.text.lower() not in self.timeFrequencyWords
+        return self.getFlags() & timeUnitFlag != 0
 
     def isMeasurementWord(self):
-        """ return true if this token appears in a list of common units of measurement"""
-        if 'measurement' in self.semanticTags:
-            return True
-        elif '/' in self.text:
-            # check if this token matches a common pattern for ratio of units
-            # i.e. units1 / units2
-            parts = self.text.split('/')
-            # the first character of each part should be a letter.
-            # assume that this implies they are units.
-            for part in parts:
-                part = part.lower()
-                if len(part) == 0 or part[0] < 'a' or part[0] > 'z':
-                    return False
-            return True
-
-        return False
+        """ return true if this token appears in a list of common units of measurement
+            or looks like a ratio of units (units1/units2) """
+        return self.getFlags() & measurementFlag != 0
 
     def isCurrencyWord(self):
         """ return true if this token appears in a list of common currencies (e.g. dollars, pounds, euros)."""
-        if self.lemma in self.currencyWordSet:
-            return True
-        else:
-            return False
+        return self.getFlags() & currencyFlag != 0
+
+    def isParenthesis(self):
+        """ return true if this token is a left or right parenthesis character """
+        return self.getFlags() & parenthesisFlag != 0
 
     def isLeftParenthesis(self):
         """ return true if this token is a left parenthesis character """
@@ -639,32 +917,33 @@ class Token:
 
     def isGroupWord(self):
         """ return true if this token is in a list of common group words."""
-        return 'group' in self.semanticTags
+        return self.getFlags() & groupWordFlag != 0
 
     def isOutcomeWord(self):
         """ return true if this token is in a list of common outcome words."""
-        return 'outcome' in self.semanticTags
+        return self.getFlags() & outcomeWordFlag != 0
 
     def isNegationWord(self):
         """ return true if this token is in a list of common negation words. """
-        return self.text in self.negationWordSet
+        return self.getFlags() & negationFlag != 0
 
     def isValueAcronym(self):
         """ return true if this token is in a list of common value acronyms.
             (e.g. ARR, NNT, HR) """
-        return self.text in self.valueAcronyms
+        return self.getFlags() & valueAcronymFlag != 0
 
     def isVerb(self):
         """ return true if this token is tagged as a verb """
-        return self.pos[0:2] == 'VB'
+        return self.getFlags() & verbFlag != 0
 
     def getValue(self):
         """ return the numeric value for this token or the value 'None' if it is not a number"""
-        if self.isNullNumberWord():
+        flags = self.getFlags()
+        if flags & nullNumberFlag:
             return 0
-        if self.isInteger():
+        if flags & integerFlag:
             return int(self.text)
-        if self.isNumber():
+        if flags & numberFlag:
             return float(self.text)
         return None
 
@@ -693,32 +972,18 @@ class Token:
         return self.__discovered
 
     def pathToRoot(self):
-        if self.parent == None:
-            return self.text
-        else:
-            return self.parent.token.pathToRoot() + '<-' + self.text
+        """ return the path of token text from the root of the dependency graph
+            to this token. the paths of all tokens in the sentence are cached
+            (see Sentence.getSyntax). """
+        return self.sentence.getSyntax().pathToRoot(self.index)
 
     def pathToVerb(self, includeSpecific=True):
         """ find the path from word to nearest verb in the sentence.
             follow governors. return string of dependency relationships leading to verb."""
-        if self.parent == None and self.isVerb() == False:
-            return 'ROOT<-' + self.lemma
-        elif self.isVerb():
-            return 'VB_' + self.lemma
-        else:
-            if includeSpecific and self.parent.specific != None and len(self.parent.specific) > 0:
-                parentType = self.parent.type + '_' + self.parent.specific
-            else:
-                parentType = self.parent.type
-            return self.parent.token.pathToVerb() + '<-' + parentType  #+':'+self.lemma
+        return self.sentence.getSyntax().pathToVerb(self.index, includeSpecific)
 
     def parentVerb(self, includeSpecific=True):
         """ find the path from word to nearest verb in the sentence.
             follow governors. return the verb."""
-        if self.parent == None and self.isVerb() == False:
-            return None
-        elif self.isVerb():
-            return self
-        else:
-            return self.parent.token.parentVerb()
+        return self.sentence.getSyntax().parentVerb(self.index)
 
@@ -0,0 +1,201 @@
+package ebm;
+
+import java.io.*;
+import java.util.Iterator;
+import java.util.LinkedHashMap;
+import java.util.Map;
+import java.util.regex.Pattern;
+
+import cc.mallet.fst.CRF;
+import cc.mallet.fst.SimpleTagger;
+import cc.mallet.fst.SumLatticeDefault;
+import cc.mallet.pipe.Pipe;
+import cc.mallet.pipe.iterator.LineGroupIterator;
+import cc.mallet.types.Instance;
+import cc.mallet.types.InstanceList;
+import cc.mallet.types.Sequence;
+
+/** Long lived process that labels token sequences with Mallet CRF models.
+ *
+ * Starting a JVM and reading a CRF model for every call to the Mallet
+ * SimpleTagger is slow. This server keeps the models it has read in memory
+ * and labels batches of sequences sent to it on standard input.
+ *
+ * Requests (one line each, followed by the data for the request):
+ *
+ *   TAG <n-best> <number of lines> <model file>
+ *       followed by the given number of lines of sequences in SimpleTagger
+ *       format: one line of features for each token and an empty line after
+ *       each sequence.
+ *   QUIT
+ *
+ * The reply to a TAG request is the output of the SimpleTagger for the
+ * sequences with the same n-best option (a line "k <n> <sequence probabilities>"
+ * followed by a line of labels and label probabilities for each token and
+ * an empty line), followed by a line "END". If the request fails the reply
+ * is a line "ERROR <message>" followed by "END".
+ *
+ * Mallet's own messages are sent to standard error so they do not mix
+ * with replies.
+ *
+ * @author rlsummerscales
+ */
+public class MalletTagServer {
+
+	/** maximum number of models kept in memory */
+	static final int maxModels = 8;
+
+	/** lines that separate sequences */
+	static final Pattern sequenceSeparator = Pattern.compile("^\\s*$");
+
+	/** a CRF model read from a file, with the time the file was changed */
+	static class Model {
+		CRF crf;
+		long lastModified;
+		long length;
+	}
+
+	/** models that have been read, least recently used first */
+	static Map<String, Model> models = new LinkedHashMap<String, Model>(16, 0.75f, true);
+
+	/** return the CRF in a model file, reading it only if it is not in the cache
+	 *  or the file has changed since it was read.
+	 * @param filename name of the model file written by the SimpleTagger
+	 * @return the CRF model
+	 */
+	static CRF getModel(String filename) throws IOException, ClassNotFoundException {
+		File file = new File(filename);
+		String key = file.getCanonicalPath();
+		Model model = models.get(key);
+		if (model != null && model.lastModified == file.lastModified()
+				&& model.length == file.length()) {
+			return model.crf;
+		}
+
+		model = new Model();
+		model.lastModified = file.lastModified();
+		model.length = file.length();
+		ObjectInputStream in = new ObjectInputStream(new FileInputStream(file));
+		model.crf = (CRF) in.readObject();
+		in.close();
+		model.crf.getInputPipe().setTargetProcessing(false);
+		models.put(key, model);
+
+		if (models.size() > maxModels) {
+			Iterator<String> keys = models.keySet().iterator();
+			keys.next();
+			keys.remove();
+		}
+		return model.crf;
+	}
+
+	/** label a list of sequences with a CRF and write the SimpleTagger output for them
+	 *
+	 * @param crf the CRF model
+	 * @param sequences sequences in SimpleTagger format
+	 * @param nBest number of labelings to write for each sequence
+	 * @param out where the labels are written
+	 */
+	static void tag(CRF crf, String sequences, int nBest, PrintWriter out) {
+		Pipe pipe = crf.getInputPipe();
+		InstanceList instances = new InstanceList(pipe);
+		instances.addThruPipe(new LineGroupIterator(new StringReader(sequences),
+				sequenceSeparator, true));
+
+		for (int i = 0; i < instances.size(); i++) {
+			Sequence input = (Sequence) ((Instance) instances.get(i)).getData();
+			Sequence[] outputs = SimpleTagger.apply(crf, input, nBest);
+			int k = outputs.length;
+			boolean error = false;
+			for (int a = 0; a < k; a++) {
+				if (outputs[a].size() != input.size()) {
+					System.err.println("Failed to decode input sequence " + i + ", answer " + a);
+					error = true;
+				}
+			}
+			if (error) {
+				continue;
+			}
+
+			SumLatticeDefault lattice = new SumLatticeDefault(crf, input);
+			double logZ = lattice.getTotalWeight();
+			StringBuffer line = new StringBuffer("k " + k);
+			for (int a = 0; a < k; a++) {
+				double weight = new SumLatticeDefault(crf, input, outputs[a]).getTotalWeight();
+				line.append(" " + Math.exp(weight - logZ));
+			}
+			out.println(line.toString());
+
+			for (int j = 0; j < input.size(); j++) {
+				line = new StringBuffer();
+				for (int a = 0; a < k; a++) {
+					String label = outputs[a].get(j).toString();
+					line.append(label);
+					line.append(" ");
+					line.append(lattice.getGammaProbability(j + 1, crf.getState(label)));
+					line.append(" ");
+				}
+				out.println(line.toString());
+			}
+			out.println();
+		}
+	}
+
+	/** read requests from standard input until QUIT or the end of the input
+	 * @param args not used
+	 */
+	public static void main(String[] args) throws IOException {
+		PrintWriter out = new PrintWriter(new BufferedWriter(
+				new OutputStreamWriter(new FileOutputStream(FileDescriptor.out))));
+		System.setOut(System.err);
+		BufferedReader in = new BufferedReader(new InputStreamReader(System.in));
+
+		String request;
+		while ((request = in.readLine()) != null) {
+			String[] parts = request.trim().split(" ", 4);
+			if (parts[0].equals("QUIT")) {
+				break;
+			} else if (parts[0].equals("TAG") && parts.length == 4) {
+				int nBest;
+				int nLines;
+				try {
+					nBest = Integer.parseInt(parts[1]);
+					nLines = Integer.parseInt(parts[2]);
+				} catch (NumberFormatException e) {
+					out.println("ERROR invalid request: " + request);
+					out.println("END");
+					out.flush();
+					continue;
+				}
+
+				// read the sequences of the request before replying
+				StringBuffer sequences = new StringBuffer();
+				String line;
+				for (int i = 0; i < nLines && (line = in.readLine()) != null; i++) {
+					sequences.append(line);
+					sequences.append('\n');
+				}
+
+				// the reply is only written if all of the sequences are labeled
+				try {
+					StringWriter reply = new StringWriter();
+					PrintWriter replyWriter = new PrintWriter(reply);
+					tag(getModel(parts[3]), sequences.toString(), nBest, replyWriter);
+					replyWriter.flush();
+					out.print(reply.toString());
+				} catch (Exception e) {
+					e.printStackTrace();
+					out.println("ERROR " + e);
+				}
+			} else if (parts[0].length() > 0) {
+				out.println("ERROR unknown request: " + request);
+			} else {
+				continue;
+			}
+			out.println("END");
+			out.flush();
+		}
+		out.close();
+	}
+
+}
@@ -9,7 +9,9 @@ import sentencefilters
 import finderfilters
 
 import abstractlist
+import lazyabstractlist
 import findertask
+import featurestore
 import mentionfinder
 import bannermentionfinder
 import timefinder
@@ -24,9 +26,11 @@ import annotatedmentionfinder
 import randommentionfinder
 import ensemble
 import mallet
+import crf
 import labelingreranker
 import crossvalidate
 import statlist
+import rundirectory
 
 import trueoutcomemeasurementassociator
 import baselinementionquantityassociator
@@ -70,6 +74,8 @@ def deleteAllModelFiles(path):
 
 class RunConfiguration:
     name = None
+    runDirectory = None
+    sharedModels = False
     mentionOutputPath = None
     numberOutputPath = None
     summaryPath = None
@@ -116,6 +122,11 @@ class RunConfiguration:
     rerankLabelings = False
     postFilterResults = True
     useReport = True
+    snapshotPath = None
+    nLoadWorkers = 1
+    lazyTestLoading = False
+    nTrainWorkers = 1
+    maxResidentTokens = 100000
 
     def __init__(self, name,
                  mentionTypes=['condition', 'group', 'outcome'],
@@ -131,12 +142,86 @@ class RunConfiguration:
                  randomSeed=None,
                  desiredRecall=1,
                  boostResults=True,
-                 useTrialReports=True):
+                 useTrialReports=True,
+                 runRoot='output/runs',
+                 cleanup='intermediates',
+                 sharedModels=False,
+                 featurePath=None,
+                 useFeatureEngine=False,
+                 featureProfilePath=None,
+                 minFeatureCount=1,
+                 maxFeaturesPerFamily=None,
+                 useTagServer=False,
+                 tokenClassifierType='mallet',
+                 malletThreads=1,
+                 streamFeatures=True):
+        """ runRoot = directory in which a unique directory is created for the
+                      intermediate files and outputs of this configuration
+                      when it first trains, tests or cross-validates
+                      (None = write them to the current directory)
+            cleanup = files deleted after a run: 'keep', 'intermediates' or 'all'
+                      (see RunDirectory)
+            sharedModels = True for a run that only tests the models in
+                           models/summarizer/ that were trained earlier. Runs
+                           that train write their models to a models directory
+                           in their run directory, so concurrent runs do not
+                           overwrite each other's models and feature lists.
+            featurePath = directory of token features kept between runs, folds
+                          and seeds (None = only share features between the
+                          finders of a run)
+            useFeatureEngine = True to compute number and mention finder
+                               features with numpy arrays (see featureengine)
+            featureProfilePath = directory for the time and size of each feature
+                                 family of the number and mention finders
+                                 (None = not recorded, see featureprofile)
+            minFeatureCount, maxFeaturesPerFamily = only train the number and
+                          mention finders on features that occur at least
+                          minFeatureCount times and on the maxFeaturesPerFamily
+                          most frequent features of each family (None = no
+                          limit, see FeatureFilter)
+            useTagServer = True to label tokens with a java process that keeps
+                           the Mallet models loaded instead of starting the
+                           Mallet simple tagger for each finder (see MalletTagServer)
+            tokenClassifierType = classifier used by the number and mention
+                          finders: 'mallet' (Mallet CRF run in java) or 'crf'
+                          (CRF trained and applied in process, see crf.py)
+            malletThreads = number of threads each Mallet training process uses
+                            (Mallet --threads)
+            streamFeatures = True to pipe features to Mallet and parse its output
+                             as it is written (False = write feature and label
+                             files to the work directory, for debugging) """
         self.name = name
+        self.runDirectory = None
+        if runRoot != None:
+            self.runDirectory = rundirectory.RunDirectory(runRoot, name, cleanup)
+            print 'Writing run files to', self.runDirectory.path
         self.mentionOutputPath = 'output/mentions'
         self.numberOutputPath = 'output/numbers'
-        self.summaryPath = 'output/summaries'
+        if self.runDirectory != None:
+            self.summaryPath = self.outputFilename('summaries')
+        else:
+            self.summaryPath = 'output/summaries'
         self.outputPath = 'output/error'
+        # snapshots of loaded abstracts so unchanged corpora are not parsed again
+        self.snapshotPath = 'output/snapshots'
+        # number of processes used to parse abstract xml files
+        self.nLoadWorkers = 1
+        # when testing, only keep abstracts with up to maxResidentTokens tokens
+        # in memory at a time (see LazyAbstractList)
+        self.lazyTestLoading = False
+        self.maxResidentTokens = 100000
+        self.featurePath = featurePath
+        self.useFeatureEngine = useFeatureEngine
+        self.featureProfilePath = featureProfilePath
+        self.minFeatureCount = minFeatureCount
+        self.maxFeaturesPerFamily = maxFeaturesPerFamily
+        self.useTagServer = useTagServer
+        self.tokenClassifierType = tokenClassifierType
+        # number of number and mention finder models fit at the same time, each in
+        # its own process and work directory (1 = one after another, see ConcurrentTrainer)
+        self.nTrainWorkers = 1
+        self.malletThreads = malletThreads
+        self.streamFeatures = streamFeatures
         self.mentionFinderType = mentionFinderType
         self.numberSentenceFilter = sentencefilters.numberSentencesOnly
         self.groupSentenceFilter = sentencefilters.candidateGroupSentences
@@ -195,25 +280,34 @@ class RunConfiguration:
         self.mentionQuantityAssociatorTasks = []
         self.mentionClusterTasks = []
 
-        self.mPath = 'models/summarizer/'
+        self.sharedModels = sharedModels
+        if sharedModels or self.runDirectory == None:
+            self.mPath = 'models/summarizer/'
+        else:
+            self.mPath = self.outputFilename('models') + '/'
         nEnsembleClassifiers = 5
 
         perTrain = 0.7
         self.randomSeed = randomSeed
         print 'Random seed =', self.randomSeed
 
+        # token features shared by the number and mention finders
+        self.featureStore = featurestore.FeatureStore(self.featurePath)
+
 
 
         # select number finder
         if numberFinderType == 'number':
-            tClassifier = mallet.MalletTokenClassifier(order=1, fullyConnected=False, nIterations=100, topK=1)
+            tClassifier = self.newTokenClassifier(fullyConnected=False, topK=1)
             #      tClassifier = MalletTokenClassifier(order=1, fullyConnected=True)
             #     tClassifier = MegamTokenClassifier(0.5)
 
             erFinder = numberfinder.NumberFinder(['eventrate'], tokenClassifier=tClassifier,
-                                                 useReport=self.useTrialReports)
+                                                 useReport=self.useTrialReports, featureStore=self.featureStore,
+                                                 useFeatureEngine=self.useFeatureEngine)
             numberFinder = numberfinder.NumberFinder(['on', 'gs'], tokenClassifier=tClassifier,
-                                                     useReport=self.useTrialReports)
+                                                     useReport=self.useTrialReports, featureStore=self.featureStore,
+                                                     useFeatureEngine=self.useFeatureEngine)
         #      erFinder = EnsembleFinder(erFinder, nClassifiers=nEnsembleClassifiers, modelPath=self.mPath, \
         #                                percentOfTraining=perTrain, duplicatesAllowed=True,\
         #                                randomSeed=self.randomSeed)
@@ -233,7 +327,7 @@ class RunConfiguration:
             print 'Error: unknown number finder =', numberFinderType
             sys.exit()
 
-        tClassifier = mallet.MalletTokenClassifier(order=1, fullyConnected=True, nIterations=100, topK=15)
+        tClassifier = self.newTokenClassifier(fullyConnected=True, topK=15)
 
         #      tClassifier = MegamTokenClassifier(0.5)
 
@@ -242,13 +336,17 @@ class RunConfiguration:
         if mentionFinderType == 'mention':
             outcomeFinder = mentionfinder.MentionFinder(['outcome'], tokenClassifier=tClassifier,
                                                         labelFeatures=self.ruleTypes, useReport=self.useTrialReports,
-                                                        randomSeed=self.randomSeed)
+                                                        randomSeed=self.randomSeed, featureStore=self.featureStore,
+                                                        useFeatureEngine=self.useFeatureEngine)
             groupFinder = mentionfinder.MentionFinder(['group'], tokenClassifier=tClassifier,
                                                       labelFeatures=self.ruleTypes, useReport=self.useTrialReports,
-                                                      randomSeed=self.randomSeed)
+                                                      randomSeed=self.randomSeed, featureStore=self.featureStore,
+                                                      useFeatureEngine=self.useFeatureEngine)
             conditionFinder = mentionfinder.MentionFinder(['condition'], tokenClassifier=tClassifier,
                                                           labelFeatures=self.ruleTypes,
-                                                          useReport=self.useTrialReports, randomSeed=self.randomSeed)
+                                                          useReport=self.useTrialReports, randomSeed=self.randomSeed,
+                                                          featureStore=self.featureStore,
+                                                          useFeatureEngine=self.useFeatureEngine)
 
             if useEnsemble:
                 oeType = 'abstract'
@@ -374,22 +472,27 @@ class RunConfiguration:
         # create tasks
         self.eventrateFinderTask = findertask.FinderTask(erFinder,
                                                          finderFilters=self.numberFilters,
-                                                         modelFilename='erfinder.model', modelPath=self.mPath)
+                                                         modelFilename='erfinder.model', modelPath=self.mPath,
+                                                         profilePath=self.featureProfilePath)
 
         self.numberFinderTask = findertask.FinderTask(numberFinder,
                                                       finderFilters=self.numberFilters,
-                                                      modelFilename='numberfinder.model', modelPath=self.mPath)
+                                                      modelFilename='numberfinder.model', modelPath=self.mPath,
+                                                      profilePath=self.featureProfilePath)
 
         self.outcomeFinderTask = findertask.FinderTask(outcomeFinder,
                                                        finderFilters=self.outcomeFilters,
-                                                       modelFilename='outcomefinder.model', modelPath=self.mPath)
+                                                       modelFilename='outcomefinder.model', modelPath=self.mPath,
+                                                       profilePath=self.featureProfilePath)
         self.groupFinderTask = findertask.FinderTask(groupFinder,
                                                      finderFilters=self.groupFilters,
-                                                     modelFilename='groupfinder.model', modelPath=self.mPath)
+                                                     modelFilename='groupfinder.model', modelPath=self.mPath,
+                                                     profilePath=self.featureProfilePath)
 
         self.conditionFinderTask = findertask.FinderTask(conditionFinder,
                                                          finderFilters=self.conditionFilters,
-                                                         modelFilename='conditionfinder.model', modelPath=self.mPath)
+                                                         modelFilename='conditionfinder.model', modelPath=self.mPath,
+                                                         profilePath=self.featureProfilePath)
 
         #    self.everythingFinderTask = FinderTask(everythingFinder, \
         #            finderFilters=self.conditionFilters+self.groupFilters+self.outcomeFilter+self.numberFilters, \
@@ -413,39 +516,93 @@ class RunConfiguration:
                                                         modelPath=self.mPath)
         self.conditionClusterTask = findertask.FinderTask(conditionClusterFinder, modelPath=self.mPath)
 
+    def newTokenClassifier(self, fullyConnected, topK):
+        """ return a first order CRF token classifier of the configured type """
+        if self.tokenClassifierType == 'crf':
+            return crf.CRFTokenClassifier(fullyConnected=fullyConnected, nIterations=100, topK=topK,
+                                          minFeatureCount=self.minFeatureCount,
+                                          maxFeaturesPerFamily=self.maxFeaturesPerFamily)
+        return mallet.MalletTokenClassifier(order=1, fullyConnected=fullyConnected, nIterations=100, topK=topK,
+                                            minFeatureCount=self.minFeatureCount,
+                                            maxFeaturesPerFamily=self.maxFeaturesPerFamily,
+                                            useTagServer=self.useTagServer, nThreads=self.malletThreads,
+                                            streamFeatures=self.streamFeatures)
+
     #############################################################################################
     #    TRAINING
     #############################################################################################
 
 
+    def outputFilename(self, filename):
+        """ return the path of an output file of this configuration """
+        if self.runDirectory == None:
+            return filename
+        return self.runDirectory.outputFilename(filename)
+
+    def activate(self):
+        """ write the files of the run to the run directory of this configuration,
+            creating it and its summaries and models directories on first use """
+        rundirectory.activate(self.runDirectory)
+        if self.runDirectory != None:
+            paths = [self.summaryPath]
+            if not self.sharedModels:
+                paths.append(self.mPath)
+            for path in paths:
+                if not os.path.isdir(path):
+                    os.makedirs(path)
+
+    def finishRun(self):
+        """ delete the intermediate files of a run (depending on the cleanup policy) """
+        if self.runDirectory != None:
+            self.runDirectory.finish()
+
+    def checkTraining(self):
+        """ stop if this run would train the shared models read by test-only runs """
+        if self.sharedModels:
+            print 'Error: run', self.name, 'only tests the shared models in', self.mPath
+            sys.exit()
+
     def train(self, trainPath, statOut=None):
         """ train models """
+        self.checkTraining()
+        self.activate()
         #    deleteAllModelFiles(self.mPath)
         absList = abstractlist.AbstractList(trainPath, sentenceFilter=sentencefilters.allSentences,
-                                            loadRegistries=False)
+                                            loadRegistries=False, snapshotPath=self.snapshotPath,
+                                            nWorkers=self.nLoadWorkers)
         self.trainOnAbstracts(absList, statOut)
+        self.finishRun()
 
 
     def trainOnAbstracts(self, absList, statOut=None):
         """ train models on given list of abstracts """
         print 'Training on %d abstracts' % len(absList)
+        self.checkTraining()
+        self.activate()
 
         for fTask in self.ruleFinderTasks:
             fTask.test(absList, statOut)
 
+        # the number and mention finder models are independent once their features
+        # are computed, so they may be fit at the same time
+        trainer = None
+        if self.nTrainWorkers > 1:
+            trainer = findertask.ConcurrentTrainer(self.nTrainWorkers, rundirectory.workFilename('train'))
+
         # train number finder and mention finder only on sentences with important numbers
         absList.applySentenceFilter(self.numberSentenceFilter)
-        self.eventrateFinderTask.train(absList)
-        self.numberFinderTask.train(absList)
+        self.eventrateFinderTask.train(absList, trainer)
+        self.numberFinderTask.train(absList, trainer)
 
         absList.applySentenceFilter(self.groupSentenceFilter)
-        self.groupFinderTask.train(absList)
+        self.groupFinderTask.train(absList, trainer)
 
         absList.applySentenceFilter(self.outcomeSentenceFilter)
-        self.outcomeFinderTask.train(absList)
+        self.outcomeFinderTask.train(absList, trainer)
 
         absList.applySentenceFilter(self.conditionSentenceFilter)
-        self.conditionFinderTask.train(absList)
+        self.conditionFinderTask.train(absList, trainer)
+        self.featureStore.clear()
 
         if self.rerankLabelings:
             absList.applySentenceFilter(self.numberSentenceFilter)
@@ -467,6 +624,8 @@ class RunConfiguration:
         #    for finderTask in self.mentionClusterTasks:
         #      finderTask.train(absList)
 
+        if trainer != None:
+            trainer.wait()
         gc.collect()
 
 
@@ -477,17 +636,28 @@ class RunConfiguration:
 
 
     def test(self, testPath, statOut, abstractPath=None):
+        self.activate()
         deleteAllXMLFiles(self.summaryPath)
         # test on given files
-        absList = abstractlist.AbstractList(testPath, sentenceFilter=sentencefilters.allSentences, \
-                                            loadRegistries=False)
+        if self.lazyTestLoading:
+            absList = lazyabstractlist.LazyAbstractList(testPath, sentenceFilter=sentencefilters.allSentences,
+                                                        loadRegistries=False, snapshotPath=self.snapshotPath,
+                                                        maxTokens=self.maxResidentTokens)
+        else:
+            absList = abstractlist.AbstractList(testPath, sentenceFilter=sentencefilters.allSentences, \
+                                                loadRegistries=False, snapshotPath=self.snapshotPath,
+                                                nWorkers=self.nLoadWorkers)
 
         self.testOnAbstracts(absList, statOut, abstractPath)
+        if self.lazyTestLoading:
+            absList.close()
+        self.finishRun()
 
 
     def testOnAbstracts(self, absList, statOut, abstractPath=None, writeSummaries=True, foldIndex=None):
         """ apply trained model to list of abstracts """
         print 'Testing on %d abstracts' % len(absList)
+        self.activate()
         for fTask in self.ruleFinderTasks:
             fTask.test(absList, statOut, fold=foldIndex)
 
@@ -504,6 +674,7 @@ class RunConfiguration:
 
         absList.applySentenceFilter(self.conditionSentenceFilter)
         self.conditionFinderTask.test(absList, statOut)
+        self.featureStore.clear()
 
 
         # re-rank alternate sentence labelings
@@ -571,9 +742,9 @@ class RunConfiguration:
         else:
             runDescription = self.name
 
-        summaryFilename = 'summaries.%s.html' % runDescription
-        summaryErrorFilename = 'summaries.%s.error.txt' % runDescription
-        summaryStatErrorFilename = 'summarystats.%s.error.txt' % runDescription
+        summaryFilename = self.outputFilename('summaries.%s.html' % runDescription)
+        summaryErrorFilename = self.outputFilename('summaries.%s.error.txt' % runDescription)
+        summaryStatErrorFilename = self.outputFilename('summarystats.%s.error.txt' % runDescription)
 
         # Compute summary statistics
         print 'Computing summaries...'
@@ -590,13 +761,13 @@ class RunConfiguration:
         #    if abstractPath != None:
         #      summaryList.writeEvaluationForm(self.summaryPath, abstractPath)
 
-        summaryList.writeEvaluations('evaluations.' + self.name + '.sql', self.version)
+        summaryList.writeEvaluations(self.outputFilename('evaluations.' + self.name + '.sql'), self.version)
         fName = 'summariesWithStats'
         if foldIndex != None:
             fName = '%s.%02d.txt' % (fName, foldIndex)
         else:
             fName = '%s.txt' % fName
-        sListFile = open(fName, 'w')
+        sListFile = open(self.outputFilename(fName), 'w')
         for abstract in absList:
             if abstract.summaryStats.numberOfDetectedStats() > 0:
                 sListFile.write(abstract.id + '\n')
@@ -613,12 +784,16 @@ class RunConfiguration:
 
 
     def crossvalidate(self, inputPath, nFolds, statOut=None):
+        self.checkTraining()
+        self.activate()
         deleteAllXMLFiles(self.summaryPath)
         deleteAllModelFiles(self.mPath)
 
-        absList = abstractlist.AbstractList(inputPath, nFolds, sentenceFilter=sentencefilters.allSentences)
+        absList = abstractlist.AbstractList(inputPath, nFolds, sentenceFilter=sentencefilters.allSentences,
+                                            snapshotPath=self.snapshotPath,
+                                            nWorkers=self.nLoadWorkers)
 
-        svFile = open('specialvalues.txt', 'w')
+        svFile = open(self.outputFilename('specialvalues.txt'), 'w')
         for abstract in absList:
             svFile.write('---%s---\n' % abstract.id)
             for sentence in abstract.sentences:
@@ -645,18 +820,23 @@ class RunConfiguration:
             foldStats = statlist.StatList()
             self.trainOnAbstracts(trainAbstracts, foldStats)
             self.testOnAbstracts(testAbstracts, foldStats, foldIndex=i)
-            foldStats.write('stats.fold%d.txt' % i, ', ')
+            foldStats.write(self.outputFilename('stats.fold%d.txt' % i), ', ')
             for name, statList in foldStats.irStats.items():
                 statOut.addIRstats(name, statList[-1])  # only add final stats
+        self.finishRun()
 
 
     def crossvalidateEachComponent(self, inputPath, statOut):
         """ perform cross-validation """
         nFolds = 10  # 10-fold crossvalidation
+        self.checkTraining()
+        self.activate()
         deleteAllXMLFiles(self.summaryPath)
         deleteAllModelFiles(self.mPath)
 
-        absList = abstractlist.AbstractList(inputPath, nFolds, sentenceFilter=sentencefilters.allSentences)
+        absList = abstractlist.AbstractList(inputPath, nFolds, sentenceFilter=sentencefilters.allSentences,
+                                            snapshotPath=self.snapshotPath,
+                                            nWorkers=self.nLoadWorkers)
 
         for fTask in self.ruleFinderTasks:
             fTask.test(absList, statOut)
@@ -675,6 +855,7 @@ class RunConfiguration:
 
         absList.applySentenceFilter(self.conditionSentenceFilter)
         self.conditionFinderTask.crossval(absList, statOut)
+        self.featureStore.clear()
 
         # associate mentions and quantities
         absList.applySentenceFilter(sentencefilters.allSentences)
@@ -689,5 +870,6 @@ class RunConfiguration:
 
         # write summaries
         summaryList.writeXML(self.summaryPath, self.version)
-        summaryList.writeHTML('summaries.' + self.name + '.html')
+        summaryList.writeHTML(self.outputFilename('summaries.' + self.name + '.html'))
+        self.finishRun()
 
@@ -0,0 +1,175 @@
+#!/usr/bin/env python
+
+"""
+ Unit tests for reading abstracts from xml files
+"""
+
+__author__ = 'Rodney L. Summerscales'
+
+import os
+import tempfile
+import unittest
+import StringIO
+import xml.dom.minidom
+
+import abstract
+import xmlutil
+
+abstractXML = """<?xml version="1.0" encoding="utf-8"?>
+<abstract id="12345">
+  <PublicationInformation>
+    <Journal>
+      <Title>BMJ</Title>
+      <Year>2010</Year>
+    </Journal>
+    <Country>England</Country>
+  </PublicationInformation>
+  <title>
+    <sentence section="title" nlmCategory="TITLE">
+      <token id="0" text="Aspirin" lemma="aspirin" pos="NN"><gov type="root" idx="-1"/></token>
+      <token id="1" text="versus" pos="IN"><gov type="prep" idx="0"/></token>
+      <token id="2" text="placebo" pos="NN"><gov type="pobj" idx="1"/></token>
+      <token id="3" text="." pos="."/>
+      <parse>(ROOT (NP (NN Aspirin) (PP (IN versus) (NN placebo)) (. .)))</parse>
+    </sentence>
+  </title>
+  <body>
+    <sentence section="RESULTS" nlmCategory="RESULTS">
+      <token id="0" text="Mortality" lemma="mortality" pos="NN">
+        <gov type="nsubj" idx="1"/>
+        <annotation type="Outcome"><id>1</id></annotation>
+        <umls id="C0026565" score="1000" negated="false"><type>qnco</type><source>SNOMEDCT</source></umls>
+      </token>
+      <token id="1" text="was" lemma="be" pos="VBD">
+        <gov type="root" idx="-1"/>
+        <dep type="nsubj" idx="0"/>
+        <dep type="prep" specific="in" idx="4"/>
+      </token>
+      <token id="2" text="12" pos="CD"><annotation type="percentage"/><label type="eventrate"/></token>
+      <token id="3" text="in" pos="IN"/>
+      <token id="4" text="weeks" lemma="week" pos="NNS"><semantic>time</semantic></token>
+      <token id="5" text="." pos="."/>
+      <umlsChunk start="0" end="0"/>
+      <parse>(ROOT (S (NP (NN Mortality)) (VP (VBD was) (NP (CD 12)) (PP (IN in) (NNS weeks))) (. .)))</parse>
+    </sentence>
+  </body>
+</abstract>
+"""
+
+
+def writeAbstractFile(filename, xmlString=abstractXML):
+    """ write the xml of an abstract to a file """
+    file = open(filename, 'w')
+    file.write(xmlString)
+    file.close()
+
+
+def loadAbstract(xmlString=abstractXML, parser='iterparse'):
+    """ return the Abstract read from a temporary file holding given xml """
+    (fd, filename) = tempfile.mkstemp(suffix='.xml')
+    os.close(fd)
+    try:
+        writeAbstractFile(filename, xmlString)
+        return abstract.Abstract(filename, parser=parser)
+    finally:
+        os.remove(filename)
+
+
+def tokenInfo(token):
+    """ return the information read from xml for a token """
+    return (token.index, token.text, token.lemma, token.pos, token.specialValueType,
+            [(gov.index, gov.type, gov.specific, gov.token.index) for gov in token.governors],
+            [(dep.index, dep.type, dep.specific, dep.token.index) for dep in token.dependents],
+            sorted((a.type, sorted(a.attributes.items())) for a in token.annotations),
+            sorted((a.type, sorted(a.attributes.items())) for a in token.labels),
+            sorted(token.semanticTags),
+            [(uc.id, uc.score, sorted(uc.types), uc.inSnomed) for uc in token.umlsConcepts],
+            [(chunk.startIdx, chunk.endIdx) for chunk in token.umlsChunks],
+            token.parseTreeNode.type)
+
+
+def sentenceInfo(sentence):
+    """ return the information read from xml for a sentence """
+    return (sentence.index, sentence.section, sentence.nlmCategory,
+            sentence.parseTree.treebankString(),
+            [tokenInfo(token) for token in sentence],
+            [token.index for token in sentence.dependencyGraphRoot])
+
+
+class AbstractLoaderTest(unittest.TestCase):
+    def setUp(self):
+        (fd, self.filename) = tempfile.mkstemp(suffix='.xml')
+        os.close(fd)
+        writeAbstractFile(self.filename)
+
+    def tearDown(self):
+        os.remove(self.filename)
+
+    def testStreamingLoaderMatchesMinidom(self):
+        domAbstract = abstract.Abstract(self.filename, parser='minidom')
+        streamAbstract = abstract.Abstract(self.filename, parser='iterparse')
+
+        self.assertEqual(streamAbstract.id, '12345')
+        self.assertEqual(streamAbstract.id, domAbstract.id)
+        self.assertEqual(streamAbstract.publicationInformation.getJournal(), 'BMJ')
+        self.assertEqual(streamAbstract.publicationInformation.getCountry(),
+                         domAbstract.publicationInformation.getCountry())
+        for (domSentences, streamSentences) in [(domAbstract.titleSentences, streamAbstract.titleSentences),
+                                                (domAbstract.allSentences(), streamAbstract.allSentences())]:
+            self.assertEqual(len(streamSentences), 1)
+            self.assertEqual([sentenceInfo(s) for s in streamSentences],
+                             [sentenceInfo(s) for s in domSentences])
+
+    def testTokenValues(self):
+        streamAbstract = abstract.Abstract(self.filename)
+        tokens = streamAbstract.sentences[0].tokens
+        self.assertEqual(tokens[0].text, 'mortality')
+        self.assertTrue(tokens[0].hasAnnotation('outcome'))
+        self.assertEqual(tokens[0].getAnnotationAttribute('outcome', 'id'), '1')
+        self.assertTrue(tokens[2].isPercentage())
+        self.assertTrue(tokens[2].hasLabel('eventrate'))
+        self.assertEqual(tokens[-1].text, '-EOS-')
+        self.assertIs(tokens[1].dependents[1].token, tokens[4])
+
+    def testStreamingWriterMatchesDOM(self):
+        streamAbstract = abstract.Abstract(self.filename)
+        token = streamAbstract.sentences[0].tokens[3]
+        token.setLabelAttribute('group', 'name', 'a < b & "c"')
+        token.setLabelAttribute('group', 'empty', '')
+        token.addSemanticTag('x&y')
+
+        domOut = StringIO.StringIO()
+        xmlutil.writexml(streamAbstract.getXML(xml.dom.minidom.Document()), domOut)
+        streamOut = StringIO.StringIO()
+        streamAbstract.writeElement(xmlutil.XMLWriter(streamOut))
+        self.assertEqual(streamOut.getvalue(), domOut.getvalue())
+
+    def testWritingKeepsParseTreesUnbuilt(self):
+        streamAbstract = abstract.Abstract(self.filename)
+        out = StringIO.StringIO()
+        streamAbstract.writeElement(xmlutil.XMLWriter(out))
+        for sentence in streamAbstract.titleSentences + streamAbstract.sentences:
+            self.assertFalse('parseTree' in sentence.__dict__)
+
+        written = loadAbstract(out.getvalue())
+        self.assertEqual([sentenceInfo(sentence) for sentence in written.sentences],
+                         [sentenceInfo(sentence) for sentence in streamAbstract.sentences])
+
+    def testDirtyTracking(self):
+        streamAbstract = abstract.Abstract(self.filename)
+        self.assertFalse(streamAbstract.dirty)
+        self.assertFalse(streamAbstract.needsWriting(self.filename))
+        self.assertTrue(streamAbstract.needsWriting(self.filename + '.copy'))
+
+        streamAbstract.sentences[0].tokens[2].addLabel('group')
+        self.assertTrue(streamAbstract.dirty)
+        self.assertTrue(streamAbstract.needsWriting(self.filename))
+
+        streamAbstract.writeXML(self.filename)
+        self.assertFalse(streamAbstract.needsWriting(self.filename))
+        streamAbstract.titleSentences[0].tokens[0].lemma = 'aspirin2'
+        self.assertTrue(streamAbstract.needsWriting(self.filename))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+
+"""
+ Unit tests for snapshots of loaded abstracts
+"""
+
+__author__ = 'Rodney L. Summerscales'
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import abstract
+import abstractcache
+from test_abstract import abstractXML
+
+
+class AbstractCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.snapshotPath = os.path.join(self.path, 'snapshots')
+        self.filenames = []
+        for id in ['111', '222']:
+            filename = os.path.join(self.path, id + '.xml')
+            self.writeFile(filename, abstractXML.replace('12345', id))
+            self.filenames.append(filename)
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def writeFile(self, filename, contents):
+        file = open(filename, 'w')
+        file.write(contents)
+        file.close()
+
+    def loadAll(self):
+        """ read the xml files the way AbstractList does with a snapshot
+            directory and return (abstracts, names of the files that were parsed) """
+        cache = abstractcache.AbstractCache(self.snapshotPath)
+        abstracts = []
+        parsed = []
+        for filename in self.filenames:
+            abs = cache.load(filename)
+            if abs is None:
+                stamp = cache.fileStamp(filename)
+                abs = abstract.Abstract(filename)
+                cache.save(filename, abs, stamp)
+                parsed.append(filename)
+            abstracts.append(abs)
+        self.assertEqual(cache.nMisses, len(parsed))
+        self.assertEqual(cache.nHits, len(self.filenames) - len(parsed))
+        return (abstracts, parsed)
+
+    def testUnchangedFilesAreNotParsed(self):
+        (abstracts, parsed) = self.loadAll()
+        self.assertEqual(parsed, self.filenames)
+        (abstracts, parsed) = self.loadAll()
+        self.assertEqual(parsed, [])
+        self.assertEqual([abs.id for abs in abstracts], ['111', '222'])
+        self.assertEqual(abstracts[0].sentences[0].tokens[0].text, 'mortality')
+
+        # touching a file without changing it does not invalidate its snapshot
+        os.utime(self.filenames[0], (0, 0))
+        (abstracts, parsed) = self.loadAll()
+        self.assertEqual(parsed, [])
+
+    def testEditedFileIsParsedAgain(self):
+        self.loadAll()
+        self.writeFile(self.filenames[1], abstractXML.replace('12345', '222')
+                       .replace('<Title>BMJ</Title>', '<Title>Lancet</Title>'))
+        (abstracts, parsed) = self.loadAll()
+        self.assertEqual(parsed, [self.filenames[1]])
+        self.assertEqual(abstracts[0].publicationInformation.getJournal(), 'BMJ')
+        self.assertEqual(abstracts[1].publicationInformation.getJournal(), 'Lancet')
+        (abstracts, parsed) = self.loadAll()
+        self.assertEqual(parsed, [])
+
+    def testLoaderVersionInvalidatesAllSnapshots(self):
+        self.loadAll()
+        loaderVersion = abstract.Abstract.loaderVersion
+        abstract.Abstract.loaderVersion = loaderVersion + 1
+        try:
+            (abstracts, parsed) = self.loadAll()
+            self.assertEqual(parsed, self.filenames)
+            (abstracts, parsed) = self.loadAll()
+            self.assertEqual(parsed, [])
+        finally:
+            abstract.Abstract.loaderVersion = loaderVersion
+        (abstracts, parsed) = self.loadAll()
+        self.assertEqual(parsed, self.filenames)
+
+
+if __name__ == '__main__':
+    unittest.main()
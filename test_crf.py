@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+
+"""
+ Unit tests for the in process linear-chain CRF
+"""
+
+__author__ = 'Rodney L. Summerscales'
+
+import itertools
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy
+
+import crf
+import featureindex
+from test_abstract import loadAbstract
+
+
+def randomMatrix(nRows, nFeatures):
+    """ return FeatureMatrix with 1-3 random features in each of nRows rows """
+    indptr = numpy.concatenate([[0], numpy.cumsum(numpy.random.randint(1, 4, nRows))])
+    indices = numpy.random.randint(0, nFeatures, indptr[-1])
+    return featureindex.FeatureMatrix(numpy.arange(nRows), indptr, indices,
+                                      numpy.zeros(len(indices), dtype=numpy.int32))
+
+
+class LinearChainCRFTest(unittest.TestCase):
+    nFeatures = 7
+    labels = ['other', 'outcome', 'group']
+
+    def setUp(self):
+        numpy.random.seed(0)
+        matrices = [randomMatrix(numpy.random.randint(1, 6), self.nFeatures) for i in range(9)]
+        matrices.append(randomMatrix(0, self.nFeatures))
+        # several chunks, one of them with sequences of different lengths
+        self.batch = crf.SequenceBatch(matrices, numpy.arange(self.nFeatures), maxChunkRows=8)
+        nLabels = len(self.labels)
+        self.allowed = numpy.ones((nLabels, nLabels), dtype=bool)
+        self.allowed[2, 1] = False
+        rowLabels = numpy.random.randint(0, nLabels, self.batch.nRows)
+        for row in range(1, self.batch.nRows):
+            if row not in self.batch.starts and rowLabels[row - 1] == 2 and rowLabels[row] == 1:
+                rowLabels[row] = 0
+        self.rowLabels = rowLabels
+        self.model = crf.LinearChainCRF(self.labels, ['f%d' % i for i in range(self.nFeatures)],
+                                        self.allowed)
+        nWeights = self.nFeatures * nLabels
+        self.parameters = numpy.random.randn(nWeights + nLabels * nLabels) * 0.5
+        self.parameters[nWeights:][~self.allowed.ravel()] = 0
+        self.model.weights = self.parameters[:nWeights].reshape((self.nFeatures, nLabels))
+        self.model.transitions = self.parameters[nWeights:].reshape((nLabels, nLabels))
+
+    def allLabelings(self, s):
+        """ return list of (score, label ids) of every possible labeling of
+            sequence s, best first """
+        transitions = self.model.transitionScores()
+        emissions = self.batch.emissions(self.model.weights)
+        start = self.batch.starts[s]
+        labelings = []
+        for path in itertools.product(range(len(self.labels)), repeat=self.batch.lengths[s]):
+            previous = (0,) + path[:-1]
+            score = sum([transitions[previous[t], path[t]] + emissions[start + t, path[t]]
+                         for t in range(len(path))])
+            if score > -numpy.inf:
+                labelings.append((score, list(path)))
+        labelings.sort(key=lambda labeling: -labeling[0])
+        return labelings
+
+    def testChunksCoverSequences(self):
+        self.assertEqual(len(self.batch), 9)
+        self.assertTrue(len(self.batch.chunks) > 1)
+        rows = numpy.concatenate([rows[active] for (ids, rows, active) in self.batch.chunks])
+        self.assertEqual(sorted(rows.tolist()), range(self.batch.nRows))
+
+    def testGradient(self):
+        function = self.model.negativeLogLikelihood(self.batch, self.rowLabels, 1.0)
+        (value, gradient) = function(self.parameters)
+        epsilon = 1e-5
+        numeric = numpy.zeros(len(self.parameters))
+        for i in range(len(self.parameters)):
+            step = numpy.zeros(len(self.parameters))
+            step[i] = epsilon
+            numeric[i] = (function(self.parameters + step)[0]
+                          - function(self.parameters - step)[0]) / (2 * epsilon)
+        self.assertTrue(numpy.abs(numeric - gradient).max() < 1e-6)
+
+        # the value is the negative log probability of the labels plus the prior
+        logProb = 0
+        for s in range(len(self.batch)):
+            labelings = self.allLabelings(s)
+            logZ = crf.logSumExp(numpy.array([score for (score, path) in labelings]), 0)
+            start = self.batch.starts[s]
+            path = self.rowLabels[start:start + self.batch.lengths[s]].tolist()
+            logProb += [score for (score, p) in labelings if p == path][0] - logZ
+        prior = self.parameters.dot(self.parameters) / 2
+        self.assertAlmostEqual(value, prior - logProb)
+
+    def testNBest(self):
+        transitions = self.model.transitionScores()
+        emissions = self.batch.emissions(self.model.weights)
+        for s in range(len(self.batch)):
+            start = self.batch.starts[s]
+            nBest = self.model.nBest(emissions[start:start + self.batch.lengths[s]], transitions, 5)
+            expected = self.allLabelings(s)[:5]
+            self.assertEqual([path for (score, path) in nBest], [path for (score, path) in expected])
+            for ((score, path), (expectedScore, expectedPath)) in zip(nBest, expected):
+                self.assertAlmostEqual(score, expectedScore)
+
+    def testLabelProbabilities(self):
+        k = 3
+        rowLabels = self.model.label(self.batch, k)
+        self.assertEqual(len(rowLabels), self.batch.nRows)
+        for s in range(len(self.batch)):
+            labelings = self.allLabelings(s)
+            scores = numpy.array([score for (score, path) in labelings])
+            probs = numpy.exp(scores - crf.logSumExp(scores, 0))
+            start = self.batch.starts[s]
+            for t in range(self.batch.lengths[s]):
+                marginals = numpy.zeros(len(self.labels))
+                for (prob, (score, path)) in zip(probs, labelings):
+                    marginals[path[t]] += prob
+                expected = [(path[t], marginals[path[t]], prob)
+                            for (prob, (score, path)) in zip(probs[:k], labelings[:k])]
+                self.assertEqual(len(rowLabels[start + t]), len(expected))
+                for (found, wanted) in zip(rowLabels[start + t], expected):
+                    self.assertEqual(found[0], wanted[0])
+                    self.assertAlmostEqual(found[1], wanted[1])
+                    self.assertAlmostEqual(found[2], wanted[2])
+
+
+class CRFTokenClassifierTest(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.absList = [loadAbstract()]
+        for token in self.absList[0].sentences[0]:
+            token.features = {'lexical': set(['t_' + token.text.lower(), 'pos_' + token.pos])}
+        self.modelFilename = os.path.join(self.path, 'outcome.model')
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def testTrainAndTest(self):
+        classifier = crf.CRFTokenClassifier(nIterations=50, topK=2, writeLabels=True)
+        classifier.workPath = self.path
+        classifier.train(self.absList, self.modelFilename, ['outcome'])
+        self.assertTrue(os.path.exists(self.modelFilename))
+        self.assertFalse(os.path.exists(classifier.featureFilterFilename(self.modelFilename)))
+
+        # a new classifier only needs the model file
+        classifier = crf.CRFTokenClassifier(topK=2, writeLabels=True)
+        labelFilename = os.path.join(self.path, 'outcome.labels')
+        classifier.test(self.absList, self.modelFilename, labelFilename, ['outcome'])
+        fromFile = classifier.readNBestLabels(labelFilename)
+        labels = classifier.readLabelFile(labelFilename, ['outcome'])
+        self.assertEqual(len(labels), len(self.absList[0].sentences[0]))
+        self.assertEqual([tokenLabels[0].label for tokenLabels in labels],
+                         ['outcome', 'other', 'other', 'other', 'other', 'other'])
+        for (tokenLabels, fileLabels) in zip(labels, fromFile):
+            self.assertEqual(len(tokenLabels), 2)
+            self.assertTrue(tokenLabels[0].sequenceProb > tokenLabels[1].sequenceProb)
+            self.assertTrue(tokenLabels[0].prob > 0.5)
+            self.assertEqual([(tLabel.label, tLabel.prob, tLabel.sequenceProb) for tLabel in tokenLabels],
+                             [(tLabel.label, tLabel.prob, tLabel.sequenceProb) for tLabel in fileLabels])
+
+    def testSelectedFeaturesOnlyInIndex(self):
+        self.absList[0].sentences[0].tokens[4].features['lexical'].add('pos_NN')
+        classifier = crf.CRFTokenClassifier(nIterations=5, minFeatureCount=2)
+        classifier.workPath = self.path
+        classifier.train(self.absList, self.modelFilename, ['outcome'])
+        # only the part of speech of Mortality and weeks occurs twice
+        self.assertEqual(classifier.featureFilter.features, {'lexical': set(['pos_NN'])})
+        self.assertEqual(classifier.featureIndex.features.strings, ['pos_NN'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+
+"""
+ Unit tests for computing finder features with numpy arrays
+"""
+
+__author__ = 'Rodney L. Summerscales'
+
+import unittest
+
+import featureengine
+import mentionfinder
+import numberfinder
+from test_abstract import loadAbstract
+
+# sentence with parentheses, several numbers and more semantic tags
+numbersXML = """<?xml version="1.0" encoding="utf-8"?>
+<abstract id="23456">
+  <title>
+    <sentence section="title" nlmCategory="TITLE">
+      <token id="0" text="Aspirin" lemma="aspirin" pos="NN"><gov type="root" idx="-1"/></token>
+      <token id="1" text="trial" lemma="trial" pos="NN"><gov type="dep" idx="0"/></token>
+      <parse>(ROOT (NP (NN Aspirin) (NN trial)))</parse>
+    </sentence>
+  </title>
+  <body>
+    <sentence section="RESULTS" nlmCategory="RESULTS">
+      <token id="0" text="Of" lemma="of" pos="IN"/>
+      <token id="1" text="120" pos="CD"><gov type="num" idx="2"/><annotation type="gs"/></token>
+      <token id="2" text="patients" lemma="patient" pos="NNS">
+        <gov type="prep_of" idx="11"/>
+        <dep type="num" idx="1"/>
+        <dep type="partmod" idx="7"/>
+        <semantic>people</semantic>
+      </token>
+      <token id="3" text="(" pos="-LRB-"/>
+      <token id="4" text="45" pos="CD"><annotation type="percentage"/></token>
+      <token id="5" text="%" lemma="%" pos="NN"><semantic>measurement</semantic></token>
+      <token id="6" text=")" pos="-RRB-"/>
+      <token id="7" text="given" lemma="give" pos="VBN">
+        <gov type="partmod" idx="2"/>
+        <dep type="dobj" idx="8"/>
+      </token>
+      <token id="8" text="aspirin" lemma="aspirin" pos="NN">
+        <gov type="dobj" idx="7"/>
+        <annotation type="group"><id>1</id></annotation>
+        <semantic>drug</semantic>
+        <semantic>group</semantic>
+      </token>
+      <token id="9" text="," pos=","/>
+      <token id="10" text="12" pos="CD"><gov type="nsubj" idx="11"/><annotation type="on"/></token>
+      <token id="11" text="died" lemma="die" pos="VBD">
+        <gov type="root" idx="-1"/>
+        <dep type="prep_of" idx="2"/>
+        <dep type="nsubj" idx="10"/>
+        <dep type="prep_versus" idx="13"/>
+        <annotation type="outcome"><id>2</id></annotation>
+        <semantic>outcome</semantic>
+      </token>
+      <token id="12" text="versus" lemma="versus" pos="IN"/>
+      <token id="13" text="20" pos="CD"><gov type="prep_versus" idx="11"/><annotation type="on"/></token>
+      <token id="14" text="(" pos="-LRB-"/>
+      <token id="15" text="16.7" pos="CD"><annotation type="percentage"/><annotation type="eventrate"/></token>
+      <token id="16" text="%" lemma="%" pos="NN"/>
+      <token id="17" text=")" pos="-RRB-"/>
+      <token id="18" text="with" lemma="with" pos="IN"/>
+      <token id="19" text="placebo" lemma="placebo" pos="NN">
+        <annotation type="group"><id>2</id></annotation>
+        <semantic>drug</semantic>
+      </token>
+      <token id="20" text="." pos="."/>
+      <parse>(ROOT (S (PP (IN Of) (NP (NP (CD 120) (NNS patients)) (PRN (-LRB- -LRB-) (NP (CD 45) (NN %)) (-RRB- -RRB-)) (VP (VBN given) (NP (NN aspirin))))) (, ,) (NP (CD 12)) (VP (VBD died) (PP (IN versus) (NP (NP (CD 20)) (PRN (-LRB- -LRB-) (NP (CD 16.7) (NN %)) (-RRB- -RRB-)) (PP (IN with) (NP (NN placebo)))))) (. .)))</parse>
+    </sentence>
+  </body>
+</abstract>
+"""
+
+
+class FeatureEngineTest(unittest.TestCase):
+    ruleTypes = ['time', 'age', 'primary_outcome']
+
+    def setUp(self):
+        self.absList = [loadAbstract(), loadAbstract(numbersXML)]
+        # label features need tokens with rule based labels
+        self.absList[0].sentences[0].tokens[4].addLabel('time')
+        self.absList[1].sentences[0].tokens[2].addLabel('age')
+        self.absList[1].sentences[0].tokens[11].addLabel('primary_outcome')
+
+    def checkFinder(self, finder, numberToken):
+        for mode in ['train', 'test']:
+            differences = featureengine.compareFeatures(finder, self.absList, mode)
+            self.assertEqual([(token.index, family, sorted(a), sorted(b))
+                              for (token, family, a, b) in differences], [])
+            self.assertTrue(len(self.absList[0].sentences[0].tokens[2].features) > 0)
+            self.assertTrue(len(self.absList[1].sentences[0].tokens[numberToken].features) > 0)
+
+    def testMentionFinder(self):
+        self.checkFinder(mentionfinder.MentionFinder(['outcome'], None, labelFeatures=self.ruleTypes), 11)
+
+    def testNumberFinder(self):
+        self.checkFinder(numberfinder.NumberFinder(['eventrate'], None, labelFeatures=self.ruleTypes), 15)
+        # group sizes and outcome numbers are integers that are not percentages
+        self.absList[0].sentences[0].tokens[2].removeAnnotation('percentage')
+        self.checkFinder(numberfinder.NumberFinder(['on', 'gs'], None), 13)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+
+"""
+ Unit tests for feature ids, feature matrices and feature selection
+"""
+
+__author__ = 'Rodney L. Summerscales'
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import featureindex
+from test_abstract import loadAbstract
+
+
+class FeatureFilterTest(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.sentence = loadAbstract().sentences[0]
+        # 'shared' is in both families and in every row
+        for token in self.sentence:
+            token.features = {'lexical': set(['t_' + token.text, 'shared']),
+                              'tContext': set(['shared', 'parity_%d' % (token.index % 2)])}
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def keptFeatures(self, matrix, index):
+        """ return list of the sorted (family, feature) pairs of each row of a matrix """
+        return [sorted(zip([index.familyName(id) for id in matrix.rowFamilies(row)],
+                           index.featureStrings(matrix.row(row))))
+                for row in range(len(matrix))]
+
+    def testFilterIsIndependentOfFeatureIds(self):
+        index = featureindex.FeatureIndex()
+        featureFilter = featureindex.FeatureFilter(minCount=2, maxFeaturesPerFamily=2)
+        featureFilter.fit([index.featureMatrix(self.sentence)], index)
+        self.assertEqual(featureFilter.features,
+                         {'lexical': set(['shared']), 'tContext': set(['shared', 'parity_0'])})
+        self.assertEqual(featureFilter.counts, {'lexical': (1, 7), 'tContext': (2, 3)})
+        expected = self.keptFeatures(featureFilter.apply(index.featureMatrix(self.sentence), index), index)
+        self.assertEqual(expected[:2], [[('lexical', 'shared'), ('tContext', 'parity_0'),
+                                         ('tContext', 'shared')],
+                                        [('lexical', 'shared'), ('tContext', 'shared')]])
+
+        filename = os.path.join(self.path, 'model.features')
+        featureFilter.save(filename)
+        self.assertEqual(featureindex.loadFeatureFilter(filename + '.missing'), None)
+        loaded = featureindex.loadFeatureFilter(filename)
+        self.assertEqual(loaded.features, featureFilter.features)
+        self.assertEqual(loaded.counts, featureFilter.counts)
+
+        # the ids of another index are assigned in a different order
+        otherIndex = featureindex.FeatureIndex()
+        otherIndex.families.id('tContext')
+        otherIndex.features.id('parity_1')
+        keys = loaded.keys(otherIndex)
+        self.assertEqual(len(otherIndex), 3)
+        matrix = otherIndex.featureMatrix(self.sentence, addFeatures=False)
+        self.assertEqual(len(otherIndex), 3)
+        self.assertEqual(self.keptFeatures(loaded.apply(matrix, otherIndex), otherIndex), expected)
+
+        # the kept features keep their ids when the index grows
+        otherIndex.featureMatrix(self.sentence)
+        self.assertIs(loaded.keys(otherIndex), keys)
+        matrix = otherIndex.featureMatrix(self.sentence, lambda token: token.index != 1)
+        self.assertEqual(self.keptFeatures(loaded.apply(matrix, otherIndex), otherIndex),
+                         expected[:1] + expected[2:])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+
+"""
+ Unit tests for token features kept in a feature directory
+"""
+
+__author__ = 'Rodney L. Summerscales'
+
+import os
+import resource
+import shutil
+import tempfile
+import unittest
+
+import numpy
+
+import featureindex
+import featurestore
+from test_abstract import loadAbstract
+
+
+class FeatureStoreTest(unittest.TestCase):
+    configuration = ('MentionFinder', 'train', ('time',), True, 3, 'registry words')
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.featurePath = os.path.join(self.path, 'features')
+        self.abstract = loadAbstract()
+        self.sentence = self.abstract.sentences[0]
+        self.setFeatures()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def setFeatures(self):
+        """ give each token of the sentence features computed from its text and lemma """
+        for token in self.sentence:
+            token.features = {'lexical': set(['t_' + token.text, 'lemma_' + token.lemma]),
+                              'semantic': set([]),
+                              'tContext': set(['tcontext_%d_%s' % (i - token.index, other.lemma)
+                                               for (i, other) in enumerate(self.sentence.tokens)
+                                               if i != token.index])}
+        self.expected = [token.features for token in self.sentence]
+
+    def storeFeatures(self):
+        store = featurestore.FeatureStore(self.featurePath)
+        store.put(self.sentence, self.configuration, self.sentence.tokens)
+        store.flush()
+
+    def loadFeatures(self, configuration=None):
+        """ return the features a new store reads from the directory for the
+            tokens of the sentence (None if they are not in the directory) """
+        if configuration is None:
+            configuration = self.configuration
+        store = featurestore.FeatureStore(self.featurePath)
+        features = store.get(self.sentence, configuration, self.sentence.tokens)
+        if features is not None:
+            self.assertEqual(store.diskHits, 1)
+        return features
+
+    def testFeaturesAreReadBack(self):
+        self.storeFeatures()
+        self.assertEqual(self.loadFeatures(), self.expected)
+
+    def testChangesInvalidateFeatures(self):
+        self.storeFeatures()
+        self.assertEqual(self.loadFeatures(), self.expected)
+        self.assertEqual(self.loadFeatures(self.configuration[:-1] + ('other words',)), None)
+
+        self.abstract.id = '54321'
+        self.assertEqual(self.loadFeatures(), None)
+        self.abstract.id = '12345'
+        self.assertEqual(self.loadFeatures(), self.expected)
+
+        # a token change gives the sentence another digest
+        self.sentence[4].lemma = 'month'
+        self.assertEqual(self.loadFeatures(), None)
+        self.sentence[4].lemma = 'week'
+        self.assertEqual(self.loadFeatures(), self.expected)
+
+    def testNewFeaturesAreAppended(self):
+        self.storeFeatures()
+        filename = featurestore.FeatureDirectory(self.featurePath).filename('12345', self.configuration)
+        file = open(filename, 'rb')
+        contents = file.read()
+        file.close()
+        oldExpected = self.expected
+
+        self.sentence[4].lemma = 'month'
+        self.setFeatures()
+        self.storeFeatures()
+        file = open(filename, 'rb')
+        newContents = file.read()
+        file.close()
+        self.assertTrue(newContents.startswith(contents) and len(newContents) > len(contents))
+        directory = featurestore.FeatureDirectory(self.featurePath)
+        self.assertEqual(len(directory.readFile('12345', self.configuration).records), 2)
+        self.assertEqual(self.loadFeatures(), self.expected)
+        self.sentence[4].lemma = 'week'
+        self.assertEqual(self.loadFeatures(), oldExpected)
+
+        # a partly written record is ignored
+        file = open(filename, 'ab')
+        file.write(contents[:len(contents) / 2])
+        file.close()
+        self.assertEqual(self.loadFeatures(), oldExpected)
+
+    def checkFeatureMatrix(self, index, tokenFilter=None, addFeatures=True):
+        """ check that the matrix built from the stored features has the same rows
+            as the one built from the feature sets of the tokens """
+        expected = index.featureMatrix(self.sentence, tokenFilter, addFeatures)
+        matrix = featurestore.featureMatrix(index, self.sentence, tokenFilter, addFeatures)
+        self.assertEqual(matrix.tokenIndices.tolist(), expected.tokenIndices.tolist())
+        for row in range(len(expected)):
+            self.assertEqual(sorted(zip(matrix.row(row).tolist(), matrix.rowFamilies(row).tolist())),
+                             sorted(zip(expected.row(row).tolist(), expected.rowFamilies(row).tolist())))
+
+    def testFeatureMatrixUsesStoredFeatures(self):
+        self.storeFeatures()
+        store = featurestore.FeatureStore(self.featurePath)
+        for (token, features) in zip(self.sentence, store.get(self.sentence, self.configuration,
+                                                              self.sentence.tokens)):
+            token.features = dict(features)
+        stored = self.sentence.storedFeatures[2][self.configuration][3]
+        self.assertIs(stored.matrix.indices.base, stored.record.array)
+        self.sentence[0].features['acronym'] = set(['acronym_feature'])
+        self.sentence[1].features['lexical'] = set(['t_is'])
+
+        index = featureindex.FeatureIndex()
+        self.checkFeatureMatrix(index)
+        self.checkFeatureMatrix(index, lambda token: token.index % 2 == 0)
+        index = featureindex.FeatureIndex()
+        index.features.id('t_is')
+        index.features.id('lemma_week')
+        self.checkFeatureMatrix(index, addFeatures=False)
+        self.assertEqual(len(index), 2)
+
+    def testReadingFilesLeavesNoFilesOpen(self):
+        nFiles = 64
+        for i in range(nFiles):
+            self.abstract.id = str(i)
+            self.storeFeatures()
+        (soft, hard) = resource.getrlimit(resource.RLIMIT_NOFILE)
+        nOpen = len(os.listdir('/proc/self/fd'))
+        resource.setrlimit(resource.RLIMIT_NOFILE, (nOpen + nFiles / 4, hard))
+        try:
+            directory = featurestore.FeatureDirectory(self.featurePath)
+            featureFiles = [directory.readFile(str(i), self.configuration) for i in range(nFiles)]
+        finally:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (soft, hard))
+        self.assertEqual([len(featureFile.records) for featureFile in featureFiles], [1] * nFiles)
+
+        store = featurestore.FeatureStore(self.featurePath)
+        self.assertEqual(store.get(self.sentence, self.configuration, self.sentence.tokens), self.expected)
+        self.assertIsNot(self.sentence.storedFeatures, None)
+        store.clear()
+        self.assertIs(self.sentence.storedFeatures, None)
+
+
+if __name__ == '__main__':
+    unittest.main()
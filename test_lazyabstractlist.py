@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+
+"""
+ Unit tests for lists of abstracts that are loaded on demand
+"""
+
+__author__ = 'Rodney L. Summerscales'
+
+import os
+import glob
+import shutil
+import tempfile
+import unittest
+
+import abstractlist
+import lazyabstractlist
+from test_abstract import abstractXML, writeAbstractFile
+
+
+class LazyAbstractListTest(unittest.TestCase):
+    ids = ['111', '222', '333', '444']
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.spillPath = os.path.join(self.path, 'spill')
+        for id in self.ids:
+            writeAbstractFile(os.path.join(self.path, id + '.xml'), abstractXML.replace('12345', id))
+        # room for one abstract at a time
+        self.absList = lazyabstractlist.LazyAbstractList(self.path, loadRegistries=False,
+                                                         maxTokens=1, spillPath=self.spillPath)
+
+    def tearDown(self):
+        self.absList.close()
+        shutil.rmtree(self.path)
+
+    def spillFiles(self):
+        return glob.glob(os.path.join(self.spillPath, '*.spill'))
+
+    def testSameOrderAsAbstractList(self):
+        absList = abstractlist.AbstractList(self.path, loadRegistries=False)
+        ids = [abs.id for abs in absList]
+        self.assertEqual(sorted(ids), self.ids)
+        self.assertEqual(len(self.absList), len(ids))
+        self.assertEqual([abs.id for abs in self.absList], ids)
+        self.assertEqual([self.absList[i].id for i in range(len(ids))], ids)
+        self.assertEqual(self.absList[-1].id, ids[-1])
+        self.assertEqual(self.absList.numberLoaded(), 1)
+        self.assertRaises(IndexError, self.absList.__getitem__, len(ids))
+
+    def testStateSurvivesEviction(self):
+        abs = self.absList[0]
+        abs.sentences[0].tokens[3].addLabel('group')
+        abs.sentences[0].templates = 'templates'
+        abs = self.absList[1]
+        abs.sentences[0].tokens[0].features = {'lexical': set(['t_mortality'])}
+        abs = self.absList[2]
+        del abs
+
+        # the third abstract did not change, only the first two are written
+        for abs in self.absList:
+            pass
+        self.assertEqual(len(self.spillFiles()), 2)
+        self.assertTrue(self.absList[0].sentences[0].tokens[3].hasLabel('group'))
+        self.assertEqual(self.absList[0].sentences[0].templates, 'templates')
+        self.assertEqual(self.absList[1].sentences[0].tokens[0].features,
+                         {'lexical': set(['t_mortality'])})
+        self.assertFalse(self.absList[2].sentences[0].tokens[3].hasLabel('group'))
+        self.assertEqual(self.absList.numberLoaded(), 1)
+
+    def testSentenceFilterSurvivesEviction(self):
+        self.absList[0].sentences[0].tokens[3].addLabel('group')
+        self.absList.applySentenceFilter(lambda sentence: False)
+        self.assertEqual([len(abs.sentences) for abs in self.absList], [0] * len(self.ids))
+        self.absList.applySentenceFilter(lambda sentence: sentence.section == 'RESULTS')
+        self.assertEqual([len(abs.sentences) for abs in self.absList], [1] * len(self.ids))
+        self.assertTrue(self.absList[0].sentences[0].tokens[3].hasLabel('group'))
+
+    def testRemoveEvictedAbstract(self):
+        ids = [abs.id for abs in self.absList]
+        first = self.absList[0]
+        second = self.absList[1]
+        self.assertEqual(self.absList.numberLoaded(), 1)
+        self.absList.remove(first)
+        self.assertEqual([abs.id for abs in self.absList], ids[1:])
+        self.assertTrue(self.absList[0] is second)
+        self.absList.remove(second)
+        self.assertEqual(len(self.absList), 2)
+        self.assertRaises(ValueError, self.absList.remove, first)
+        self.assertRaises(TypeError, self.absList.__setitem__, 0, first)
+
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+
+"""
+ Unit tests for mention finder features
+"""
+
+__author__ = 'Rodney L. Summerscales'
+
+import unittest
+
+import featurestore
+import mentionfinder
+import numberfinder
+from test_abstract import loadAbstract
+
+
+class LabelFeatureTest(unittest.TestCase):
+    ruleTypes = ['time', 'age', 'primary_outcome']
+
+    def setUp(self):
+        self.absList = [loadAbstract()]
+        self.sentence = self.absList[0].sentences[0]
+
+    def computeFeatures(self, finder, mode):
+        """ return dict mapping token index -> features computed by a finder for
+            the tokens that get features. acronym features are left out, they
+            are never stored. """
+        for token in self.sentence:
+            token.features = {}
+        finder.computeFeatures(self.absList, mode)
+        tokenFeatures = {}
+        for token in self.sentence:
+            if len(token.features) > 0:
+                tokenFeatures[token.index] = dict([(family, features) for (family, features)
+                                                   in token.features.items() if family != 'acronym'])
+        return tokenFeatures
+
+    def checkLabelChanges(self, finder):
+        """ change the rule based labels of some tokens and check that updating
+            the label dependent features gives the features computed again """
+        for mode in ['train', 'test']:
+            for token in self.sentence:
+                token.removeAllLabels()
+            self.sentence[4].addLabel('time')
+            self.sentence[0].addLabel('primary_outcome')
+            oldLabels = featurestore.labelState(self.sentence)
+            stored = self.computeFeatures(finder, mode)
+
+            self.sentence[4].removeLabel('time')
+            self.sentence[3].addLabel('age')
+            self.sentence[2].addLabel('time')
+            self.sentence[0].removeLabel('primary_outcome')
+            self.sentence[1].addLabel('primary_outcome')
+            changed = featurestore.changedLabels(oldLabels, featurestore.labelState(self.sentence))
+            self.assertEqual(changed, [0, 1, 2, 3, 4])
+            expected = self.computeFeatures(finder, mode)
+            if mode == 'test':
+                self.assertNotEqual(stored, expected)
+            updated = finder.updateLabelFeatures(self.sentence, mode, stored, changed)
+            self.assertEqual(updated, expected)
+
+    def testMentionFinder(self):
+        self.checkLabelChanges(mentionfinder.MentionFinder(['group'], None, labelFeatures=self.ruleTypes))
+
+    def testNumberFinder(self):
+        self.checkLabelChanges(numberfinder.NumberFinder(['eventrate'], None, labelFeatures=self.ruleTypes))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+
+"""
+ Unit tests for building parse trees from treebank strings
+"""
+
+__author__ = 'Rodney L. Summerscales'
+
+import unittest
+import parsetree
+import sentencetoken
+
+
+parseString = '(ROOT (S (NP (DT The) (NNS patients)) (VP (VBD improved) ' \
+              '(PP (IN in) (NP (CD 12) (NNS weeks)))) (. .)))'
+
+
+def treeInfo(node):
+    """ return the type, text and children of each node in a tree """
+    return (node.type, node.text, [treeInfo(child) for child in node.childNodes])
+
+
+class ParseTreeTest(unittest.TestCase):
+    def testSinglePassParserMatchesParse(self):
+        oldRoot = parsetree.ParseTreeNode()
+        [oldTokenNodes, rest] = oldRoot.parse(parseString)
+        newRoot = parsetree.ParseTreeNode()
+        newTokenNodes = newRoot.parseTreebankString(parseString)
+
+        self.assertEqual(treeInfo(newRoot), treeInfo(oldRoot))
+        self.assertEqual([treeInfo(node) for node in newTokenNodes],
+                         [treeInfo(node) for node in oldTokenNodes])
+
+    def testTokenSpans(self):
+        tokens = [sentencetoken.Token(text) for text in
+                  ['the', 'patients', 'improved', 'in', '12', 'weeks', '.']]
+        root = parsetree.ParseTreeNode()
+        root.buildParseTree(parseString, tokens)
+
+        vp = root.childNodes[0].childNodes[1]
+        self.assertEqual(vp.type, 'VP')
+        self.assertEqual([node.token for node in vp.tokenNodes()], tokens[2:6])
+        self.assertIs(vp.firstToken(), tokens[2])
+        self.assertIs(vp.lastToken(), tokens[5])
+        self.assertEqual(vp.tokenString(), 'improved in 12 weeks')
+        self.assertEqual(root.tokenString(), 'the patients improved in 12 weeks .')
+        self.assertIs(tokens[0].parseTreeNode.parent.firstToken(), tokens[0])
+
+    def testDeepTree(self):
+        depth = 2000
+        deepString = '(ROOT ' + '(S (NN x) ' * (depth - 1) + '(NN x)' + ')' * depth
+        root = parsetree.ParseTreeNode()
+        tokenNodes = root.parseTreebankString(deepString)
+        self.assertEqual(len(tokenNodes), depth)
+        self.assertEqual(len(root.tokenNodes()), depth)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+
+"""
+ Unit tests for the scratch directories of runs
+"""
+
+__author__ = 'Rodney L. Summerscales'
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import rundirectory
+
+
+class RunDirectoryTest(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.root = os.path.join(self.path, 'runs')
+
+    def tearDown(self):
+        rundirectory.activate(None)
+        shutil.rmtree(self.path)
+
+    def testCreatedWhenActivated(self):
+        runs = [rundirectory.RunDirectory(self.root, 'train/test') for i in range(2)]
+        self.assertNotEqual(runs[0].path, runs[1].path)
+        self.assertEqual(os.path.dirname(runs[0].path), self.root)
+        self.assertTrue(os.path.basename(runs[0].path).startswith('train_test.'))
+        self.assertFalse(os.path.exists(self.root))
+
+        rundirectory.activate(runs[0])
+        self.assertTrue(os.path.isdir(runs[0].path))
+        self.assertFalse(os.path.exists(runs[1].path))
+        self.assertEqual(rundirectory.outputFilename('stats.txt'), os.path.join(runs[0].path, 'stats.txt'))
+        filename = rundirectory.workFilename('features.txt')
+        self.assertEqual(filename, os.path.join(runs[0].workPath, 'features.txt'))
+        self.assertTrue(os.path.isdir(runs[0].workPath))
+
+        runs[0].finish()
+        self.assertFalse(os.path.exists(runs[0].workPath))
+        self.assertTrue(os.path.isdir(runs[0].path))
+
+    def testUnknownCleanupPolicy(self):
+        self.assertRaises(ValueError, rundirectory.RunDirectory, self.root, 'run', 'everything')
+
+
+if __name__ == '__main__':
+    unittest.main()
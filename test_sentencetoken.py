@@ -6,8 +6,12 @@
 
 __author__ = 'Rodney L. Summerscales'
 
+import cPickle
 import unittest
 import sentencetoken
+import sentencecolumns
+import annotation
+from test_abstract import loadAbstract
 
 
 class TokenTest(unittest.TestCase):
@@ -32,6 +36,68 @@ class TokenTest(unittest.TestCase):
         self.assertIs(t.lemma, 'world')
         self.assertIs(t.pos, 'JJ')
 
+    def testPredicateFlags(self):
+        t = sentencetoken.Token(text='12')
+        self.assertTrue(t.isNumber())
+        self.assertTrue(t.isInteger())
+        self.assertTrue(t.isImportantInteger())
+        self.assertEqual(t.getValue(), 12)
+
+        # flags are recomputed when the token changes
+        t.annotations = annotation.AnnotationList()
+        t.addAnnotation('percentage')
+        self.assertTrue(t.isPercentage())
+        self.assertFalse(t.isImportantInteger())
+        self.assertTrue(t.isImportantNumber())
+        t.text = 'NNT'
+        self.assertFalse(t.isNumber())
+        self.assertTrue(t.isAcronym())
+        self.assertTrue(t.isValueAcronym())
+
+        t = sentencetoken.Token(text='none')
+        self.assertTrue(t.isNullNumberWord())
+        self.assertEqual(t.getValue(), 0)
+        t = sentencetoken.Token(text='mg/kg')
+        self.assertTrue(t.isMeasurementWord())
+        t = sentencetoken.Token(text='versus')
+        self.assertTrue(t.isStopWord())
+
+    def testChangesMarkAbstractDirty(self):
+        for parser in ['minidom', 'iterparse']:
+            self.checkChanges(loadAbstract(parser=parser))
+
+    def checkChanges(self, abs):
+        """ only assignments to the tracked attributes of a token change an abstract """
+        self.assertFalse(abs.dirty)
+        sentence = abs.sentences[0]
+        token = sentence.tokens[0]
+        sentence.getColumns()
+        token.features['lexical'] = set(['t_mortality'])
+        token.parent = token
+        self.assertFalse(abs.dirty)
+        self.assertIsNot(sentence.columns, None)
+
+        abs = cPickle.loads(cPickle.dumps(abs, cPickle.HIGHEST_PROTOCOL))
+        self.assertFalse(abs.dirty)
+        sentence = abs.sentences[0]
+        token = sentence.tokens[0]
+        self.assertEqual(token.text, 'mortality')
+        self.assertEqual(token.features, {'lexical': set(['t_mortality'])})
+        sentence.getColumns()
+        token.lemma = 'death'
+        self.assertTrue(abs.dirty)
+        self.assertIs(sentence.columns, None)
+
+    def testColumnQueriesDoNotAddNames(self):
+        columns = loadAbstract().sentences[0].getColumns()
+        nNames = len(sentencecolumns.annotationTypes)
+        for i in range(sentencecolumns.annotationTypes.maxNames + 1):
+            self.assertFalse(columns.hasAnnotation('unknown_%d' % i).any())
+            self.assertFalse(columns.hasLabel('unknown_%d' % i).any())
+        self.assertEqual(len(sentencecolumns.annotationTypes), nNames)
+        self.assertEqual(columns.hasAnnotation('outcome').tolist(),
+                         [True, False, False, False, False, False])
+
 
 if __name__ == '__main__':
     unittest.main()
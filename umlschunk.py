@@ -29,6 +29,11 @@ class UMLSChunk:
             self.startIdx = int(node.getAttribute('start'))
             self.endIdx = int(node.getAttribute('end'))
 
+    def parseElement(self, element):
+        """ read the token span from an ElementTree "umlsChunk" element """
+        self.startIdx = int(element.get('start', ''))
+        self.endIdx = int(element.get('end', ''))
+
     def getTypeString(self):
         """ return a string containing list of types separated by an underscore """
         return '_'.join(self.types)
@@ -63,3 +68,7 @@ class UMLSChunk:
         node.setAttribute('start', str(self.startIdx))
         node.setAttribute('end', str(self.endIdx))
         return node
+
+    def writeElement(self, writer):
+        """ write the same element as getXML() to an xmlutil.XMLWriter """
+        writer.textElement('umlsChunk', {'start': str(self.startIdx), 'end': str(self.endIdx)})
@@ -18,7 +18,7 @@ class UMLSConcept:
     inSnomed = False
     inRxnorm = False
 
-    def __init__(self, node):
+    def __init__(self, node=None):
         """ create a new concept element given a UMLS node """
         self.id = ''
         self.types = set([])
@@ -29,6 +29,11 @@ class UMLSConcept:
         self.inSnomed = False
         self.inRxnorm = False
 
+        if node != None:
+            self.parseXML(node)
+
+    def parseXML(self, node):
+        """ read concept information from a minidom "umls" element """
         self.id = node.getAttribute('id')
         self.snomed = node.getAttribute('snomed')
         self.score = int(node.getAttribute('score'))
@@ -44,6 +49,21 @@ class UMLSConcept:
             elif s == 'RXNORM':
                 self.inRxnorm = True
 
+    def parseElement(self, element):
+        """ read concept information from an ElementTree "umls" element """
+        self.id = element.get('id', '')
+        self.snomed = element.get('snomed', '')
+        self.score = int(element.get('score', ''))
+        self.isNegated = element.get('negated', '') == 'true'
+        for tElement in element.iter('type'):
+            self.types.add(xmlutil.getElementText(tElement))
+        for sElement in element.iter('source'):
+            s = xmlutil.getElementText(sElement)
+            if s == 'SNOMEDCT':
+                self.inSnomed = True
+            elif s == 'RXNORM':
+                self.inRxnorm = True
+
     def getXML(self, doc):
         node = doc.createElement('umls')
         node.setAttribute('id', self.id)
@@ -62,3 +82,21 @@ class UMLSConcept:
             node.appendChild(xmlutil.createNodeWithTextChild(doc, 'source', 'RXNORM'))
 
         return node
+
+    def writeElement(self, writer):
+        """ write the same element as getXML() to an xmlutil.XMLWriter """
+        attributes = {'id': self.id, 'score': str(self.score)}
+        if len(self.snomed) > 0:
+            attributes['snomed'] = self.snomed
+        if self.isNegated:
+            attributes['negated'] = 'true'
+        else:
+            attributes['negated'] = 'false'
+        writer.startElement('umls', attributes)
+        for type in self.types:
+            writer.textElement('type', {}, type)
+        if self.inSnomed:
+            writer.textElement('source', {}, 'SNOMEDCT')
+        if self.inRxnorm:
+            writer.textElement('source', {}, 'RXNORM')
+        writer.endElement()
@@ -6,6 +6,7 @@
 """
 
 import xml.dom
+import xml.dom.minidom
 import sentence
 
 def parseSentences(node, abstract=None):
@@ -58,6 +59,21 @@ def getText(node):
             s = s + c.data
     return s.strip()
 
+def getElementText(element):
+    """ return a string containing all of the text between the start and end tags
+        of a given ElementTree element.
+
+        The text is normalized the same way normalizeXMLTree() and getText()
+        normalize the text children of a minidom element, so both give the
+        same string for the same xml. """
+    s = ''
+    for text in [element.text] + [child.tail for child in element]:
+        if text != None:
+            text = text.strip()
+            if len(text) != 0:
+                s = s + text.encode('ascii', 'xmlcharrefreplace')
+    return s.strip()
+
 def getTextFromNodeCalled(name, node):
     """ return the text for a child of a given node.
 
@@ -123,11 +139,87 @@ def fixed_writexml(self, writer, indent="", addindent="", newl=""):
             return
         writer.write(">%s"%(newl))
         for node in self.childNodes:
-            node.writexml(writer,indent+addindent,addindent,newl)
+            if node.nodeType == xml.dom.minidom.Node.ELEMENT_NODE:
+                fixed_writexml(node, writer, indent+addindent, addindent, newl)
+            else:
+                node.writexml(writer,indent+addindent,addindent,newl)
         writer.write("%s</%s>%s" % (indent,self.tagName,newl))
     else:
         writer.write("/>%s"%(newl))
 
 def writexml(node, writer, indent='', addindent='  ', newl='\n'):
-    xml.dom.minidom.Element.writexml = fixed_writexml
-    node.writexml(writer, indent='', addindent='  ', newl='\n')
+    fixed_writexml(node, writer, indent='', addindent='  ', newl='\n')
+
+
+class XMLWriter:
+    """ Write xml elements to a stream as they are generated, without building
+        a DOM tree first.
+
+        The output is the same as writexml() gives for the equivalent minidom
+        tree: attributes are sorted by name, an element whose only child is
+        text is written on one line and empty elements are closed with '/>'. """
+    out = None            # output stream
+    addindent = '  '      # indentation added for each level of elements
+    newl = '\n'           # newline string
+    __openElements = []   # (name, indentation) for each element that is not closed yet
+    __startPending = False  # the start tag of the innermost open element is not finished
+
+    def __init__(self, out, addindent='  ', newl='\n'):
+        self.out = out
+        self.addindent = addindent
+        self.newl = newl
+        self.__openElements = []
+        self.__startPending = False
+
+    def currentIndent(self):
+        """ return the indentation for the next element """
+        if len(self.__openElements) == 0:
+            return ''
+        return self.__openElements[-1][1] + self.addindent
+
+    def __writeStartTag(self, name, attributes):
+        """ write the start tag for an element up to the closing '>' """
+        if self.__startPending:
+            self.out.write('>' + self.newl)
+            self.__startPending = False
+        write = self.out.write
+        write(self.currentIndent() + '<' + name)
+        for attrName in sorted(attributes.keys()):
+            write(' %s="' % attrName)
+            xml.dom.minidom._write_data(self.out, attributes[attrName])
+            write('"')
+
+    def startElement(self, name, attributes={}):
+        """ write the start of an element that contains other elements.
+            attributes = dictionary of attribute values.
+            every element must be closed with endElement() """
+        indent = self.currentIndent()
+        self.__writeStartTag(name, attributes)
+        self.__openElements.append((name, indent))
+        self.__startPending = True
+
+    def endElement(self):
+        """ write the end of the innermost open element """
+        (name, indent) = self.__openElements.pop()
+        if self.__startPending:
+            self.out.write('/>' + self.newl)
+            self.__startPending = False
+        else:
+            self.out.write('%s</%s>%s' % (indent, name, self.newl))
+
+    def textElement(self, name, attributes={}, text=None):
+        """ write an element containing only text (or nothing if text is None) """
+        self.__writeStartTag(name, attributes)
+        if text is None:
+            self.out.write('/>' + self.newl)
+        else:
+            self.out.write('>')
+            xml.dom.minidom._write_data(self.out, text)
+            self.out.write('</%s>%s' % (name, self.newl))
+
+    def writeNode(self, node):
+        """ write a minidom element (and its children) at the current position """
+        if self.__startPending:
+            self.out.write('>' + self.newl)
+            self.__startPending = False
+        fixed_writexml(node, self.out, self.currentIndent(), self.addindent, self.newl)